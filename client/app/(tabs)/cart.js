@@ -38,7 +38,7 @@ export default function CartScreen() {
         keyExtractor={(it) => String(it.id)}
         renderItem={({ item }) => (
           <View style={styles.row}>
-            <SmartImage uri={item.product.image || item.product.image_url} style={{ width:56, height:56, borderRadius:10, marginRight:8 }} />
+            <SmartImage uri={item.product.variants?.thumb?.webp || item.product.image || item.product.image_url} style={{ width:56, height:56, borderRadius:10, marginRight:8 }} />
             <View style={{ flex:1, gap:2 }}>
               <Text style={{ fontWeight:'800', color: colors.text }}>{item.product.name}</Text>
               <Text style={{ color: colors.subtext }}>Qty: {item.quantity}</Text>
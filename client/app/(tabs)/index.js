@@ -17,7 +17,7 @@ export default function ProductsList() {
   const [data, setData] = useState([]);
   const [loading, setLoading] = useState(false);
   const [q, setQ] = useState('');
-  const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState(null);
   const [hasMore, setHasMore] = useState(true);
 
   const fetchingMoreRef = useRef(false);
@@ -26,16 +26,18 @@ export default function ProductsList() {
   const router = useRouter();
 
   const fetchPage = useCallback(
-    async ({ reset = false, pageNum = 1 } = {}) => {
+    async ({ reset = false, after = null } = {}) => {
       if (loading) return; 
       setLoading(true);
       try {
-        const res = await listProducts({ page: pageNum, q });
+        const res = await listProducts(after ? { cursor: after, q } : { q });
         const items = res?.results ?? res ?? [];
-        setHasMore(Boolean(res?.next ?? (items.length > 0 && items.length >= 1)));
+        const m = res?.next?.match(/[?&]cursor=([^&]+)/);
+        const next = m ? decodeURIComponent(m[1]) : null;
+        setHasMore(Boolean(next));
+        setCursor(next);
         if (reset) {
           setData(items);
-          setPage(1);
         } else {
           setData(prev => {
             const map = new Map();
@@ -53,17 +55,15 @@ export default function ProductsList() {
   );
 
   useEffect(() => {
-    fetchPage({ reset: true, pageNum: 1 });
+    fetchPage({ reset: true });
   }, [q, fetchPage]);
-  useRefetchOnFocus(() => fetchPage({ reset: true, pageNum: 1 }), { minIntervalMs: 1200 });
+  useRefetchOnFocus(() => fetchPage({ reset: true }), { minIntervalMs: 1200 });
 
   const loadMore = async () => {
     if (fetchingMoreRef.current || loading || !hasMore || data.length === 0) return;
     if (!canLoadMoreRef.current) return; 
     fetchingMoreRef.current = true;
-    const next = page + 1;
-    setPage(next);
-    await fetchPage({ pageNum: next });
+    await fetchPage({ after: cursor });
   };
 
   return (
@@ -77,7 +77,7 @@ export default function ProductsList() {
           style={styles.input}
           placeholderTextColor={colors.subtext}
         />
-        <Pressable onPress={() => fetchPage({ reset: true, pageNum: 1 })} style={styles.refreshBtn}>
+        <Pressable onPress={() => fetchPage({ reset: true })} style={styles.refreshBtn}>
           <Text style={{ color: '#fff', fontWeight:'700' }}>Go</Text>
         </Pressable>
       </View>
@@ -26,7 +26,7 @@ export default function ProductScreen() {
   return (
     <View style={{ flex:1, backgroundColor: colors.bg }}>
       {!loaded && <Skeleton height={320} radius={0} />}
-      <SmartImage uri={p.image || p.image_url} style={{ width:'100%', height: 320 }} contentFit="cover" onLoadEnd={()=>setLoaded(true)} />
+      <SmartImage uri={p.variants?.detail?.webp || p.image || p.image_url} style={{ width:'100%', height: 320 }} contentFit="cover" onLoadEnd={()=>setLoaded(true)} />
       <View style={{ padding: spacing, gap: 8 }}>
         <Text style={{ fontSize: 22, fontWeight:'800', color: colors.text }}>{p.name}</Text>
         <Text style={{ color: colors.subtext }}>{p.description}</Text>
@@ -10,7 +10,7 @@ export default function ProductCard({ item, onPress, onAdd, width }) {
     <Pressable onPress={onPress} style={[styles.card, width ? { width } : null]}>
       <View style={styles.imageWrap}>
         <SmartImage
-          uri={item.image || item.image_url}
+          uri={item.variants?.card?.webp || item.image || item.image_url}
           style={[styles.image, width ? { height: Math.max(140, Math.floor(width)) } : null]}
           contentFit="cover"
           onLoadEnd={() => setLoaded(true)}
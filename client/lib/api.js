@@ -1,6 +1,6 @@
 import axios from 'axios';
 import Constants from 'expo-constants';
-import { getSessionKey, getAccessToken, getRefreshToken, setTokens, clearTokens } from './session';
+import { getSessionKey, setSessionKey, clearSessionKey, getAccessToken, getRefreshToken, setTokens, clearTokens } from './session';
 
 const API_URL = process.env.EXPO_PUBLIC_API_URL ?? Constants.expoConfig?.extra?.apiUrl ?? "http://127.0.0.1:8000";
 //console.log("API_URL =", API_URL);
@@ -44,7 +44,11 @@ export async function adminCreateProduct(fields) {
 }
 
 api.interceptors.response.use(
-  (r) => r,
+  async (r) => {
+    const sk = r.headers?.['x-session-key'];
+    if (sk) await setSessionKey(sk);
+    return r;
+  },
   async (error) => {
     const original = error.config;
     if (error.response && error.response.status === 401 && !original._retry) {
@@ -107,8 +111,10 @@ export async function login(username, password) {
   const { data } = await axios.post(
     `${API_URL}/api/auth/login`,
     { username, password },
-    { headers: { 'X-Session-Key': sk } }
+    { headers: sk ? { 'X-Session-Key': sk } : {} }
   );
+  // the guest cart now lives in the account's cart
+  await clearSessionKey();
   return data;
 }
 
@@ -128,6 +134,13 @@ export async function me() {
 }
 
 export async function myOrders() {
-  const { data } = await api.get('/orders/me');
-  return data;
+  // keyset-paginated: follow `next` (an absolute URL) until the last page
+  let { data } = await api.get('/orders/me', { params: { page_size: 100 } });
+  if (!data?.results) return data;
+  const orders = [...data.results];
+  while (data.next) {
+    ({ data } = await api.get(data.next));
+    orders.push(...data.results);
+  }
+  return orders;
 }
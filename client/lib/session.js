@@ -5,18 +5,15 @@ const SK = 'session_key';
 const AT = 'access_token';
 const RT = 'refresh_token';
 
-function uuid() {
-  const rnd = () => Math.floor((1 + Math.random()) * 0x10000).toString(16).substring(1);
-  return `${rnd()}${rnd()}-${rnd()}-${rnd()}-${rnd()}-${rnd()}${rnd()}${rnd()}`;
-}
-
+// Signed guest-cart token; the server hands out a new one in X-Session-Key on each cart change.
 export async function getSessionKey() {
-  let sk = await AsyncStorage.getItem(SK);
-  if (!sk) {
-    sk = uuid();
-    await AsyncStorage.setItem(SK, sk);
-  }
-  return sk;
+  return AsyncStorage.getItem(SK);
+}
+export async function setSessionKey(sk) {
+  await AsyncStorage.setItem(SK, sk);
+}
+export async function clearSessionKey() {
+  await AsyncStorage.removeItem(SK);
 }
 
 export async function getAccessToken() {
@@ -0,0 +1,181 @@
+"""
+Read-path concurrency: WSGI threads vs ASGI with the async read views.
+
+The same request mix (product list pages, search, detail, cart, my orders) runs
+at each level in BENCH_CONCURRENCY through three in-process servers:
+
+- wsgi:        BENCH_WSGI_THREADS threads (gunicorn --threads), sync views; other
+               in-flight requests queue for a thread
+- asgi-sync:   the ASGI handler, sync views (each request hops to a thread)
+- asgi-async:  the ASGI handler with ASYNC_READ_VIEWS routes (shop.async_views)
+
+The ASGI legs call `get_asgi_application()` directly with the scope/receive/send
+messages uvicorn would send, all on one event loop. BENCH_DB_LATENCY_MS adds a
+sleep to every SQL statement to stand in for a network round trip to Postgres;
+local SQLite answers in microseconds, which hides what concurrency buys.
+
+Django's async ORM, the async cache API and every sync middleware still run
+their work in a thread (one sync_to_async hop each), so a request that mostly
+uses CPU costs more under ASGI. ASGI pulls ahead when requests mostly wait and
+there are more of them in flight than WSGI threads, e.g.
+BENCH_WSGI_THREADS=4 BENCH_DB_LATENCY_MS=30 BENCH_CONCURRENCY=64.
+
+    pytest benchmarks/bench_asgi.py -s
+    BENCH_CONCURRENCY=16,64,256 BENCH_DB_LATENCY_MS=5 pytest benchmarks/bench_asgi.py -s
+"""
+import asyncio
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop.management.commands.seed_shop import USER_EMAIL
+from shop.models import Product
+
+PRODUCTS = int(os.environ.get("BENCH_PRODUCTS", 2000))
+USERS = int(os.environ.get("BENCH_USERS", 16))
+CONCURRENCY = [int(c) for c in os.environ.get("BENCH_CONCURRENCY", "8,32,128").split(",")]
+WSGI_THREADS = int(os.environ.get("BENCH_WSGI_THREADS", 8))
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", 2000))
+DB_LATENCY = float(os.environ.get("BENCH_DB_LATENCY_MS", 2)) / 1000
+SEED = int(os.environ.get("BENCH_SEED", 42))
+ORDERINGS = ["-created_at", "price_cents", "-price_cents", "name"]
+TERMS = ["sneaker", "leather boot", "vint", "kalar", "jacket"]
+
+
+def _slow(execute, sql, params, many, context):
+    time.sleep(DB_LATENCY)
+    return execute(sql, params, many, context)
+
+def _add_latency(connection, **kwargs):
+    if _slow not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_slow)
+
+def _plan(ids, tokens):
+    """REQUESTS (path, headers) pairs; guests browse, users also read their cart and orders."""
+    rnd = random.Random(SEED)
+    plan = []
+    for _ in range(REQUESTS):
+        headers = {"Authorization": f"Bearer {rnd.choice(tokens)}"} if rnd.random() < 0.5 else {}
+        path = rnd.choice([
+            f"/api/products?ordering={rnd.choice(ORDERINGS)}&page_size=20",
+            f"/api/products?q={rnd.choice(TERMS)}",
+            f"/api/products/{rnd.choice(ids)}",
+            f"/api/products/{rnd.choice(ids)}",
+            "/api/cart",
+            "/api/orders/me" if headers else "/api/cart",
+        ])
+        plan.append((path, headers))
+    return plan
+
+def _summary(concurrency, ms, statuses, elapsed):
+    ms.sort()
+    cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {"concurrency": concurrency, "rps": round(len(ms) / elapsed, 1),
+            "p50_ms": round(cuts[49], 2), "p95_ms": round(cuts[94], 2), "statuses": statuses}
+
+async def _drive(plan, concurrency, get):
+    """`concurrency` clients issue the plan back to back; latency includes any wait for a free server thread."""
+    results = []
+
+    async def client(n):
+        for i in range(n, len(plan), concurrency):
+            started = time.perf_counter()
+            status = await get(*plan[i])
+            results.append(((time.perf_counter() - started) * 1000, status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    return results, time.perf_counter() - started
+
+def _run_wsgi(plan, concurrency):
+    local = threading.local()
+    pool = ThreadPoolExecutor(WSGI_THREADS)
+
+    def call(path, headers):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        return local.client.get(path, headers=headers).status_code
+
+    async def get(path, headers):
+        return await asyncio.get_running_loop().run_in_executor(pool, call, path, headers)
+
+    try:
+        return asyncio.run(_drive(plan, concurrency, get))
+    finally:
+        barrier = threading.Barrier(WSGI_THREADS)
+        list(pool.map(lambda _: (barrier.wait(), connections.close_all()), range(WSGI_THREADS)))
+        pool.shutdown()
+
+async def _asgi_get(app, path, headers):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver"), *((k.lower().encode(), v.encode()) for k, v in headers.items())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Future()  # no disconnect; Django cancels this listener when it is done
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+def _run_asgi(plan, concurrency):
+    app = get_asgi_application()
+    return asyncio.run(_drive(plan, concurrency, lambda path, headers: _asgi_get(app, path, headers)))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_asgi_vs_wsgi_reads(settings):
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["testserver"]
+    call_command("seed_shop", products=PRODUCTS, users=USERS)
+    users = User.objects.filter(username__in=[USER_EMAIL.format(i) for i in range(USERS)])
+    tokens = [str(RefreshToken.for_user(u).access_token) for u in users]
+    ids = [str(pk) for pk in Product.objects.values_list("pk", flat=True)[:500]]
+    plan = _plan(ids, tokens)
+
+    legs = [("wsgi", "microcommerce.urls", _run_wsgi), ("asgi-sync", "microcommerce.urls", _run_asgi),
+            ("asgi-async", "shop.tests.urls_async", _run_asgi)]
+    connection_created.connect(_add_latency)
+    try:
+        print(f"\n{REQUESTS} GETs per run, {PRODUCTS} products, {DB_LATENCY * 1000:g} ms per query, "
+              f"{WSGI_THREADS} WSGI threads, {connection.vendor}")
+        print(f"  {'server':<12}{'conc':>6}{'req/s':>9}{'p50':>9}{'p95':>9}  statuses")
+        for concurrency in CONCURRENCY:
+            for name, urlconf, run in legs:
+                settings.ROOT_URLCONF = urlconf
+                cache.clear()
+                results, elapsed = run(plan, concurrency)
+                statuses = {}
+                for _, status in results:
+                    statuses[status] = statuses.get(status, 0) + 1
+                s = _summary(concurrency, [ms for ms, _ in results], statuses, elapsed)
+                print(f"  {name:<12}{concurrency:>6}{s['rps']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}  {statuses}")
+                assert set(statuses) == {200}, statuses
+    finally:
+        connection_created.disconnect(_add_latency)
@@ -0,0 +1,206 @@
+"""
+Load and contention suite: concurrent clients drive the WSGI app in-process.
+
+1. mix: BENCH_WORKERS threads (a quarter of them guests) loop for
+   BENCH_DURATION seconds over browse/search/detail/add/cart/checkout,
+   weighted by MIX, against a seed_shop catalog of BENCH_PRODUCTS.
+2. contention: BENCH_BUYERS users each put the hot SKU in their cart, then
+   check out at once against BENCH_HOT_STOCK units (BENCH_HOT_SHARDS stock
+   shards). Exactly that many must succeed; the rest get 409, or 503/429
+   when checkout admission control (shop.admission) sheds them first.
+
+Per endpoint it reports req/s, p50/p95/p99 ms, and SQL statements and DB ms
+per request (from the Server-Timing header), and writes everything as JSON to
+BENCH_OUT (default benchmarks/results/load-<vendor>-<time>.json).
+
+    pytest benchmarks/bench_load.py -s
+    DATABASE_URL=postgres://localhost/shop BENCH_WORKERS=16 pytest benchmarks/bench_load.py -s
+    python benchmarks/compare_load.py old.json new.json
+
+Threads share one interpreter, so absolute req/s is a floor; compare runs of
+the same configuration.
+"""
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop.management.commands.seed_shop import HOT_SKU, USER_EMAIL
+from shop.models import OrderItem, Product, StockShard
+
+PRODUCTS = int(os.environ.get("BENCH_PRODUCTS", 10_000))
+WORKERS = int(os.environ.get("BENCH_WORKERS", 8))
+GUESTS = int(os.environ.get("BENCH_GUESTS", WORKERS // 4))
+DURATION = float(os.environ.get("BENCH_DURATION", 10))
+WARMUP = float(os.environ.get("BENCH_WARMUP", 2))
+BUYERS = int(os.environ.get("BENCH_BUYERS", 32))
+HOT_STOCK = int(os.environ.get("BENCH_HOT_STOCK", BUYERS // 2))
+HOT_SHARDS = int(os.environ.get("BENCH_HOT_SHARDS", 0))
+SEED = int(os.environ.get("BENCH_SEED", 42))
+MIX = {"browse": 35, "search": 20, "detail": 20, "add": 12, "cart": 8, "checkout": 5}
+ORDERINGS = ["-created_at", "price_cents", "-price_cents", "name"]
+TERMS = ["sneaker", "leather boot", "vint", "kalar", "jacket", "denim", "GEN00001"]
+SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # endpoint -> [(ms, db_ms, queries)]
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, ms, response):
+        match = SERVER_TIMING.search(response.get("Server-Timing", ""))
+        db_ms, queries = (float(match[1]), int(match[2])) if match else (0.0, 0)
+        with self.lock:
+            self.samples[endpoint].append((ms, db_ms, queries))
+            self.statuses[endpoint][response.status_code] += 1
+
+    def summary(self, elapsed):
+        out = {}
+        for endpoint, rows in sorted(self.samples.items()):
+            ms = sorted(r[0] for r in rows)
+            cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+            out[endpoint] = {
+                "requests": len(rows),
+                "rps": round(len(rows) / elapsed, 1),
+                "p50_ms": round(cuts[49], 2), "p95_ms": round(cuts[94], 2), "p99_ms": round(cuts[98], 2),
+                "max_ms": round(ms[-1], 2),
+                "queries_mean": round(statistics.fmean(r[2] for r in rows), 2),
+                "queries_max": max(r[2] for r in rows),
+                "db_ms_mean": round(statistics.fmean(r[1] for r in rows), 2),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[endpoint].items())},
+            }
+        total = sum(len(rows) for rows in self.samples.values())
+        return {"elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 1), "endpoints": out}
+
+
+def _call(client, stats, endpoint, method, path, data=None):
+    started = time.perf_counter()
+    if data is None:
+        response = getattr(client, method)(path)
+    else:
+        response = getattr(client, method)(path, data, content_type="application/json")
+    stats.record(endpoint, (time.perf_counter() - started) * 1000, response)
+    return response
+
+def _step(client, stats, rnd, ids, guest):
+    action = rnd.choices(list(MIX), weights=list(MIX.values()))[0]
+    if action == "checkout" and guest:
+        action = "cart"
+    if action == "browse":
+        _call(client, stats, action, "get", f"/api/products?ordering={rnd.choice(ORDERINGS)}&page_size=20")
+    elif action == "search":
+        _call(client, stats, action, "get", f"/api/products?q={rnd.choice(TERMS)}")
+    elif action == "detail":
+        _call(client, stats, action, "get", f"/api/products/{rnd.choice(ids)}")
+    elif action == "add":
+        _call(client, stats, action, "post", "/api/cart/items", {"product_id": rnd.choice(ids), "quantity": 1})
+    elif action == "cart":
+        _call(client, stats, action, "get", "/api/cart")
+    else:
+        _call(client, stats, action, "post", "/api/orders/checkout")
+
+def _run_mix(clients, ids, seconds):
+    stats = Stats()
+    deadline = time.monotonic() + seconds
+
+    def worker(n):
+        client, guest = clients[n]
+        rnd = random.Random(SEED + n)
+        try:
+            while time.monotonic() < deadline:
+                _step(client, stats, rnd, ids, guest)
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        list(pool.map(worker, range(len(clients))))
+    return stats.summary(time.monotonic() - started)
+
+def _run_contention(clients, hot_id):
+    stats = Stats()
+    barrier = threading.Barrier(len(clients))
+
+    def buyer(client):
+        try:
+            _call(client, stats, "add_hot", "post", "/api/cart/items", {"product_id": hot_id, "quantity": 1})
+            barrier.wait()
+            return _call(client, stats, "checkout_hot", "post", "/api/orders/checkout").status_code
+        finally:
+            connections.close_all()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        codes = Counter(pool.map(buyer, clients))
+    return stats.summary(time.monotonic() - started), codes
+
+
+def _print(title, summary):
+    print(f"\n{title}: {summary['requests']} requests in {summary['elapsed_s']}s, {summary['rps']} req/s")
+    print(f"  {'endpoint':<13}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'db ms':>8}  statuses")
+    for name, e in summary["endpoints"].items():
+        print(f"  {name:<13}{e['rps']:>8}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}"
+              f"{e['queries_mean']:>9}{e['db_ms_mean']:>8}  {e['statuses']}")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_load_and_contention(settings):
+    settings.DEBUG = False
+    call_command("seed_shop", products=PRODUCTS, users=WORKERS + BUYERS, hot_stock=HOT_STOCK, hot_shards=HOT_SHARDS)
+    users = {u.username: u for u in User.objects.filter(username__startswith="bench")}
+    auth = [Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(users[USER_EMAIL.format(i)]).access_token}")
+            for i in range(WORKERS + BUYERS)]
+    hot = Product.objects.get(sku=HOT_SKU)
+    ids = [str(pk) for pk in Product.objects.exclude(pk=hot.pk).values_list("pk", flat=True)]
+    mix_clients = [(Client(), True) if n < GUESTS else (auth[n], False) for n in range(WORKERS)]
+
+    _run_mix(mix_clients, ids, WARMUP)
+    mix = _run_mix(mix_clients, ids, DURATION)
+    _print(f"mix ({WORKERS} workers, {GUESTS} guests, {PRODUCTS} products, {connection.vendor})", mix)
+
+    contention, codes = _run_contention(auth[WORKERS:], str(hot.pk))
+    _print(f"contention ({BUYERS} buyers, {HOT_STOCK} units, {HOT_SHARDS or 1} shard(s))", contention)
+    sold = sum(OrderItem.objects.filter(product=hot).values_list("quantity", flat=True))
+    hot.refresh_from_db()
+    # read the shards directly: available_stock() serves a briefly cached rollup
+    left = StockShard.objects.filter(product=hot).aggregate(n=Sum("stock"))["n"] if hot.stock_shards else hot.stock
+    print(f"  checkout statuses {dict(codes)}, sold {sold}, left {left}")
+
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "vendor": connection.vendor,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "config": {"products": PRODUCTS, "workers": WORKERS, "guests": GUESTS, "duration_s": DURATION, "mix": MIX,
+                   "buyers": BUYERS, "hot_stock": HOT_STOCK, "hot_shards": HOT_SHARDS, "seed": SEED},
+        "mix": mix,
+        "contention": {**contention, "checkout_statuses": {str(k): v for k, v in codes.items()}, "sold": sold, "left": left},
+    }
+    out = Path(os.environ.get("BENCH_OUT") or
+               Path(__file__).parent / "results" / f"load-{connection.vendor}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"\nwrote {out}")
+
+    admitted = BUYERS - codes[503] - codes[429]
+    assert sold == min(HOT_STOCK, admitted) and codes[201] == sold and codes[409] == admitted - sold
+    assert left == HOT_STOCK - sold
+
@@ -0,0 +1,64 @@
+"""
+Order receipt for a 50-line order: old nested ModelSerializer path
+(prefetch items__product + OrderOut/OrderItemOut/ProductOut) vs the snapshot
+values() query + order_out.
+
+    pytest benchmarks/bench_order_serialization.py -s
+"""
+import statistics
+import time
+
+import pytest
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.request import Request
+from shop.models import Product, Cart, CartItem, Order, OrderItem
+from shop.serializers import ProductOut, ORDER_DETAIL_FIELDS, order_head, order_out
+from shop.services import checkout_cart
+
+LINES = 50
+RUNS = 200
+
+
+class LegacyOrderItemOut(serializers.ModelSerializer):
+    product = ProductOut()
+    class Meta:
+        model = OrderItem
+        fields = ["product", "quantity", "unit_price_cents", "id", "order"]
+
+class LegacyOrderOut(serializers.ModelSerializer):
+    items = LegacyOrderItemOut(many=True, read_only=True)
+    class Meta:
+        model = Order
+        fields = ["id", "status", "total_cents", "created_at", "items"]
+
+
+def _median_ms(fn):
+    samples = []
+    for _ in range(RUNS):
+        t = time.perf_counter(); fn(); samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+@pytest.mark.django_db
+def test_order_serialization(django_user_model):
+    user = django_user_model.objects.create_user(username="bench", password="x")
+    cart = Cart.objects.create(user=user)
+    products = Product.objects.bulk_create(
+        [Product(name=f"Product {i}", description="x" * 400, price_cents=1000 + i, sku=f"B{i:03d}", stock=100,
+                 image=f"products/p{i}.png") for i in range(LINES)]
+    )
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=1) for p in products])
+    order = checkout_cart(cart, "", user)
+    request = Request(RequestFactory().get("/"))
+
+    def legacy():
+        o = Order.objects.prefetch_related("items__product").get(pk=order.pk, user=user)
+        return LegacyOrderOut(o, context={"request": request}).data
+
+    def snapshot():
+        rows = list(OrderItem.objects.filter(order_id=order.pk, order__user=user).order_by("id").values(*ORDER_DETAIL_FIELDS))
+        return order_out(order_head(rows[0]), rows, request)
+
+    assert len(snapshot()["items"]) == LINES
+    old, new = _median_ms(legacy), _median_ms(snapshot)
+    print(f"\n{LINES}-line order, median of {RUNS}: legacy {old:.2f} ms, snapshot {new:.2f} ms ({old / new:.1f}x)")
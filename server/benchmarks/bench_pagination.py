@@ -0,0 +1,43 @@
+"""
+Page latency by depth: keyset cursor (full request) vs the old COUNT(*) + OFFSET queries (ORM only).
+
+    pytest benchmarks/bench_pagination.py -s
+"""
+import os
+import statistics
+import time
+
+import pytest
+from django.test import Client
+from shop.models import Product
+
+N = int(os.environ.get("BENCH_PRODUCTS", 100_000))
+DEPTHS = [1, 10, 100, 1000, 4000]
+PAGE = 20
+
+
+@pytest.mark.django_db
+def test_page_latency_by_depth(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    Product.objects.bulk_create(
+        [Product(name=f"P{i}", price_cents=i % 997, sku=f"SKU{i:07d}", stock=1) for i in range(N)], batch_size=5000
+    )
+    client = Client()
+    base = Product.objects.filter(is_active=True).order_by("-price_cents", "-id")
+
+    # walk the cursor chain once, remembering the URL that starts each measured depth
+    urls, url, page = {}, f"/api/products?ordering=-price_cents&page_size={PAGE}", 1
+    while page <= DEPTHS[-1]:
+        if page in DEPTHS:
+            urls[page] = url
+        url = client.get(url).json()["next"]; page += 1
+
+    print(f"\n{N} products, median ms of 10 runs")
+    print(f"{'page':>6}{'offset':>10}{'cursor':>10}")
+    for depth in DEPTHS:
+        offset = []
+        cursor = []
+        for _ in range(10):
+            t = time.perf_counter(); base.count(); list(base[(depth - 1) * PAGE: depth * PAGE]); offset.append(time.perf_counter() - t)
+            t = time.perf_counter(); client.get(urls[depth]); cursor.append(time.perf_counter() - t)
+        print(f"{depth:>6}{statistics.median(offset) * 1000:>10.2f}{statistics.median(cursor) * 1000:>10.2f}")
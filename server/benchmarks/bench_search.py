@@ -0,0 +1,68 @@
+"""
+Search latency: FTS index vs the old name__icontains filter.
+
+    pytest benchmarks/bench_search.py -s            # 100k products
+    BENCH_PRODUCTS=250000 pytest benchmarks/bench_search.py -s
+
+Not collected by a plain `pytest` run (file name doesn't match python_files).
+"""
+import os
+import random
+import statistics
+import time
+
+import pytest
+from shop.filters import ProductFilter
+from shop.models import Product
+from shop.search import rebuild_index
+
+N = int(os.environ.get("BENCH_PRODUCTS", 100_000))
+RUNS = int(os.environ.get("BENCH_RUNS", 20))
+WORDS = (
+    "leather canvas cotton wool denim suede running trail formal casual slim relaxed classic "
+    "vintage sport travel rain winter summer black brown white navy olive sneaker boot sandal "
+    "loafer jacket shirt jeans cap beanie scarf belt wallet backpack tote watch"
+).split()
+# brand-like words make most queries selective, as in a real catalog
+BRANDS = [a + b for a in ("ka", "zu", "mo", "ri", "te", "lo", "ve", "na", "qi", "so") for b in ("lar", "mex", "dor", "vin", "tek", "sul", "pra", "gon", "wix", "bel")]
+QUERIES = ["sneaker", "leather boot", "vint", "kalar", "kamex jacket", "SKU0099"]
+
+
+def _seed():
+    rnd = random.Random(42)
+    batch = []
+    for i in range(N):
+        batch.append(Product(
+            name=f"{rnd.choice(BRANDS)} {' '.join(rnd.sample(WORDS, 2))}".title(),
+            description=" ".join(rnd.choices(WORDS, k=12)),
+            price_cents=rnd.randint(500, 500_000),
+            sku=f"SKU{i:07d}",
+            stock=rnd.randint(0, 50),
+        ))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch); batch = []
+    Product.objects.bulk_create(batch)
+    rebuild_index(batch_size=5000)
+
+def _time(fn):
+    samples = []
+    for _ in range(RUNS):
+        t = time.perf_counter(); fn(); samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples), max(samples)
+
+def _page(qs):
+    # what a paginated list request costs: COUNT(*) + first page
+    return lambda: (qs.count(), list(qs[:20]))
+
+
+@pytest.mark.django_db
+def test_search_latency():
+    _seed()
+    base = Product.objects.filter(is_active=True).order_by("-created_at")
+    print(f"\n{N} products, median/max ms over {RUNS} runs")
+    print(f"{'query':<18}{'icontains':>20}{'fts':>20}{'hits':>8}")
+    for q in QUERIES:
+        legacy = _time(_page(base.filter(name__icontains=q)))
+        fts_qs = ProductFilter({"q": q}, queryset=base).qs
+        fts = _time(_page(fts_qs))
+        print(f"{q:<18}{legacy[0]:>12.2f}/{legacy[1]:<7.2f}{fts[0]:>12.2f}/{fts[1]:<7.2f}{fts_qs.count():>8}")
@@ -0,0 +1,65 @@
+"""
+Cart and product-page bodies: ModelSerializer (CartItemOut/ProductOut over
+model instances, Python total, JSONRenderer) vs the values() rows +
+cart_out/products_out + FastJSONRenderer path the views now use.
+
+    pytest benchmarks/bench_serializers.py -s
+"""
+import statistics
+import time
+
+import pytest
+from django.db.models import F, Sum, Window
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from shop.models import Product, Cart, CartItem
+from shop.renderers import FastJSONRenderer
+from shop.serializers import ProductOut, CartItemOut, PRODUCT_VALUES, products_out, cart_out
+
+LINES = 50
+RUNS = 200
+
+
+def _median_ms(fn):
+    samples = []
+    for _ in range(RUNS):
+        t = time.perf_counter(); fn(); samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+@pytest.mark.django_db
+def test_serializers(django_user_model):
+    user = django_user_model.objects.create_user(username="bench", password="x")
+    cart = Cart.objects.create(user=user)
+    products = Product.objects.bulk_create(
+        [Product(name=f"Product {i}", description="x" * 400, price_cents=1000 + i, sku=f"B{i:03d}", stock=100,
+                 image=f"products/p{i}.png") for i in range(LINES)]
+    )
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=2) for p in products])
+    request = Request(RequestFactory().get("/"))
+
+    def legacy_cart():
+        items = CartItem.objects.filter(cart=cart).select_related("product")
+        data = CartItemOut(items, many=True, context={"request": request}).data
+        total = sum(i.product.price_cents * i.quantity for i in items)
+        return JSONRenderer().render({"items": data, "total_cents": total})
+
+    def fast_cart():
+        rows = list(CartItem.objects.filter(cart=cart).order_by("id").values(
+            "id", "quantity", *(f"product__{f}" for f in PRODUCT_VALUES),
+            total_cents=Window(Sum(F("quantity") * F("product__price_cents"))),
+        ))
+        return FastJSONRenderer().render(cart_out(rows, request))
+
+    def legacy_page():
+        qs = Product.objects.filter(is_active=True).order_by("-created_at", "-id")[:LINES]
+        return JSONRenderer().render(ProductOut(qs, many=True, context={"request": request}).data)
+
+    def fast_page():
+        rows = list(Product.objects.filter(is_active=True).order_by("-created_at", "-id").values(*PRODUCT_VALUES)[:LINES])
+        return FastJSONRenderer().render(products_out(rows, request))
+
+    assert len(cart_out([], request)["items"]) == 0
+    for name, old_fn, new_fn in (("cart", legacy_cart, fast_cart), ("product page", legacy_page, fast_page)):
+        old, new = _median_ms(old_fn), _median_ms(new_fn)
+        print(f"\n{LINES}-line {name}, median of {RUNS}: serializer {old:.2f} ms, fast path {new:.2f} ms ({old / new:.1f}x)")
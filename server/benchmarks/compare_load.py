@@ -0,0 +1,22 @@
+"""
+Compare two bench_load.py JSON results per scenario and endpoint.
+
+    python benchmarks/compare_load.py old.json new.json
+"""
+import json
+import sys
+from pathlib import Path
+
+
+def compare(old_path, new_path):
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    for scenario in ("mix", "contention"):
+        print(f"{scenario}: {old[scenario]['rps']} -> {new[scenario]['rps']} req/s")
+        for name, e in new[scenario]["endpoints"].items():
+            o = old[scenario]["endpoints"].get(name)
+            if o:
+                print(f"  {name:<13} rps {o['rps']} -> {e['rps']}, p95 {o['p95_ms']} -> {e['p95_ms']} ms, "
+                      f"queries {o['queries_mean']} -> {e['queries_mean']}")
+
+if __name__ == "__main__":
+    compare(*sys.argv[1:3])
@@ -23,8 +23,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shop.metrics.MetricsMiddleware",
+    "shop.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "shop.middleware.StaticFilesMiddleware",
+    "shop.middleware.ProductImageMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -44,10 +47,14 @@ SITE_URL = os.environ.get("SITE_URL", "http://127.0.0.1:8000")
 from corsheaders.defaults import default_headers
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "x-session-key", 
+    "idempotency-key",
     "authorization",
     "content-type",
 ]
 
+# guest carts come back as a signed token in X-Session-Key
+CORS_EXPOSE_HEADERS = ["x-session-key"]
+
 ROOT_URLCONF = "microcommerce.urls"
 
 TEMPLATES = [
@@ -75,6 +82,22 @@ DATABASES = {
     )
 }
 
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # Writers queue on the busy timeout instead of failing with "database is locked",
+    # and the test DB is a file so threaded tests share one database.
+    DATABASES["default"].setdefault("OPTIONS", {}).update({"timeout": 20, "transaction_mode": "IMMEDIATE"})
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+
+# Read replicas (comma-separated URLs) become replica1, replica2, ...; shop.db_router sends
+# the catalog and order-history reads there, and everything else to default.
+for i, url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), 1):
+    DATABASES[f"replica{i}"] = {**dj_database_url.parse(url.strip(), conn_max_age=600), "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["shop.db_router.ReplicaRouter"]
+# After a write, the writer (or, for catalog changes, every reader) stays on the primary this long.
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+AUTHENTICATION_BACKENDS = ["shop.authentication.EmailBackend"]
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -95,16 +118,65 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shop.authentication.JWTAuthentication",
     ),
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.OrderingFilter",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_RENDERER_CLASSES": (
+        "shop.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PAGINATION_CLASS": "shop.pagination.KeysetPagination",
     "PAGE_SIZE": 20,
 }
 
+# Async checkout: POST /api/orders/checkout returns 202 + a pending order and
+# `manage.py checkout_worker` takes the stock in batches.
+CHECKOUT_ASYNC = os.environ.get("CHECKOUT_ASYNC", "0") == "1"
+CHECKOUT_BATCH_SIZE = int(os.environ.get("CHECKOUT_BATCH_SIZE", 50))
+# Checkout admission control (shop.admission); 0 disables a limit.
+# CHECKOUT_RATE/CHECKOUT_BURST are for all workers together, the rest per process.
+CHECKOUT_RATE = float(os.environ.get("CHECKOUT_RATE", 0))
+CHECKOUT_BURST = int(os.environ.get("CHECKOUT_BURST", 100))
+CHECKOUT_CONCURRENCY = int(os.environ.get("CHECKOUT_CONCURRENCY", 8))
+CHECKOUT_SKU_CONCURRENCY = int(os.environ.get("CHECKOUT_SKU_CONCURRENCY", 4))
+CHECKOUT_QUEUE_TIMEOUT = float(os.environ.get("CHECKOUT_QUEUE_TIMEOUT", 0.5))
+
+# Transactional outbox (shop.outbox): signup/order events are delivered by
+# `manage.py dispatch_outbox` to these sinks, never inside the request.
+OUTBOX_SINKS = [s for s in os.environ.get("OUTBOX_SINKS", "shop.outbox.EmailSink").split(",") if s]
+OUTBOX_FILE = os.environ.get("OUTBOX_FILE") or None
+OUTBOX_WEBHOOK_URL = os.environ.get("OUTBOX_WEBHOOK_URL") or None
+
+# Serve the hot read endpoints (products, cart, my orders, order detail) with the
+# async views in shop.async_views. Only worth it under an ASGI server.
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "0") == "1"
+
+# Request metrics (shop.metrics): per-worker snapshots are summed from METRICS_DIR when set.
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+# Max SQL statements per request by route; over budget is logged ("log") or raised ("raise", used by the tests).
+# Each budget is independent of cart/order size: it covers a guest-cart merge or checkout of any size.
+QUERY_BUDGETS = {
+    "api/products": 3,
+    "api/products/<uuid:pk>": 3,
+    # SQLite splits bulk_update into ~100-row statements; Postgres sends one
+    "api/admin/products/bulk": 16,
+    "api/cart": 20,
+    "api/cart/items": 22,
+    "api/cart/items/batch": 12,
+    "api/cart/items/<int:pk>": 10,
+    "api/cart/items/<uuid:pk>": 10,
+    "api/orders/checkout": 30,
+    "api/orders/me": 3,
+    "api/orders/<uuid:pk>": 4,
+    "api/admin/reports/sales": 3,
+    "api/admin/reports/top-products": 3,
+    "token_obtain_pair": 20,
+}
+QUERY_BUDGET_ACTION = os.environ.get("QUERY_BUDGET_ACTION", "log")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -1,12 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/auth/login", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/auth/refresh", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/", include("shop.urls")),
 ]
@@ -0,0 +1,167 @@
+"""
+Admission control for checkout.
+
+A checkout holds a write transaction and stock row locks while it runs, so
+beyond some number of concurrent checkouts each extra one only slows the rest
+down. Under a spike it is better to turn the excess away early and cheaply.
+Two gates run before the transaction opens:
+
+- CheckoutThrottle, a DRF throttle shared by every worker through Django's
+  cache, admits CHECKOUT_RATE checkouts per second on average, in bursts of
+  up to CHECKOUT_BURST. Requests over the rate get 429 with Retry-After.
+- `checkout_limiter` caps checkouts in flight in this process at
+  CHECKOUT_CONCURRENCY, and checkouts touching any one product at
+  CHECKOUT_SKU_CONCURRENCY, so one hot SKU can't take every slot. A request
+  with no free slot waits up to CHECKOUT_QUEUE_TIMEOUT seconds, with at most
+  CHECKOUT_QUEUE_SIZE requests waiting. After that it gets 503 with
+  Retry-After.
+
+The limiter publishes its state as shop_admission_* metrics. A limit set to 0
+turns that gate off; CHECKOUT_RATE is 0 unless configured, as the right rate
+depends on the database behind it.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+from .metrics import describe, registry
+
+CHECKOUT_RATE = getattr(settings, "CHECKOUT_RATE", 0)
+CHECKOUT_BURST = getattr(settings, "CHECKOUT_BURST", 100)
+CHECKOUT_CONCURRENCY = getattr(settings, "CHECKOUT_CONCURRENCY", 8)
+CHECKOUT_SKU_CONCURRENCY = getattr(settings, "CHECKOUT_SKU_CONCURRENCY", 4)
+CHECKOUT_QUEUE_TIMEOUT = getattr(settings, "CHECKOUT_QUEUE_TIMEOUT", 0.5)
+CHECKOUT_QUEUE_SIZE = getattr(settings, "CHECKOUT_QUEUE_SIZE", 32)
+RATE_KEY = "shop:admit:{}:{}"
+
+describe("shop_admission_total", "counter", "Admission decisions by gate and outcome")
+describe("shop_admission_wait_seconds_total", "counter", "Time admitted requests spent queued for a slot")
+describe("shop_admission_in_flight", "gauge", "Requests holding a slot")
+describe("shop_admission_waiting", "gauge", "Requests queued for a slot")
+describe("shop_admission_limit", "gauge", "Slots per process")
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many checkouts in progress, try again shortly."
+    default_code = "overloaded"
+
+    def __init__(self, wait=1):
+        super().__init__()
+        self.wait = wait  # DRF's exception handler turns this into Retry-After
+
+
+class ConcurrencyLimiter:
+    """In-flight cap for this process, plus a cap per key; waiters queue up to a deadline."""
+
+    def __init__(self, name, limit, per_key=0, timeout=0.0, max_waiting=0):
+        self.name, self.limit, self.per_key = name, limit, per_key
+        self.timeout, self.max_waiting = timeout, max_waiting
+        self.cond = threading.Condition()
+        self.in_flight = self.waiting = 0
+        self.keys = Counter()
+        registry.set(f'shop_admission_limit{{gate="{name}"}}', limit)
+
+    def _fits(self, keys):
+        return (not self.limit or self.in_flight < self.limit) and (
+            not self.per_key or all(self.keys[k] < self.per_key for k in keys)
+        )
+
+    def _outcome(self, outcome):
+        registry.inc(f'shop_admission_total{{gate="{self.name}",outcome="{outcome}"}}')
+
+    def _publish(self):
+        registry.set(f'shop_admission_in_flight{{gate="{self.name}"}}', self.in_flight)
+        registry.set(f'shop_admission_waiting{{gate="{self.name}"}}', self.waiting)
+
+    def acquire(self, keys=()):
+        """Take a slot for `keys` (e.g. product ids) or raise Overloaded."""
+        with self.cond:
+            if not self._fits(keys):
+                if self.waiting >= self.max_waiting:
+                    self._outcome("queue_full")
+                    raise Overloaded()
+                started = time.monotonic()
+                self.waiting += 1
+                self._publish()
+                try:
+                    admitted = self.cond.wait_for(lambda: self._fits(keys), self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._publish()
+                    self._outcome("timeout" if self.limit and self.in_flight >= self.limit else "timeout_sku")
+                    raise Overloaded()
+                registry.inc(f'shop_admission_wait_seconds_total{{gate="{self.name}"}}', time.monotonic() - started)
+            self.in_flight += 1
+            self.keys.update(keys)
+            self._publish()
+        self._outcome("admitted")
+
+    def release(self, keys=()):
+        with self.cond:
+            self.in_flight -= 1
+            self.keys.subtract(keys)
+            for k in keys:
+                if self.keys[k] <= 0:
+                    del self.keys[k]
+            self._publish()
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, keys=()):
+        keys = set(keys)
+        self.acquire(keys)
+        try:
+            yield
+        finally:
+            self.release(keys)
+
+checkout_limiter = ConcurrencyLimiter(
+    "checkout", CHECKOUT_CONCURRENCY, CHECKOUT_SKU_CONCURRENCY, CHECKOUT_QUEUE_TIMEOUT, CHECKOUT_QUEUE_SIZE,
+)
+
+
+class CheckoutThrottle(BaseThrottle):
+    """
+    CHECKOUT_RATE/s across all workers with bursts of CHECKOUT_BURST: a token
+    bucket kept as a sliding-window counter. Each window lasts burst/rate
+    seconds, and the previous window's count fades out as the current one
+    fills. Only atomic cache.add/incr are used, so there is no lost update.
+    """
+    scope = "checkout"
+
+    def allow_request(self, request, view):
+        if not CHECKOUT_RATE:
+            return True
+        period = CHECKOUT_BURST / CHECKOUT_RATE
+        window, into = divmod(time.time(), period)
+        key = RATE_KEY.format(self.scope, int(window))
+        cache.add(key, 0, math.ceil(period * 2))
+        try:
+            current = cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            cache.set(key, 1, math.ceil(period * 2))
+            current = 1
+        previous = cache.get(RATE_KEY.format(self.scope, int(window) - 1), 0)
+        fade = 1 - into / period
+        if previous * fade + current <= CHECKOUT_BURST:
+            return True
+        try:
+            cache.decr(key)  # a rejected request doesn't count
+        except ValueError:  # expired or evicted since the incr
+            pass
+        # until enough of the previous window has faded, or at most the end of this one
+        excess = previous * fade + current - CHECKOUT_BURST
+        self.wait_seconds = min(excess * period / previous, period - into) if previous else period - into
+        registry.inc(f'shop_admission_total{{gate="{self.scope}",outcome="throttled"}}')
+        return False
+
+    def wait(self):
+        return max(1, math.ceil(self.wait_seconds))
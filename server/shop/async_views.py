@@ -0,0 +1,121 @@
+"""
+Async twins of the hot read endpoints for ASGI deployments (ASYNC_READ_VIEWS).
+
+Same URLs and JSON as the DRF views in shop.views, which they borrow their
+querysets, filters and pagination from. Queries go through the async ORM
+(`async for`, `aget`, `afirst`) and cache calls through the async cache API,
+so a request waiting on the database or cache does not hold a thread. They
+always render JSON (no browsable API), and errors use DRF's bodies and status codes.
+"""
+import functools
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions
+from rest_framework.request import Request
+from .authentication import JWTAuthentication
+from .cache import acached_catalog_response
+from .db_router import ause_replica
+from .guest_cart import GuestCart, session_key, merge_marker
+from .inventory import astock_map
+from .models import Cart, Order, OrderItem, Product
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
+from .serializers import ORDER_DETAIL_FIELDS, PRODUCT_VALUES, order_head, order_out, products_out, cart_out, guest_cart_out, stock_rows
+from .services import merge_guest_cart
+from .views import ProductList, ProductDetail, MyOrdersView, _cart_rows, _order_summary
+
+_auth = JWTAuthentication()
+_renderer = FastJSONRenderer()
+
+
+def _json(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type=_renderer.media_type)
+
+def _error(request, exc):
+    # rest_framework.views.exception_handler, minus the browsable API
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = _json(data, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response["WWW-Authenticate"] = _auth.authenticate_header(request)
+    return response
+
+def api_view(login_required=False, replica=False):
+    """Run an async GET view on a DRF Request with JWT auth and DRF-style errors; `replica` as ReplicaReadMixin."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            drf = Request(request)
+            try:
+                if request.method not in ("GET", "HEAD"):
+                    raise exceptions.MethodNotAllowed(request.method)
+                auth = await _auth.aauthenticate(drf)
+                drf.user = auth[0] if auth else AnonymousUser()
+                if login_required and not drf.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                if replica:
+                    await ause_replica(drf.user)
+                response = await view(drf, *args, **kwargs)
+            except exceptions.APIException as exc:
+                response = _error(drf, exc)
+            response["Allow"] = "GET, HEAD"
+            patch_vary_headers(response, ["Accept"])
+            return response
+        return wrapper
+    return decorator
+
+
+@api_view(replica=True)
+async def product_list(request):
+    view = ProductList(request=request, format_kwarg=None, args=(), kwargs={})
+
+    async def render():
+        qs = view.filter_queryset(view.get_queryset())
+        extra = ("search_rank",) if "search_rank" in qs.query.annotations else ()
+        paginator = KeysetPagination()
+        rows = await paginator.apaginate_queryset(qs.values(*PRODUCT_VALUES, *extra), request, view=view)
+        stock = await astock_map(stock_rows(rows))
+        return _json(paginator.get_paginated_data(products_out(rows, request, stock=stock)))
+    # same cache scope as the sync view: both modes share entries
+    return await acached_catalog_response(request, "ProductList", render)
+
+@api_view(replica=True)
+async def product_detail(request, pk):
+    async def render():
+        row = await ProductDetail.queryset.filter(pk=pk).values(*PRODUCT_VALUES).afirst()
+        if row is None:
+            raise exceptions.NotFound("No Product matches the given query.")
+        return _json(products_out([row], request, stock=await astock_map(stock_rows([row])))[0])
+    return await acached_catalog_response(request, "ProductDetail", render)
+
+@api_view()
+async def cart(request):
+    if not request.user.is_authenticated:
+        guest = GuestCart.from_request(request)
+        rows = [r async for r in Product.objects.filter(pk__in=list(guest.lines)).values(*PRODUCT_VALUES)]
+        return _json(guest_cart_out(guest.lines, rows, request, stock=await astock_map(stock_rows(rows))))
+    sk = session_key(request)
+    user_cart, _ = await Cart.objects.aget_or_create(user=request.user)
+    if sk and user_cart.merged_session_key != merge_marker(sk):
+        # rare (first read after login): the merge locks and writes, so it keeps its sync transaction
+        await sync_to_async(merge_guest_cart)(user_cart, sk)
+    rows = [r async for r in _cart_rows(user_cart)]
+    return _json(cart_out(rows, request, stock=await astock_map(stock_rows(rows, "product__"))))
+
+@api_view(login_required=True, replica=True)
+async def my_orders(request):
+    paginator = KeysetPagination()
+    orders = await paginator.apaginate_queryset(Order.objects.filter(user=request.user), request, view=MyOrdersView)
+    return _json(paginator.get_paginated_data([_order_summary(o) for o in orders]))
+
+@api_view(login_required=True, replica=True)
+async def order_detail(request, pk):
+    rows = [r async for r in OrderItem.objects.filter(order_id=pk, order__user=request.user).order_by("id").values(*ORDER_DETAIL_FIELDS)]
+    if rows:
+        order = order_head(rows[0])
+    else:
+        order = await Order.objects.filter(pk=pk, user=request.user).values("id", "status", "total_cents", "created_at", "failure").afirst()
+        if order is None:
+            return HttpResponse(status=404, content_type=_renderer.media_type)
+    return _json(order_out(order, rows, request))
@@ -8,9 +8,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .services import get_or_create_cart
+from .authentication import users_by_email
+from .outbox import emit
+from .services import get_or_create_cart, merge_guest_cart
 from .serializers import SignupIn
 from .models import Cart
+from .guest_cart import session_key
 
 SIGNER_SALT = "microcommerce.email.verify"
 TOKEN_MAX_AGE = 60 * 60 * 24  # 24 hours
@@ -29,12 +32,14 @@ class SignupView(APIView):
         data = SignupIn(data=request.data); data.is_valid(raise_exception=True)
         email = data.validated_data["email"].lower()
         password = data.validated_data["password"]
-        if User.objects.filter(email__iexact=email).exists():
+        if users_by_email(email).exists():
             return Response({"error":"EMAIL_TAKEN"}, status=400)
-        user = User.objects.create_user(username=email, email=email, password=password, is_active=False)
-        token = make_verify_token(user.id)
+        with transaction.atomic():
+            user = User.objects.create_user(username=email, email=email, password=password, is_active=False)
+            token = make_verify_token(user.id)
+            # the verification email goes out from `manage.py dispatch_outbox`
+            emit("user.signup", user.id, {"email": email, "token": token})
         verify_link = f'Vericication Token: {token}'
-        print(f"[VERIFY] {email} -> {verify_link}")
         return Response({"ok": True, "verify_link": verify_link}, status=201)
 
 class VerifyEmailView(APIView):
@@ -68,25 +73,10 @@ class TokenObtainMergeSerializer(TokenObtainPairSerializer):
 
         # Merge guest cart (X-Session-Key) into the user's cart
         request = self.context["request"]
-        sk = request.headers.get("X-Session-Key")
+        sk = session_key(request)
         if sk:
-            try:
-                with transaction.atomic():
-                    guest_cart = Cart.objects.select_for_update().filter(session_key=sk).first()
-                    if guest_cart:
-                        user_cart, _ = Cart.objects.get_or_create(user=self.user)
-                        # move items: upsert quantities
-                        for it in guest_cart.items.select_related("product"):
-                            existing = user_cart.items.filter(product=it.product).first()
-                            if existing:
-                                existing.quantity = max(existing.quantity, it.quantity)
-                                existing.save()
-                            else:
-                                user_cart.items.create(product=it.product, quantity=it.quantity)
-                        guest_cart.delete()
-            except Exception:
-                # don't block login if merge fails
-                pass
+            user_cart, _ = Cart.objects.get_or_create(user=self.user)
+            data["cart_merge"] = merge_guest_cart(user_cart, sk)
 
         data["user"] = {"id": self.user.id, "email": self.user.email, "username": self.user.username}
         return data
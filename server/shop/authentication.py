@@ -0,0 +1,246 @@
+"""
+JWT principal resolution without a query per request.
+
+JWTAuthentication resolves the token's user from two cache layers: a
+bounded in-process LRU (PRINCIPAL_LOCAL_SIZE entries, PRINCIPAL_LOCAL_TTL
+seconds), then Django's cache (PRINCIPAL_CACHE_TTL), shared by every
+worker, and only then the database. Entries are keyed by the user id claim
+and hold the user's non-secret columns. Any save or delete of a User
+invalidates both layers, again once the transaction commits, and other
+workers' local copies expire within PRINCIPAL_LOCAL_TTL. Invalidation bumps a
+per-user generation, and a shared entry only counts while it carries the
+current one. A reader that fetched the row before a write committed can't
+cache the old row past it. Code that changes users with QuerySet.update()
+must call invalidate_principal() itself.
+
+EmailBackend lets login use the account email in any case, looked up
+through the lower(email) index.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+PRINCIPAL_CACHE_TTL = getattr(settings, "PRINCIPAL_CACHE_TTL", 30)
+PRINCIPAL_LOCAL_TTL = getattr(settings, "PRINCIPAL_LOCAL_TTL", 5)
+PRINCIPAL_LOCAL_SIZE = getattr(settings, "PRINCIPAL_LOCAL_SIZE", 10_000)
+# the password hash is only needed (and only cached) to check CHECK_REVOKE_TOKEN
+PRINCIPAL_FIELDS = (
+    "id", "username", "email", "first_name", "last_name", "is_active", "is_staff", "is_superuser",
+    "last_login", "date_joined",
+) + (("password",) if api_settings.CHECK_REVOKE_TOKEN else ())
+
+
+@functools.cache
+def principal_fields(model):
+    """PRINCIPAL_FIELDS in the model's column order, as Model.from_db wants them."""
+    return tuple(f.attname for f in model._meta.concrete_fields if f.attname in PRINCIPAL_FIELDS)
+
+def users_by_email(email):
+    """Users whose email matches case-insensitively; `WHERE lower(email) = ...` uses auth_user_email_lower_idx."""
+    return get_user_model()._default_manager.alias(email_lower=Lower("email")).filter(email_lower=email.lower())
+
+
+class LRUCache:
+    """A small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, size, ttl):
+        self.size, self.ttl = size, ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            if len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class PrincipalCache:
+    """
+    User rows (PRINCIPAL_FIELDS values) by user id: the local LRU first, then
+    Django's cache, where each row is stored as (generation, row).
+    """
+
+    def __init__(self):
+        self.local = LRUCache(PRINCIPAL_LOCAL_SIZE, PRINCIPAL_LOCAL_TTL)
+
+    @staticmethod
+    def key(user_id):
+        # the claim may be a str ("1") where the model has an int pk
+        return f"shop:principal:{user_id}"
+
+    @staticmethod
+    def generation_key(user_id):
+        return f"shop:principal-gen:{user_id}"
+
+    def _current(self, user_id, found):
+        entry = found.get(self.key(user_id))
+        if entry is not None and entry[0] == found.get(self.generation_key(user_id), 0):
+            return entry[1]
+        return None
+
+    def get(self, user_id):
+        key = self.key(user_id)
+        row = self.local.get(key)
+        if row is None:
+            row = self._current(user_id, cache.get_many([key, self.generation_key(user_id)]))
+            if row is not None:
+                self.local.set(key, row)
+        return row
+
+    async def aget(self, user_id):
+        key = self.key(user_id)
+        row = self.local.get(key)
+        if row is None:
+            row = self._current(user_id, await cache.aget_many([key, self.generation_key(user_id)]))
+            if row is not None:
+                self.local.set(key, row)
+        return row
+
+    def generation(self, user_id):
+        """Read this before fetching the row that set() will store."""
+        return cache.get(self.generation_key(user_id), 0)
+
+    async def ageneration(self, user_id):
+        return await cache.aget(self.generation_key(user_id), 0)
+
+    def set(self, user_id, generation, row):
+        cache.set(self.key(user_id), (generation, row), PRINCIPAL_CACHE_TTL)
+        self.local.set(self.key(user_id), row)
+
+    async def aset(self, user_id, generation, row):
+        await cache.aset(self.key(user_id), (generation, row), PRINCIPAL_CACHE_TTL)
+        self.local.set(self.key(user_id), row)
+
+    def invalidate(self, user_id):
+        self.local.pop(self.key(user_id))
+        # outlives any entry stamped with the old generation, so an expiry can't bring one back
+        key = self.generation_key(user_id)
+        cache.add(key, 0, PRINCIPAL_CACHE_TTL * 2)
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            cache.set(key, 1, PRINCIPAL_CACHE_TTL * 2)
+        cache.delete(self.key(user_id))
+
+principals = PrincipalCache()
+
+def invalidate_principal(user_id):
+    """Drop a user's cached principal now and again on commit, so a reader racing the write can't keep the old row."""
+    principals.invalidate(user_id)
+    transaction.on_commit(lambda: principals.invalidate(user_id))
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """simplejwt's authentication with the user resolved through `principals`; `aauthenticate` serves the async views."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        row = principals.get(user_id)
+        if row is None:
+            generation = principals.generation(user_id)  # before the SELECT: a write committing after it bumps this
+            row = self._fetch(user_id).first()
+            if row is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            principals.set(user_id, generation, row)
+        return self._check(validated_token, row)
+
+    async def aget_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        row = await principals.aget(user_id)
+        if row is None:
+            generation = await principals.ageneration(user_id)
+            row = await self._fetch(user_id).afirst()
+            if row is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            await principals.aset(user_id, generation, row)
+        return self._check(validated_token, row)
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def _fetch(self, user_id):
+        # always the primary: a lagging replica could hand back a deactivated user
+        return self.user_model.objects.using(DEFAULT_DB_ALIAS).filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values_list(*principal_fields(self.user_model))
+
+    def _check(self, validated_token, row):
+        # a fresh instance per request; columns outside PRINCIPAL_FIELDS load on first access
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, principal_fields(self.user_model), row)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class EmailBackend(ModelBackend):
+    """ModelBackend that also takes the account email, in any case, as the username."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            matches = list(users_by_email(username)[:2]) if "@" in username else []
+            if len(matches) != 1:
+                # same hashing cost as a real check (see ModelBackend.authenticate)
+                UserModel().set_password(password)
+                return None
+            user = matches[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
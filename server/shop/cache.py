@@ -0,0 +1,140 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import status
+from .db_router import CATALOG, pin
+from .inventory import astock_map, stock_map
+from .models import Product
+
+CATALOG_CACHE_TTL = getattr(settings, "CATALOG_CACHE_TTL", 300)
+CATALOG_STOCK_TTL = getattr(settings, "CATALOG_STOCK_TTL", 5)
+VERSION_KEY = "shop:catalog:version"
+
+
+def catalog_version():
+    v = cache.get(VERSION_KEY)
+    if v is None:
+        # a fresh/evicted counter must not collide with pages cached under an old one
+        v = int(time.time() * 1000)
+        cache.add(VERSION_KEY, v, None)
+        v = cache.get(VERSION_KEY, v)
+    return v
+
+async def acatalog_version():
+    v = await cache.aget(VERSION_KEY)
+    if v is None:
+        v = int(time.time() * 1000)
+        await cache.aadd(VERSION_KEY, v, None)
+        v = await cache.aget(VERSION_KEY, v)
+    return v
+
+def bump_catalog_version():
+    # pin first: a reader that sees the new version must not fill it from a lagging replica
+    pin(CATALOG)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalog_version()
+
+
+def _page_key(request, scope, version):
+    params = sorted(request.query_params.lists())
+    raw = f"{request.scheme}://{request.get_host()}{request.path}?{params}"
+    return f"shop:catalog:{version}:{scope}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+def _items(data):
+    return data.get("results", []) if "results" in data else [data]
+
+def _etag(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+def _entry(body):
+    return {"body": body, "etag": _etag(body), "stock_at": time.time()}
+
+def _cached_items(entry):
+    data = json.loads(entry["body"])
+    return data, _items(data)
+
+def _apply_stock(entry, data, items, stock):
+    """Overlay fresh `stock` ({pk: n}) on the cached items; re-render if anything moved."""
+    changed = False
+    for item in items:
+        n = stock.get(Product._meta.pk.to_python(item["id"]), 0)
+        if item.get("stock") != n:
+            item["stock"] = n; changed = True
+    if changed:
+        entry["body"] = json.dumps(data).encode()
+        entry["etag"] = _etag(entry["body"])
+    entry["stock_at"] = time.time()
+    return changed
+
+def _refresh_stock(entry):
+    """Stock overlay: re-read availability for the page's products and re-render if it moved."""
+    data, items = _cached_items(entry)
+    rows = Product.objects.filter(pk__in=[i["id"] for i in items]).values_list("id", "stock", "stock_shards")
+    return _apply_stock(entry, data, items, stock_map(rows))
+
+async def _arefresh_stock(entry):
+    data, items = _cached_items(entry)
+    rows = Product.objects.filter(pk__in=[i["id"] for i in items]).values_list("id", "stock", "stock_shards")
+    return _apply_stock(entry, data, items, await astock_map([r async for r in rows]))
+
+def _respond(request, entry):
+    if request.headers.get("If-None-Match") == entry["etag"]:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(entry["body"], content_type="application/json")
+    response["ETag"] = entry["etag"]
+    return response
+
+
+def cached_catalog_response(request, scope, render):
+    """
+    Read-through cache for public catalog GETs.
+    `render()` produces the finalized DRF response on a miss; 200 JSON bodies are stored per
+    catalog version + URL, and stock is refreshed every CATALOG_STOCK_TTL seconds.
+    """
+    if request.accepted_renderer.format != "json":
+        return render()
+
+    key = _page_key(request, scope, catalog_version())
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        response.render()
+        entry = _entry(response.content)
+        cache.set(key, entry, CATALOG_CACHE_TTL)
+    elif time.time() - entry["stock_at"] > CATALOG_STOCK_TTL:
+        _refresh_stock(entry)
+        cache.set(key, entry, CATALOG_CACHE_TTL)
+    return _respond(request, entry)
+
+async def acached_catalog_response(request, scope, render):
+    """cached_catalog_response for async views; `render` is a coroutine function returning an HttpResponse."""
+    key = _page_key(request, scope, await acatalog_version())
+    entry = await cache.aget(key)
+    if entry is None:
+        response = await render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = _entry(response.content)
+        await cache.aset(key, entry, CATALOG_CACHE_TTL)
+    elif time.time() - entry["stock_at"] > CATALOG_STOCK_TTL:
+        await _arefresh_stock(entry)
+        await cache.aset(key, entry, CATALOG_CACHE_TTL)
+    return _respond(request, entry)
+
+
+class CatalogCacheMixin:
+    """Serve a generic view's GET through cached_catalog_response."""
+    cache_scope = None
+
+    def get(self, request, *args, **kwargs):
+        def render():
+            return self.finalize_response(request, super(CatalogCacheMixin, self).get(request, *args, **kwargs))
+        return cached_catalog_response(request, self.cache_scope or type(self).__name__, render)
@@ -0,0 +1,254 @@
+"""
+Streaming catalog import/export as CSV or JSON Lines.
+
+import_products upserts rows by SKU one chunk at a time: one lookup of the
+chunk's existing SKUs, one INSERT ... ON CONFLICT (sku) DO UPDATE per
+distinct column set, and a search re-index of the chunk. A bad row is
+reported and skipped, never the whole run. If a chunk's write fails in the
+database, its rows are retried one by one to isolate the culprit. Images
+named in an `image` column can be copied from a local directory by a thread
+pool. They are stored under a content hash, so re-imports reuse the file.
+
+export_rows walks the catalog with iterator(chunk_size=...), so memory
+stays flat at any catalog size.
+"""
+import csv
+import hashlib
+import io
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from PIL import Image
+from .cache import bump_catalog_version
+from .images import IMAGE_ERRORS, PRODUCT_IMAGE_VARIANTS_ON_SAVE, record_variants, render_variants
+from .models import Product
+from .search import rebuild_index
+
+IMPORT_CHUNK_SIZE = getattr(settings, "IMPORT_CHUNK_SIZE", 1000)
+FIELDS = ("sku", "name", "description", "price_cents", "currency", "stock", "is_active", "image")
+# a new SKU needs these; existing ones may be updated column by column
+REQUIRED = ("sku", "name", "price_cents")
+# an empty value clears these; for the rest an empty CSV cell means "leave as is"
+CLEARABLE = ("description", "image")
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    suffix = Path(path).suffix.lower().lstrip(".")
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(suffix)
+
+
+def read_rows(fp, fmt):
+    """Yield (line number, raw dict or None, parse error or None) from a text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(fp)
+        for raw in reader:
+            yield reader.line_num, raw, None
+        return
+    for n, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            yield n, None, f"invalid JSON: {e}"
+            continue
+        yield (n, raw, None) if isinstance(raw, dict) else (n, None, "expected a JSON object")
+
+
+def clean_row(raw):
+    """Model-typed values for the known columns present in `raw`; raises ValidationError."""
+    values, errors = {}, {}
+    for name in FIELDS:
+        value = raw.get(name)
+        if isinstance(value, str) and name != "description":
+            value = value.strip()
+        if value is None or (value == "" and name not in CLEARABLE):
+            continue
+        if name == "image":
+            values[name] = str(value)
+            continue
+        try:
+            values[name] = Product._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if "sku" not in values and "sku" not in errors:
+        errors["sku"] = ["This field is required."]
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def store_image(directory, name):
+    """Copy `directory/name` into storage under a content-hashed name; returns (name, variant sizes or None)."""
+    root = Path(directory).resolve()
+    path = (root / name).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"{name} is outside the image directory")
+    data = path.read_bytes()
+    with Image.open(io.BytesIO(data)) as img:
+        img.verify()
+    upload_to = Product._meta.get_field("image").upload_to
+    target = f"{upload_to}{path.stem[:48]}.{hashlib.sha256(data).hexdigest()[:16]}{path.suffix.lower()}"
+    if not default_storage.exists(target):
+        target = default_storage.save(target, ContentFile(data))
+    return target, render_variants(target) if PRODUCT_IMAGE_VARIANTS_ON_SAVE else None
+
+
+class Importer:
+    """Upsert cleaned rows by SKU in chunks; counts land in `created`/`updated`, bad rows go to `on_error`."""
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, images_dir=None, image_workers=4, on_error=None):
+        self.chunk_size = chunk_size
+        self.images_dir = images_dir
+        self.image_workers = image_workers
+        self.on_error = on_error or (lambda line, sku, message: None)
+        self.created = self.updated = self.failed = 0
+        self.errors = []  # the current chunk's, reported in line order once it is done
+
+    def error(self, line, sku, message):
+        self.failed += 1
+        self.errors.append((line, sku, message))
+
+    def run(self, rows):
+        rows = iter(rows)
+        with ThreadPoolExecutor(self.image_workers) if self.images_dir else nullcontext() as pool:
+            while chunk := list(islice(rows, self.chunk_size)):
+                try:
+                    self._chunk(chunk, pool)
+                finally:
+                    for error in sorted(self.errors, key=lambda e: e[0]):
+                        self.on_error(*error)
+                    self.errors = []
+        if self.created or self.updated:
+            bump_catalog_version()
+        return self
+
+    def _chunk(self, rows, pool):
+        chunk = {}  # sku -> (line, values); a later row for the same SKU wins
+        for line, raw, error in rows:
+            if error is None:
+                try:
+                    values = clean_row(raw)
+                except ValidationError as e:
+                    error = "; ".join(f"{k}: {' '.join(v)}" for k, v in e.message_dict.items())
+            if error:
+                self.error(line, (raw or {}).get("sku"), error)
+            else:
+                chunk[values["sku"]] = (line, values)
+
+        existing = {
+            sku: rest for sku, *rest in
+            Product.objects.filter(sku__in=list(chunk)).values_list("sku", "stock_shards", *REQUIRED[1:])
+        }
+        for sku, (line, values) in list(chunk.items()):
+            fields = tuple(sorted(values))
+            if sku in existing:
+                shards, *required = existing[sku]
+                if shards and "stock" in values:
+                    self.error(line, sku, "stock is sharded; run shard_stock --merge first")
+                    del chunk[sku]
+                    continue
+                # INSERT ... ON CONFLICT still checks NOT NULL: carry the stored values, update only `fields`
+                values = {**dict(zip(REQUIRED[1:], required)), **values}
+            elif missing := [f for f in REQUIRED if f not in values]:
+                self.error(line, sku, f"new SKU needs {', '.join(missing)}")
+                del chunk[sku]
+                continue
+            chunk[sku] = (line, values, fields)
+
+        variants = self._images(chunk, pool) if self.images_dir else {}
+        with transaction.atomic():
+            written = self._write(chunk)
+            if not written:
+                return
+            ids = dict(Product.objects.filter(sku__in=list(written)).values_list("sku", "pk"))
+            rebuild_index(product_ids=list(ids.values()))
+        self.created += len(written - existing.keys())
+        self.updated += len(written & existing.keys())
+        for sku, (source, sizes) in variants.items():
+            if sku in written and sizes is not None:
+                record_variants(ids[sku], source, sizes)
+
+    def _images(self, chunk, pool):
+        """Store every named image of the chunk in parallel; rows whose image fails are dropped."""
+        named = {sku: values["image"] for sku, (_, values, _) in chunk.items() if values.get("image")}
+        stored = {}
+        futures = {sku: pool.submit(store_image, self.images_dir, name) for sku, name in named.items()}
+        for sku, future in futures.items():
+            try:
+                stored[sku] = future.result()
+            except (ValueError, *IMAGE_ERRORS) as e:
+                self.error(chunk.pop(sku)[0], sku, f"image {named[sku]}: {e}")
+                continue
+            chunk[sku][1]["image"] = stored[sku][0]
+        return stored
+
+    def _write(self, chunk):
+        """Upsert the chunk; returns the SKUs written."""
+        groups = defaultdict(list)
+        for _, values, fields in chunk.values():
+            groups[fields].append(values)
+        try:
+            with transaction.atomic():
+                for fields, batch in groups.items():
+                    _upsert(fields, batch)
+            return set(chunk)
+        except DatabaseError:
+            pass
+        # one bad row (out of range, over a column limit) failed the batch: find it
+        written = set()
+        for sku, (line, values, fields) in chunk.items():
+            try:
+                with transaction.atomic():
+                    _upsert(fields, [values])
+                written.add(sku)
+            except DatabaseError as e:
+                self.error(line, sku, str(e).strip())
+        return written
+
+
+def _upsert(fields, rows):
+    update = [f for f in fields if f != "sku"] + ["updated_at"]
+    Product.objects.bulk_create(
+        [Product(**values) for values in rows], update_conflicts=True, unique_fields=["sku"], update_fields=update,
+    )
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """
+    Yield one dict per product (FIELDS, in SKU order). Sharded stock is left
+    empty (None), which the importer reads as "leave as is", so an exported
+    file imports back unchanged.
+    """
+    qs = (Product.objects.all() if queryset is None else queryset).order_by("sku")
+    rows = qs.values_list("stock_shards", *FIELDS).iterator(chunk_size=chunk_size)
+    for shards, *values in rows:
+        row = dict(zip(FIELDS, values))
+        if shards:
+            row["stock"] = None
+        row["image"] = row["image"] or ""
+        yield row
+
+
+def write_rows(fp, fmt, rows):
+    n = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(fp, fieldnames=FIELDS)
+        writer.writeheader()
+        for n, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return n
+    for n, row in enumerate(rows, 1):
+        fp.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return n
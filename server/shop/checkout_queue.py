@@ -0,0 +1,94 @@
+"""
+Worker side of async checkout: "pending" Orders are the queue.
+
+claim_batch moves up to N pending orders to "processing" under a claim token
+(SELECT ... FOR UPDATE SKIP LOCKED where the database has it; on SQLite a
+guarded UPDATE, which is safe because SQLite serializes writers), and
+process_order takes the stock and settles each order as "paid" or "cancelled",
+emitting the matching outbox event in the same transaction.
+"""
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .inventory import decrement_stock, available_stock
+from .models import Order, OrderItem, Product
+from .outbox import emit, emit_many, order_payload, stock_payload
+
+CHECKOUT_BATCH_SIZE = getattr(settings, "CHECKOUT_BATCH_SIZE", 50)
+# a "processing" order older than this belongs to a dead worker and is re-queued
+CHECKOUT_CLAIM_TIMEOUT = getattr(settings, "CHECKOUT_CLAIM_TIMEOUT", 300)
+
+
+def requeue_stale(timeout=None):
+    cutoff = timezone.now() - timedelta(seconds=timeout or CHECKOUT_CLAIM_TIMEOUT)
+    return Order.objects.filter(status="processing", claimed_at__lt=cutoff).update(
+        status="pending", claimed_by=None, claimed_at=None
+    )
+
+def claim_batch(batch_size=None):
+    """Claim up to batch_size pending orders, oldest first. Returns (token, [order ids])."""
+    batch_size = batch_size or CHECKOUT_BATCH_SIZE
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        pending = Order.objects.filter(status="pending").order_by("created_at")
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return token, []
+        # guarded on status so a row claimed elsewhere in the meantime is not taken twice
+        Order.objects.filter(id__in=ids, status="pending").update(
+            status="processing", claimed_by=token, claimed_at=timezone.now()
+        )
+    return token, list(Order.objects.filter(claimed_by=token, status="processing").values_list("id", flat=True))
+
+def process_order(order_id, token):
+    """Take stock for one claimed order; returns the final status, or None if the claim was lost."""
+    with transaction.atomic():
+        items = list(OrderItem.objects.filter(order_id=order_id).select_related("product"))
+        lost = decrement_stock(
+            {it.product_id: it.quantity for it in items},
+            sharded={it.product_id for it in items if it.product.stock_shards},
+        )
+        if not lost:
+            settled = Order.objects.filter(pk=order_id, claimed_by=token).update(
+                status="paid", claimed_by=None, paid_at=timezone.now()
+            )
+            if not settled:
+                # our claim went stale and another worker holds the order: give the stock back
+                transaction.set_rollback(True)
+                return None
+            order = Order.objects.get(pk=order_id)
+            emit_many([("order.paid", order_id, order_payload(order, items)),
+                       ("stock.changed", order_id, stock_payload(items))])
+            return "paid"
+        transaction.set_rollback(True)
+
+    fresh = Product.objects.in_bulk(lost)
+    failure = {
+        "error": "INSUFFICIENT_STOCK_AT_CHECKOUT",
+        "items": [
+            {"product_id": str(it.product_id), "name": it.product.name, "requested": it.quantity,
+             "available": available_stock(fresh[it.product_id])}
+            for it in items if it.product_id in lost
+        ],
+    }
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, claimed_by=token).update(
+            status="cancelled", claimed_by=None, failure=failure
+        ):
+            return None
+        order = Order.objects.get(pk=order_id)
+        emit("order.cancelled", order_id, {**order_payload(order, items), "failure": failure})
+    return "cancelled"
+
+def drain(batch_size=None):
+    """Process one claimed batch. Returns {status: count}."""
+    token, ids = claim_batch(batch_size)
+    counts = {}
+    for order_id in ids:
+        s = process_order(order_id, token) or "lost"
+        counts[s] = counts.get(s, 0) + 1
+    return counts
@@ -0,0 +1,139 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+Replica aliases (`replica1`, `replica2`, ... from DATABASE_REPLICA_URLS) only
+serve the read-only views that opt in with ReplicaReadMixin (the catalog and
+order history). Everything else, writes included, stays on `default`. A
+request that writes to the primary pins its user to the primary for
+REPLICA_PIN_SECONDS, and a catalog change pins every catalog reader, so nobody
+reads their own write back from a lagging replica. With no replica configured
+all of this is a no-op.
+"""
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+REPLICAS = [alias for alias in settings.DATABASES if alias.startswith("replica")]
+REPLICA_PIN_SECONDS = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+PIN_KEY = "shop:db:pin:{}"
+CATALOG = "catalog"
+WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# {"alias": replica chosen for this request or None, "wrote": bool}
+_state = ContextVar("shop_db_state", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        return state["alias"] if state and not state["wrote"] else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _track(execute, sql, params, many, context):
+    state = _state.get()
+    if state is not None and not state["wrote"] and context["connection"].alias == DEFAULT_DB_ALIAS \
+            and sql.lstrip()[:7].upper().startswith(WRITES):
+        state["wrote"] = True
+    return execute(sql, params, many, context)
+
+def install(connection, **kwargs):
+    if _track not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track)
+
+connection_created.connect(install)
+
+
+def pin(scope, seconds=None):
+    """Keep `scope` (a user id, or CATALOG) on the primary for `seconds`."""
+    if REPLICAS:
+        cache.set(PIN_KEY.format(scope), 1, REPLICA_PIN_SECONDS if seconds is None else seconds)
+
+def _pin_keys(user):
+    keys = [PIN_KEY.format(CATALOG)]
+    if user is not None and user.is_authenticated:
+        keys.append(PIN_KEY.format(user.pk))
+    return keys
+
+def _choose(state, pinned):
+    if not pinned:
+        state["alias"] = random.choice(REPLICAS)
+    return state["alias"]
+
+def use_replica(user=None):
+    """Route the rest of this request's reads to a replica unless `user` or the catalog is pinned; returns the alias or None."""
+    state = _state.get()
+    if not REPLICAS or state is None or state["wrote"]:
+        return None
+    return _choose(state, cache.get_many(_pin_keys(user)))
+
+async def ause_replica(user=None):
+    state = _state.get()
+    if not REPLICAS or state is None or state["wrote"]:
+        return None
+    return _choose(state, await cache.aget_many(_pin_keys(user)))
+
+
+class ReplicaReadMixin:
+    """For read-only DRF views: once the caller is authenticated, read from a replica unless pinned."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        use_replica(request.user)
+
+
+class ReplicaMiddleware:
+    """Scope replica routing to the request; pin the user to the primary if the request wrote."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not REPLICAS:
+            return self.get_response(request)
+        for conn in connections.all():
+            install(conn)  # ones opened before this module was imported
+        state = {"alias": None, "wrote": False}
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        user = getattr(request, "user", None)
+        if state["wrote"] and user is not None and user.is_authenticated:
+            pin(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        if not REPLICAS:
+            return await self.get_response(request)
+        state = {"alias": None, "wrote": False}
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        # DRF views have swapped the lazy session user for the authenticated one by now
+        user = getattr(request, "user", None)
+        if state["wrote"] and user is not None and user.is_authenticated:
+            await cache.aset(PIN_KEY.format(user.pk), 1, REPLICA_PIN_SECONDS)
+        return response
@@ -1,11 +1,16 @@
 import django_filters as df
 from .models import Product
+from .search import search
 
 class ProductFilter(df.FilterSet):
-    q = df.CharFilter(field_name="name", lookup_expr="icontains")
+    q = df.CharFilter(method="filter_q")
     min_price = df.NumberFilter(field_name="price_cents", lookup_expr="gte")
     max_price = df.NumberFilter(field_name="price_cents", lookup_expr="lte")
 
     class Meta:
         model = Product
         fields = ["q", "min_price", "max_price"]
+
+    def filter_q(self, queryset, name, value):
+        # full-text over name/description/sku, ranked; see shop/search.py
+        return search(queryset, value)
@@ -0,0 +1,82 @@
+"""
+Garbage collection for rows nothing will read again: abandoned guest carts
+(and their items), inactive users whose verification token has expired,
+expired Idempotency-Key records and delivered outbox events.
+
+Each collector walks its candidates with keyset iteration on an indexed
+(timestamp, id) tuple and deletes one bounded batch per short transaction,
+re-checking the staleness condition in the DELETE so a row touched in the
+meantime survives. They yield one report per batch.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .auth_views import TOKEN_MAX_AGE
+from .models import Cart, IdempotencyKey, Order, OutboxEvent
+
+GC_CART_DAYS = getattr(settings, "GC_CART_DAYS", 30)
+GC_USER_DAYS = getattr(settings, "GC_USER_DAYS", 7)
+GC_OUTBOX_DAYS = getattr(settings, "GC_OUTBOX_DAYS", 7)
+GC_BATCH_SIZE = getattr(settings, "GC_BATCH_SIZE", 500)
+
+
+def _batches(stale, key, batch_size, dry_run, pause):
+    """Keyset-walk `stale` on (key, pk); delete (or count) each batch in its own transaction."""
+    after = None
+    while True:
+        started = time.monotonic()
+        qs = stale.order_by(key, "pk")
+        if after is not None:
+            qs = qs.filter(Q(**{f"{key}__gt": after[0]}) | Q(**{key: after[0], "pk__gt": after[1]}))
+        page = list(qs.values_list(key, "pk")[:batch_size])
+        if not page:
+            return
+        after = page[-1]
+        ids = [pk for _, pk in page]
+        if dry_run:
+            deleted = {stale.model._meta.label: len(ids)}
+        else:
+            with transaction.atomic():
+                _, deleted = stale.filter(pk__in=ids).delete()
+        yield {"rows": sum(deleted.values()), "deleted": deleted, "ms": round((time.monotonic() - started) * 1000, 1)}
+        if len(page) < batch_size:
+            return
+        if pause:
+            time.sleep(pause)
+
+
+def collect_carts(days=GC_CART_DAYS, batch_size=GC_BATCH_SIZE, dry_run=False, pause=0):
+    """Guest (user-less) carts not updated for `days`, with their items."""
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff)
+    return _batches(stale, "updated_at", batch_size, dry_run, pause)
+
+def collect_users(days=GC_USER_DAYS, batch_size=GC_BATCH_SIZE, dry_run=False, pause=0):
+    """
+    Never-verified accounts older than `days` (and than the verify-token lifetime):
+    inactive, never logged in, no orders.
+    """
+    cutoff = timezone.now() - max(timedelta(days=days), timedelta(seconds=TOKEN_MAX_AGE))
+    stale = get_user_model().objects.filter(
+        is_active=False, last_login__isnull=True, date_joined__lt=cutoff,
+    ).filter(~Exists(Order.objects.filter(user=OuterRef("pk"))))
+    return _batches(stale, "date_joined", batch_size, dry_run, pause)
+
+def collect_idempotency_keys(batch_size=GC_BATCH_SIZE, dry_run=False, pause=0):
+    stale = IdempotencyKey.objects.filter(expires_at__lt=timezone.now())
+    return _batches(stale, "expires_at", batch_size, dry_run, pause)
+
+def collect_outbox_events(days=GC_OUTBOX_DAYS, batch_size=GC_BATCH_SIZE, dry_run=False, pause=0):
+    """Outbox events delivered more than `days` ago; dead ones stay for inspection."""
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = OutboxEvent.objects.filter(status="delivered", delivered_at__lt=cutoff)
+    return _batches(stale, "delivered_at", batch_size, dry_run, pause)
+
+COLLECTORS = {
+    "carts": collect_carts, "users": collect_users, "idempotency": collect_idempotency_keys,
+    "outbox": collect_outbox_events,
+}
@@ -0,0 +1,73 @@
+"""
+Stateless carts for anonymous visitors.
+
+The cart lives in a signed, compressed token (django.core.signing, like the
+email verification tokens) that travels in the `X-Session-Key` header / `sk`
+cookie; a mutation answers with the new token in the same channel. Nothing is
+written to the database until the token is merged into a user cart at login
+(or on the first authenticated request, e.g. checkout).
+
+Keys that are not valid tokens (older clients' random session keys) are still
+accepted for the login merge of their DB guest cart.
+"""
+import hashlib
+import uuid
+from django.conf import settings
+from django.core import signing
+
+SESSION_HEADER = "X-Session-Key"
+SESSION_COOKIE = "sk"
+GUEST_CART_SALT = "microcommerce.guest-cart"
+GUEST_CART_MAX_AGE = getattr(settings, "GUEST_CART_MAX_AGE", 60 * 60 * 24 * 30)
+# keeps the token well inside header/cookie size limits
+GUEST_CART_MAX_LINES = 100
+
+
+def session_key(request):
+    return request.headers.get(SESSION_HEADER) or request.COOKIES.get(SESSION_COOKIE)
+
+def merge_marker(key):
+    """What Cart.merged_session_key records for `key`: tokens change on every edit, so store their digest."""
+    return hashlib.sha256(key.encode()).hexdigest() if ":" in key else key
+
+
+class GuestCart:
+    """{product_id: quantity} for an anonymous visitor, round-tripped through a signed token."""
+
+    def __init__(self, lines=None):
+        self.lines = dict(lines or {})
+        self.changed = False
+
+    @classmethod
+    def from_token(cls, token):
+        """The cart in `token`, or None when it is not a valid (unexpired) guest-cart token."""
+        if not token or ":" not in token:
+            return None
+        try:
+            data = signing.loads(token, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+            return cls({uuid.UUID(pid): int(qty) for pid, qty in data["l"]})
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+    @classmethod
+    def from_request(cls, request):
+        # a missing, tampered or expired token is just an empty cart
+        return cls.from_token(session_key(request)) or cls()
+
+    def set(self, product_id, quantity):
+        if quantity > 0:
+            self.lines[product_id] = quantity
+        else:
+            self.lines.pop(product_id, None)
+        self.changed = True
+
+    def token(self):
+        return signing.dumps({"l": [[pid.hex, q] for pid, q in self.lines.items()]}, salt=GUEST_CART_SALT, compress=True)
+
+    def attach(self, response):
+        """Hand the updated token back to the client, if the cart changed."""
+        if self.changed:
+            token = self.token()
+            response[SESSION_HEADER] = token
+            response.set_cookie(SESSION_COOKIE, token, max_age=GUEST_CART_MAX_AGE, httponly=True, samesite="Lax")
+        return response
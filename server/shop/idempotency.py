@@ -0,0 +1,79 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = getattr(settings, "IDEMPOTENCY_TTL", 60 * 60 * 24)
+
+
+def _owner(request):
+    # anonymous carts are signed tokens: resending the same token already replays the same result
+    if request.user and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return None
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"error": "IDEMPOTENCY_KEY_REUSED", "detail": "Key was used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view_method):
+    """
+    Honour an `Idempotency-Key` header on a write view.
+
+    The key row is inserted in the same transaction as the view's work and
+    committed with the response, so a concurrent duplicate blocks on the unique
+    (owner, key) index until the first attempt finishes, then replays the stored
+    response instead of re-running. 5xx outcomes roll back and stay retryable.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        owner = _owner(request)
+        if not key or not owner:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 128:
+            return Response({"error": "INVALID_IDEMPOTENCY_KEY"}, status=status.HTTP_400_BAD_REQUEST)
+        fingerprint = _fingerprint(request)
+
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        owner=owner, key=key, fingerprint=fingerprint, response_status=0,
+                        expires_at=timezone.now() + timedelta(seconds=IDEMPOTENCY_TTL),
+                    )
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code >= 500:
+                        transaction.set_rollback(True)
+                        return response
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=["response_status", "response_body"])
+                    return response
+            except IntegrityError:
+                existing = IdempotencyKey.objects.filter(owner=owner, key=key).first()
+                if existing is None:
+                    raise  # not our key row: a genuine integrity error from the view
+                if existing.expires_at > timezone.now():
+                    return _replay(existing, fingerprint)
+                existing.delete()  # expired: claim it afresh
+        return view_method(self, request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,106 @@
+"""
+Pre-sized product image variants.
+
+Each uploaded `Product.image` is rendered to every size in PRODUCT_IMAGE_SIZES
+as WebP and JPEG under `variants/`, named after a hash of the source bytes and
+the render settings, so a URL never changes content and can be cached forever
+(ProductImageMiddleware serves them immutable). `Product.image_variants`
+records the source name and the generated files.
+"""
+import hashlib
+import io
+import logging
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# False leaves new uploads to `manage.py build_image_variants` (e.g. from cron)
+PRODUCT_IMAGE_VARIANTS_ON_SAVE = getattr(settings, "PRODUCT_IMAGE_VARIANTS_ON_SAVE", True)
+# label -> longest edge in px
+PRODUCT_IMAGE_SIZES = getattr(settings, "PRODUCT_IMAGE_SIZES", {"thumb": 160, "card": 480, "detail": 1200})
+VARIANT_DIR = "variants"
+# what a bad upload raises while decoding
+IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def _digest(data):
+    spec = repr((sorted(PRODUCT_IMAGE_SIZES.items()), sorted((k, sorted(v[1].items())) for k, v in FORMATS.items())))
+    return hashlib.sha256(data + spec.encode()).hexdigest()[:16]
+
+def _encode(img, fmt):
+    kind, options = FORMATS[fmt]
+    if kind == "JPEG" and img.mode != "RGB":
+        # flatten transparency onto white rather than letting it go black
+        rgba = img.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        img = flat
+    buf = io.BytesIO()
+    img.save(buf, kind, **options)
+    return buf.getvalue()
+
+
+def render_variants(source):
+    """
+    Write every size/format of storage file `source`; returns {label: {fmt: name}}.
+    Files that already exist are left alone, so re-running is cheap.
+    """
+    with default_storage.open(source, "rb") as f:
+        data = f.read()
+    stem = os.path.splitext(os.path.basename(source))[0]
+    digest = _digest(data)
+    original = None
+    out = {}
+    for label, edge in PRODUCT_IMAGE_SIZES.items():
+        out[label] = {}
+        for fmt in FORMATS:
+            name = f"{VARIANT_DIR}/{stem}.{digest}.{label}.{fmt}"
+            if not default_storage.exists(name):
+                if original is None:
+                    original = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+                    if original.mode not in ("RGB", "RGBA"):
+                        original = original.convert("RGBA" if original.has_transparency_data else "RGB")
+                img = original.copy()
+                img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+                name = default_storage.save(name, ContentFile(_encode(img, fmt)))
+            out[label][fmt] = name
+    return out
+
+def variants_stale(image_name, variants):
+    return bool(image_name) and (variants or {}).get("source") != image_name
+
+def record_variants(product_id, source, sizes):
+    # guarded on the image so a newer upload racing this render is not overwritten
+    return bool(Product.objects.filter(pk=product_id, image=source).update(image_variants={"source": source, "sizes": sizes}))
+
+def build_variants(product_id):
+    """Render variants for one product's current image and record them. Returns True if updated."""
+    row = Product.objects.filter(pk=product_id).values("image", "image_variants").first()
+    if row is None or not variants_stale(row["image"], row["image_variants"]):
+        return False
+    if record_variants(product_id, row["image"], render_variants(row["image"])):
+        bump_catalog_version()
+        return True
+    return False
+
+def build_variants_on_commit(product_id):
+    # runs after the save's response is decided: a bad upload is logged, not turned into a 500
+    try:
+        build_variants(product_id)
+    except IMAGE_ERRORS:
+        logger.exception("image variants failed for product %s", product_id)
+
+
+def variant_urls(variants, url):
+    """{label: {fmt: url}} for an image_variants value; `url` maps a storage name to its URL."""
+    return {label: {fmt: url(name) for fmt, name in files.items()} for label, files in (variants or {}).get("sizes", {}).items()}
@@ -0,0 +1,156 @@
+import random
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from .models import Product, StockShard
+
+SHARD_STOCK_TTL = getattr(settings, "SHARD_STOCK_TTL", 2)
+
+
+def decrement_stock(lines, sharded=()):
+    """
+    Apply every decrement in `lines` ({product_id: quantity}) as one guarded
+    UPDATE ... SET stock = stock - qty WHERE stock >= qty statement.
+    No rows are locked up front; the database arbitrates concurrent buyers.
+    Product ids in `sharded` are taken from their StockShard rows instead.
+    Returns the set of product ids whose decrement did not apply (lost the race).
+    Callers must run inside a transaction and roll back when the set is non-empty.
+    """
+    lost = {pid for pid in sharded if pid in lines and not _decrement_shards(pid, lines[pid])}
+    lines = {pid: qty for pid, qty in lines.items() if pid not in sharded}
+    if not lines:
+        return lost
+
+    field = Product._meta.pk
+    qn = connection.ops.quote_name
+    table, pk_col, stock_col = qn(Product._meta.db_table), qn(field.column), qn("stock")
+
+    keys = [field.get_db_prep_value(pid, connection) for pid in lines]
+    case_params = []
+    for key, qty in zip(keys, lines.values()):
+        case_params += [key, int(qty)]
+    case = f"CASE {pk_col} {' '.join(['WHEN %s THEN %s'] * len(keys))} END"
+    in_list = ", ".join(["%s"] * len(keys))
+
+    sql = (
+        f"UPDATE {table} SET {stock_col} = {stock_col} - {case} "
+        f"WHERE {pk_col} IN ({in_list}) AND {stock_col} >= {case} "
+        f"RETURNING {pk_col}"
+    )
+    params = case_params + keys + case_params
+
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        applied = {field.to_python(row[0]) for row in cur.fetchall()}
+    return lost | {pid for pid in lines if field.to_python(pid) not in applied}
+
+
+def _decrement_shards(product_id, qty):
+    shards = list(StockShard.objects.filter(product_id=product_id).values_list("shard", flat=True))
+    random.shuffle(shards)
+    for k in shards:
+        if StockShard.objects.filter(product_id=product_id, shard=k, stock__gte=qty).update(stock=F("stock") - qty):
+            return True
+    # No single shard covers qty: lock the siblings and drain them in order.
+    rows = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by("shard"))
+    if sum(r.stock for r in rows) < qty:
+        return False
+    for r in rows:
+        take = min(r.stock, qty)
+        if take:
+            StockShard.objects.filter(pk=r.pk).update(stock=F("stock") - take)
+            qty -= take
+    return True
+
+
+def _shard_total(product_id):
+    return StockShard.objects.filter(product_id=product_id).aggregate(n=Sum("stock"))["n"] or 0
+
+def available_stock(product):
+    """Stock a client may buy now; sharded products read a short-TTL cached rollup."""
+    if not product.stock_shards:
+        return product.stock
+    key = f"shop:stock:{product.pk}"
+    n = cache.get(key)
+    if n is None:
+        n = _shard_total(product.pk)
+        cache.set(key, n, SHARD_STOCK_TTL)
+    return n
+
+
+def available_stock_map(products):
+    """available_stock for many products: one cache round trip plus one aggregate for misses."""
+    return stock_map((p.pk, p.stock, p.stock_shards) for p in products)
+
+def stock_map(rows):
+    """available_stock_map over (pk, stock, stock_shards) tuples, e.g. from values_list()."""
+    rows = list(rows)
+    out = {pk: stock for pk, stock, shards in rows if not shards}
+    sharded = [pk for pk, _, shards in rows if shards]
+    if sharded:
+        keys = {f"shop:stock:{pk}": pk for pk in sharded}
+        cached = cache.get_many(list(keys))
+        out.update({keys[k]: v for k, v in cached.items()})
+        missing = [pk for k, pk in keys.items() if k not in cached]
+        if missing:
+            totals = dict(_shard_totals(missing))
+            cache.set_many({f"shop:stock:{pk}": totals.get(pk, 0) for pk in missing}, SHARD_STOCK_TTL)
+            out.update({pk: totals.get(pk, 0) for pk in missing})
+    return out
+
+async def astock_map(rows):
+    """stock_map for async views (async cache and ORM calls)."""
+    rows = list(rows)
+    out = {pk: stock for pk, stock, shards in rows if not shards}
+    sharded = [pk for pk, _, shards in rows if shards]
+    if sharded:
+        keys = {f"shop:stock:{pk}": pk for pk in sharded}
+        cached = await cache.aget_many(list(keys))
+        out.update({keys[k]: v for k, v in cached.items()})
+        missing = [pk for k, pk in keys.items() if k not in cached]
+        if missing:
+            totals = {pk: n async for pk, n in _shard_totals(missing)}
+            await cache.aset_many({f"shop:stock:{pk}": totals.get(pk, 0) for pk in missing}, SHARD_STOCK_TTL)
+            out.update({pk: totals.get(pk, 0) for pk in missing})
+    return out
+
+def _shard_totals(product_ids):
+    return StockShard.objects.filter(product_id__in=product_ids).values_list("product_id").annotate(n=Sum("stock"))
+
+
+def _split(total, n):
+    return [total // n + (1 if i < total % n else 0) for i in range(n)]
+
+def _locked_shard_total(product_id):
+    # lock the shard rows themselves: checkouts decrement them without touching Product,
+    # so a decrement that lands between the sum and the delete would otherwise be lost
+    return sum(StockShard.objects.select_for_update().filter(product_id=product_id).values_list("stock", flat=True))
+
+@transaction.atomic
+def shard_product(product, shards):
+    """Spread the product's stock evenly over `shards` counter rows (re-shards if already sharded)."""
+    product = Product.objects.select_for_update().get(pk=product.pk)
+    total = _locked_shard_total(product.pk) if product.stock_shards else product.stock
+    StockShard.objects.filter(product=product).delete()
+    StockShard.objects.bulk_create(
+        [StockShard(product=product, shard=i, stock=n) for i, n in enumerate(_split(total, shards))]
+    )
+    Product.objects.filter(pk=product.pk).update(stock=total, stock_shards=shards)
+    cache.delete(f"shop:stock:{product.pk}")
+    return total
+
+def rebalance_product(product):
+    return shard_product(product, product.stock_shards)
+
+@transaction.atomic
+def merge_product(product):
+    """Fold all shards back into Product.stock and leave sharded mode."""
+    product = Product.objects.select_for_update().get(pk=product.pk)
+    if not product.stock_shards:
+        return product.stock
+    total = _locked_shard_total(product.pk)
+    StockShard.objects.filter(product=product).delete()
+    Product.objects.filter(pk=product.pk).update(stock=total, stock_shards=0)
+    cache.delete(f"shop:stock:{product.pk}")
+    return total
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from shop.cache import bump_catalog_version
+from shop.images import IMAGE_ERRORS, render_variants, record_variants, variants_stale
+from shop.models import Product
+
+
+def _render(product_id, source):
+    try:
+        return product_id, source, render_variants(source), None
+    except IMAGE_ERRORS as e:
+        return product_id, source, None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Render missing thumb/card/detail WebP+JPEG variants for product images, across a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--force", action="store_true", help="re-check every image, not just ones without variants")
+
+    def handle(self, *args, processes, force, **kwargs):
+        started = time.monotonic()
+        rows = Product.objects.exclude(image="").exclude(image=None).values_list("pk", "image", "image_variants")
+        todo = [(pk, image) for pk, image, variants in rows.iterator() if force or variants_stale(image, variants)]
+
+        if processes <= 1:
+            results = (_render(pk, image) for pk, image in todo)
+            self._record(results)
+        else:
+            # workers only decode/encode and write files; every DB read and write stays in this process
+            with ProcessPoolExecutor(max_workers=processes, initializer=django.setup) as pool:
+                self._record(f.result() for f in as_completed([pool.submit(_render, pk, image) for pk, image in todo]))
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.done} of {len(todo)} products updated, {self.failed} failed, in {time.monotonic() - started:.2f}s"
+        ))
+
+    def _record(self, results):
+        self.done = self.failed = 0
+        for pk, source, sizes, error in results:
+            if error:
+                self.failed += 1
+                self.stderr.write(f"{pk} {source}: {error}")
+            elif record_variants(pk, source, sizes):
+                self.done += 1
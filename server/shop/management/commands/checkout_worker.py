@@ -0,0 +1,59 @@
+import multiprocessing
+import queue
+import time
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _work(batch_size, poll, once, write=None):
+    # imported here, not at module level: a spawned child unpickles _child before it can run django.setup()
+    from shop.checkout_queue import drain, requeue_stale
+    while True:
+        requeue_stale()
+        counts = drain(batch_size)
+        if counts and write:
+            write(" ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+        if not counts:
+            if once:
+                return
+            time.sleep(poll)
+
+
+def _child(batch_size, poll, once, lines):
+    django.setup()  # spawn/forkserver children start without settings or the app registry
+    connections.close_all()  # never reuse a connection inherited from the parent
+    _work(batch_size, poll, once, lines.put)
+
+
+class Command(BaseCommand):
+    help = "Process async checkouts: claim pending orders in batches, take stock, mark paid/cancelled"
+
+    def add_arguments(self, parser):
+        from shop.checkout_queue import CHECKOUT_BATCH_SIZE
+        parser.add_argument("--batch-size", type=int, default=CHECKOUT_BATCH_SIZE)
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--poll", type=float, default=0.5, help="seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+
+    def handle(self, *args, batch_size, processes, poll, once, **kwargs):
+        if processes <= 1:
+            _work(batch_size, poll, once, self.stdout.write)
+            return
+        connections.close_all()
+        lines = multiprocessing.Queue()  # children report batch counts here; only this process writes stdout
+        procs = [
+            multiprocessing.Process(target=_child, args=(batch_size, poll, once, lines), daemon=True)
+            for _ in range(processes)
+        ]
+        for p in procs:
+            p.start()
+        try:
+            while any(p.is_alive() for p in procs) or not lines.empty():
+                try:
+                    self.stdout.write(lines.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.outbox import OUTBOX_BATCH_SIZE, dispatch, lag, load_sinks, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events (emails, webhooks, ...) in batches, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument("--sink", action="append", dest="sinks", help="sink class path; overrides OUTBOX_SINKS")
+        parser.add_argument("--poll", type=float, default=0.5, help="seconds to sleep when nothing is due")
+        parser.add_argument("--once", action="store_true", help="exit when nothing is due")
+        parser.add_argument("--lag", action="store_true", dest="show_lag", help="print the backlog and exit")
+
+    def handle(self, *args, batch_size, sinks, poll, once, show_lag, **kwargs):
+        if show_lag:
+            self.stdout.write(self._lag())
+            return
+        sinks = load_sinks(sinks)
+        self.stdout.write(f"sinks: {', '.join(type(s).__name__ for s in sinks)}; {self._lag()}")
+        while True:
+            requeue_stale()
+            counts = dispatch(batch_size, sinks)
+            if counts:
+                self.stdout.write(" ".join(f"{k}={v}" for k, v in counts.items()))
+            elif once:
+                self.stdout.write(self._lag())
+                return
+            else:
+                time.sleep(poll)
+
+    @staticmethod
+    def _lag():
+        return " ".join(f"{k}={v}" for k, v in lag().items())
@@ -0,0 +1,29 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.catalog_io import FORMATS, detect_format, export_rows, write_rows
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream every product to CSV or JSONL (import_products reads the same columns)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="output file, default stdout")
+        parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--active-only", action="store_true")
+
+    def handle(self, *args, path, format, chunk_size, active_only, **kwargs):
+        fmt = detect_format(path, format) or ("csv" if path == "-" else None)
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format csv|jsonl")
+        started = time.monotonic()
+        qs = Product.objects.filter(is_active=True) if active_only else Product.objects.all()
+        if path == "-":
+            n = write_rows(sys.stdout, fmt, export_rows(qs, chunk_size))
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as fp:
+                n = write_rows(fp, fmt, export_rows(qs, chunk_size))
+        # stdout may be the export itself
+        self.stderr.write(self.style.SUCCESS(f"Exported {n} products in {time.monotonic() - started:.2f}s"))
@@ -0,0 +1,33 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.catalog_io import FORMATS, IMPORT_CHUNK_SIZE, Importer, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert products by SKU from a CSV or JSONL file (or - for stdin), streaming in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument("--images", metavar="DIR", help="copy the `image` column's files from this directory")
+        parser.add_argument("--image-workers", type=int, default=4)
+
+    def handle(self, *args, path, format, chunk_size, images, image_workers, **kwargs):
+        fmt = detect_format(path, format)
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format csv|jsonl")
+        started = time.monotonic()
+
+        def on_error(line, sku, message):
+            self.stderr.write(f"line {line} ({sku or '-'}): {message}")
+
+        importer = Importer(chunk_size, images_dir=images, image_workers=image_workers, on_error=on_error)
+        fp = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+        with fp:
+            importer.run(read_rows(fp, fmt))
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.created} created, {importer.updated} updated, {importer.failed} rejected "
+            f"in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.cache import bump_catalog_version
+from shop.search import rebuild_index
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text index (FTS5 on SQLite, tsvector/GIN on Postgres)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, batch_size, **kwargs):
+        started = time.monotonic()
+        with transaction.atomic():
+            n = rebuild_index(batch_size=batch_size)
+            transaction.on_commit(bump_catalog_version)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} products in {time.monotonic() - started:.2f}s"))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.reports import ROLLUP_SETTLE_SECONDS, rebuild, rollup
+
+
+class Command(BaseCommand):
+    help = "Fold newly paid orders into the DailyProductSales rollup (or rebuild it from scratch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", dest="full", help="recompute the whole rollup")
+        parser.add_argument("--settle", type=float, default=ROLLUP_SETTLE_SECONDS,
+                            help="leave orders paid in the last this many seconds for the next run")
+
+    def handle(self, *args, full, settle, **kwargs):
+        started = time.monotonic()
+        total = 0
+        for n, batch in enumerate([rebuild(settle)] if full else rollup(settle), 1):
+            total += batch["rows"]
+            self.stdout.write(f"slice {n}: up to {batch['until']:%Y-%m-%d %H:%M:%S}, {batch['rows']} rows in {batch['ms']} ms")
+        self.stdout.write(self.style.SUCCESS(f"{total} rows written in {time.monotonic() - started:.2f}s"))
@@ -1,18 +1,86 @@
+import random
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
+from shop.cache import bump_catalog_version
+from shop.inventory import merge_product, shard_product
 from shop.models import Product
+from shop.search import rebuild_index
 
 DEMO = [
-    {"name":"Black Sneakers","description":"Comfort fit","price_cents":250000,"currency":"NGN","sku":"SKU001","stock":20,"image_url":"https://picsum.photos/seed/sneakers/800/800"},
-    {"name":"Formal Shoe","description":"Leather","price_cents":450000,"currency":"NGN","sku":"SKU002","stock":10,"image_url":"https://picsum.photos/seed/formal/800/800"},
-    {"name":"T-Shirt","description":"Cotton","price_cents":80000,"currency":"NGN","sku":"SKU003","stock":50,"image_url":"https://picsum.photos/seed/tshirt/800/800"},
-    {"name":"Jeans","description":"Slim fit","price_cents":200000,"currency":"NGN","sku":"SKU004","stock":35,"image_url":"https://picsum.photos/seed/jeans/800/800"},
-    {"name":"Cap","description":"Adjustable","price_cents":30000,"currency":"NGN","sku":"SKU005","stock":100,"image_url":"https://picsum.photos/seed/cap/800/800"},
+    {"name":"Black Sneakers","description":"Comfort fit","price_cents":250000,"currency":"NGN","sku":"SKU001","stock":20},
+    {"name":"Formal Shoe","description":"Leather","price_cents":450000,"currency":"NGN","sku":"SKU002","stock":10},
+    {"name":"T-Shirt","description":"Cotton","price_cents":80000,"currency":"NGN","sku":"SKU003","stock":50},
+    {"name":"Jeans","description":"Slim fit","price_cents":200000,"currency":"NGN","sku":"SKU004","stock":35},
+    {"name":"Cap","description":"Adjustable","price_cents":30000,"currency":"NGN","sku":"SKU005","stock":100},
 ]
+WORDS = (
+    "leather canvas cotton wool denim suede running trail formal casual slim relaxed classic "
+    "vintage sport travel rain winter summer black brown white navy olive sneaker boot sandal "
+    "loafer jacket shirt jeans cap beanie scarf belt wallet backpack tote watch"
+).split()
+BRANDS = [a + b for a in ("ka", "zu", "mo", "ri", "te", "lo", "ve", "na", "qi", "so") for b in ("lar", "mex", "dor", "vin", "tek")]
+HOT_SKU = "HOT001"
+USER_EMAIL = "bench{}@example.com"
+
+
+def generated_products(n, seed=42):
+    """`n` deterministic products, SKUs GEN0000000.."""
+    rnd = random.Random(seed)
+    for i in range(n):
+        yield Product(
+            name=f"{rnd.choice(BRANDS)} {' '.join(rnd.sample(WORDS, 2))}".title(),
+            description=" ".join(rnd.choices(WORDS, k=12)),
+            price_cents=rnd.randint(500, 500_000),
+            currency="NGN",
+            sku=f"GEN{i:07d}",
+            stock=rnd.randint(50, 500),
+        )
+
 
 class Command(BaseCommand):
-    help = "Seed demo products"
-    def handle(self, *args, **kwargs):
-        if Product.objects.exists():
-            self.stdout.write("Products already seeded"); return
-        Product.objects.bulk_create([Product(**d) for d in DEMO])
-        self.stdout.write(self.style.SUCCESS(f"Seeded {len(DEMO)} products"))
+    help = "Seed demo products; optionally a generated catalog, bench users and a hot SKU for load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=0, help="generated products on top of the demo set")
+        parser.add_argument("--users", type=int, default=0, help=f"active users {USER_EMAIL.format('N')}")
+        parser.add_argument("--password", default="BenchPassw0rd!", help="password for the generated users")
+        parser.add_argument("--hot-stock", type=int, default=None, help=f"create {HOT_SKU} (or reset its stock) to this")
+        parser.add_argument("--hot-shards", type=int, default=0, help=f"spread {HOT_SKU} over this many stock shards")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def _insert(self, model, objs, batch_size):
+        before = model.objects.count()
+        objs = iter(objs)
+        while batch := list(islice(objs, batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        return model.objects.count() - before
+
+    def handle(self, *args, products, users, password, hot_stock, hot_shards, batch_size, seed, **kwargs):
+        # ignore_conflicts on the unique sku/username makes re-runs fill in only what is missing
+        added = self._insert(Product, [Product(**d) for d in DEMO], batch_size)
+        if products:
+            added += self._insert(Product, generated_products(products, seed), batch_size)
+        if hot_stock is not None:
+            hot, created = Product.objects.get_or_create(sku=HOT_SKU, defaults={
+                "name": "Limited Drop", "description": "One SKU, many buyers", "price_cents": 100000, "currency": "NGN",
+            })
+            merge_product(hot)
+            Product.objects.filter(pk=hot.pk).update(stock=hot_stock)
+            if hot_shards:
+                shard_product(hot, hot_shards)
+            added += created
+            self.stdout.write(f"{HOT_SKU}: stock {hot_stock} over {hot_shards or 1} shard(s)")
+        # bulk_create and update() skip the save signals that index and invalidate
+        if added:
+            rebuild_index(batch_size=batch_size)
+        if added or hot_stock is not None:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Seeded {added} products ({Product.objects.count()} total)"))
+
+        if users:
+            hashed = make_password(password)  # hash once; every generated user shares it
+            objs = (User(username=USER_EMAIL.format(i), email=USER_EMAIL.format(i), password=hashed) for i in range(users))
+            self.stdout.write(self.style.SUCCESS(f"Seeded {self._insert(User, objs, batch_size)} users"))
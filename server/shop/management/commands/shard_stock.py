@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.inventory import shard_product, rebalance_product, merge_product
+from shop.models import Product
+
+class Command(BaseCommand):
+    help = (
+        "Split a hot product's stock across N counter rows, rebalance its shards, or merge them back. "
+        "While sharded, Product.stock is only a rollup refreshed by this command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("skus", nargs="+")
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument("--shards", type=int, help="enable (or re-shard) with this many counters")
+        mode.add_argument("--rebalance", action="store_true", help="even out existing shards")
+        mode.add_argument("--merge", action="store_true", help="fold shards back into Product.stock")
+
+    def handle(self, *args, skus, shards, rebalance, merge, **kwargs):
+        if shards is not None and shards < 1:
+            raise CommandError("--shards must be >= 1")
+        products = {p.sku: p for p in Product.objects.filter(sku__in=skus)}
+        missing = [s for s in skus if s not in products]
+        if missing:
+            raise CommandError(f"Unknown SKU(s): {', '.join(missing)}")
+
+        for sku in skus:
+            p = products[sku]
+            if merge:
+                total = merge_product(p)
+                self.stdout.write(f"{sku}: merged, stock={total}")
+            elif rebalance:
+                if not p.stock_shards:
+                    self.stdout.write(f"{sku}: not sharded, skipped"); continue
+                total = rebalance_product(p)
+                self.stdout.write(f"{sku}: rebalanced {p.stock_shards} shards, stock={total}")
+            else:
+                total = shard_product(p, shards)
+                self.stdout.write(f"{sku}: {shards} shards, stock={total}")
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,261 @@
+"""
+Per-request SQL and timing instrumentation.
+
+Every DB connection carries one execute wrapper that adds to the current
+request's counters (a context variable, so async views' sync_to_async ORM
+calls count too). MetricsMiddleware records, per route: total time, DB time
+and query count as Prometheus-style histograms. Each process aggregates in memory; with
+METRICS_DIR set it also snapshots its cumulative series to
+`METRICS_DIR/<pid>-<start>.json` every METRICS_FLUSH_SECONDS, and the
+exposition (`/api/metrics`) sums every file, so all gunicorn workers are
+counted. Clear the directory on deploy.
+
+Other modules publish plain counters and gauges with registry.inc()/set()
+under a metric declared with describe() (e.g. shop.admission's limiter
+state); they are summed across processes the same way.
+
+QUERY_BUDGETS ({route: max queries}) flags query storms: QUERY_BUDGET_ACTION
+"log" logs a warning, "raise" raises QueryBudgetExceeded (the test suite runs
+with "raise").
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = getattr(settings, "METRICS_DIR", None)
+METRICS_FLUSH_SECONDS = getattr(settings, "METRICS_FLUSH_SECONDS", 5)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# histogram name -> (buckets, help)
+HISTOGRAMS = {
+    "seconds": (SECONDS_BUCKETS, "Request wall time"),
+    "db_seconds": (SECONDS_BUCKETS, "Time spent in SQL per request"),
+    "queries": (QUERY_BUCKETS, "SQL statements per request"),
+}
+
+
+# counter/gauge name -> (type, help), see describe()
+VALUES = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def describe(name, kind, help_text):
+    """Declare a counter or gauge that registry.inc()/set() will feed."""
+    VALUES[name] = (kind, help_text)
+
+
+def _empty_series():
+    # per histogram: [sum, count per bucket..., count above the last bucket]
+    out = {name: [0.0] + [0] * (len(buckets) + 1) for name, (buckets, _) in HISTOGRAMS.items()}
+    out["over_budget"] = 0
+    return out
+
+def _bucket(buckets, value):
+    for i, le in enumerate(buckets):
+        if value <= le:
+            return i
+    return len(buckets)
+
+
+class Registry:
+    """Cumulative series for this process, keyed "route|method|status"."""
+
+    def __init__(self, directory=None):
+        self.lock = threading.Lock()
+        self.series = {}
+        # 'name{labels}' -> number, for metrics declared with describe()
+        self.values = {}
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{int(time.time())}.json") if directory else None
+        self.flushed_at = 0.0
+
+    def observe(self, key, seconds, db_seconds, queries, over_budget=False):
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = _empty_series()
+            for name, value in (("seconds", seconds), ("db_seconds", db_seconds), ("queries", queries)):
+                h = s[name]
+                h[0] += value
+                h[1 + _bucket(HISTOGRAMS[name][0], value)] += 1
+            s["over_budget"] += int(over_budget)
+        if self.path and time.monotonic() - self.flushed_at > METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def inc(self, key, n=1):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def flush(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps({"series": self.series, "values": self.values})
+            self.flushed_at = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def _snapshots(self):
+        if not self.path:
+            with self.lock:
+                return [json.loads(json.dumps({"series": self.series, "values": self.values}))]
+        self.flush()
+        out = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # a worker mid-rename
+        return out
+
+    def collect(self):
+        """Series summed over every process sharing the directory (or just this one)."""
+        total = {}
+        for snapshot in self._snapshots():
+            for key, s in snapshot["series"].items():
+                acc = total.setdefault(key, _empty_series())
+                for name, values in s.items():
+                    if name == "over_budget":
+                        acc[name] += values
+                    else:
+                        acc[name] = [a + b for a, b in zip(acc[name], values)]
+        return total
+
+    def collect_values(self):
+        """inc()/set() values summed over every process."""
+        total = {}
+        for snapshot in self._snapshots():
+            for key, value in snapshot["values"].items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+registry = Registry(METRICS_DIR)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(series, values=None):
+    """Prometheus text exposition (format 0.0.4) for collect() (and collect_values()) output."""
+    lines = []
+    rows = sorted(series.items())
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        metric = f"shop_request_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for key, s in rows:
+            route, method, status = key.split("|")
+            labels = f'route="{_label(route)}",method="{method}",status="{status}"'
+            h, running = s[name], 0
+            for le, n in zip(list(buckets) + ["+Inf"], h[1:]):
+                running += n
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {running}')
+            lines.append(f"{metric}_sum{{{labels}}} {float(h[0])!r}")
+            lines.append(f"{metric}_count{{{labels}}} {running}")
+    lines += ["# HELP shop_query_budget_exceeded_total Requests over their QUERY_BUDGETS entry",
+              "# TYPE shop_query_budget_exceeded_total counter"]
+    for key, s in rows:
+        route, method, status = key.split("|")
+        lines.append(f'shop_query_budget_exceeded_total{{route="{_label(route)}",method="{method}",status="{status}"}} {s["over_budget"]}')
+    values = sorted((values or {}).items())
+    for name, (kind, help_text) in VALUES.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f"{key} {value}" for key, value in values if key.partition("{")[0] == name]
+    return "\n".join(lines) + "\n"
+
+
+def route_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.url_name or match.route or match.view_name
+
+
+# {"queries": n, "db": seconds} of the request being served in this context
+_sql = ContextVar("shop_request_sql", default=None)
+
+def _timed(execute, sql, params, many, context):
+    stats = _sql.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats["db"] += time.perf_counter() - started
+        stats["queries"] += 1
+
+def install(connection, **kwargs):
+    """Put the SQL timer on `connection` once; new connections get it from connection_created."""
+    if _timed not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed)
+
+connection_created.connect(install)
+
+
+class MetricsMiddleware:
+    """Time the request and its SQL; add Server-Timing; record into `registry`; enforce query budgets."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        for conn in connections.all():
+            install(conn)  # ones opened before this module was imported
+        stats = {"queries": 0, "db": 0.0}
+        token, started = _sql.set(stats), time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = {"queries": 0, "db": 0.0}
+        token, started = _sql.set(stats), time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _finish(self, request, response, stats, total):
+        route = route_label(request)
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(route)
+        over = budget is not None and stats["queries"] > budget
+        registry.observe(f"{route}|{request.method}|{response.status_code // 100}xx", total, stats["db"], stats["queries"], over)
+        response["Server-Timing"] = (
+            f'db;dur={stats["db"] * 1000:.1f};desc="{stats["queries"]} queries", total;dur={total * 1000:.1f}'
+        )
+        if over:
+            message = f"{request.method} {route} ran {stats['queries']} queries (budget {budget})"
+            if getattr(settings, "QUERY_BUDGET_ACTION", "log") == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
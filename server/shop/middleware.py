@@ -0,0 +1,69 @@
+import os
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .images import VARIANT_DIR
+
+
+class AsyncCapableMixin:
+    """
+    Lets a `lookup(request) -> response | None` middleware run in an async
+    chain too (the lookups here are in-memory or one stat), so it does not
+    force every async view through a thread.
+    """
+    sync_capable = async_capable = True
+
+    def _set_mode(self, get_response):
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.lookup(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.lookup(request)
+        return response if response is not None else await self.get_response(request)
+
+
+class StaticFilesMiddleware(AsyncCapableMixin, WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that also runs under ASGI without a sync hop."""
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self._set_mode(get_response)
+
+    def lookup(self, request):
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        return self.serve(static_file, request) if static_file is not None else None
+
+
+class ProductImageMiddleware(AsyncCapableMixin, WhiteNoise):
+    """
+    Serve MEDIA_ROOT/variants/ through WhiteNoise, in production too.
+    Variants are written at runtime, so unlike STATIC_ROOT a miss is looked up
+    on disk (then remembered); every name carries a content hash, so all
+    responses are marked immutable.
+    """
+    def __init__(self, get_response):
+        super().__init__(None, immutable_file_test=lambda path, url: True)
+        self.get_response = get_response
+        self.prefix = f"{settings.MEDIA_URL.rstrip('/')}/{VARIANT_DIR}/"
+        root = os.path.join(settings.MEDIA_ROOT, VARIANT_DIR)
+        self.directories.append((root.rstrip(os.sep) + os.sep, self.prefix))
+        self._set_mode(get_response)
+
+    def lookup(self, request):
+        url = request.path_info
+        if not url.startswith(self.prefix):
+            return None
+        static_file = self.files.get(url)
+        if static_file is None:
+            static_file = self.find_file(url)
+            if static_file is not None:
+                self.files[url] = static_file
+        return WhiteNoiseMiddleware.serve(static_file, request) if static_file is not None else None
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    conn = schema_editor.connection
+    Product = apps.get_model("shop", "Product")
+    if conn.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE shop_product_fts USING fts5("
+            "product_id UNINDEXED, name, description, sku, tokenize='unicode61', prefix='2 3')"
+        )
+        pk = Product._meta.pk
+        rows = [
+            [p.int >> 65, pk.get_db_prep_value(p, conn), name, description, sku]
+            for p, name, description, sku in Product.objects.values_list("pk", "name", "description", "sku").iterator()
+        ]
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO shop_product_fts(rowid, product_id, name, description, sku) VALUES (%s, %s, %s, %s, %s)", rows
+            )
+    elif conn.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE shop_product_search ("
+            "product_id uuid PRIMARY KEY REFERENCES shop_product(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX shop_product_search_gin ON shop_product_search USING GIN (document)")
+        schema_editor.execute(
+            "INSERT INTO shop_product_search(product_id, document) SELECT id, "
+            "setweight(to_tsvector('simple', name), 'A') || "
+            "setweight(to_tsvector('simple', description), 'C') || "
+            "setweight(to_tsvector('simple', sku), 'A') FROM shop_product"
+        )
+
+def drop_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_fts")
+    elif conn.vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_stock_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
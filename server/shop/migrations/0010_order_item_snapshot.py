@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    OrderItem = apps.get_model("shop", "OrderItem")
+    batch = []
+    for it in OrderItem.objects.select_related("product").iterator(chunk_size=1000):
+        p = it.product
+        it.product_name, it.product_sku, it.currency = p.name, p.sku, p.currency
+        it.product_image = p.image.name if p.image else ""
+        batch.append(it)
+        if len(batch) >= 1000:
+            OrderItem.objects.bulk_update(batch, ["product_name", "product_sku", "currency", "product_image"])
+            batch = []
+    OrderItem.objects.bulk_update(batch, ["product_name", "product_sku", "currency", "product_image"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_order_checkout_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='currency',
+            field=models.CharField(default='NGN', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(default='', max_length=160),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+USER_INDEX = "shop_user_unverified_idx"
+
+
+# auth_user belongs to django.contrib.auth, so gc_shop's index on never-verified
+# accounts (date_joined, id) is added by hand; partial syntax is shared by SQLite and Postgres
+def add_user_index(apps, schema_editor):
+    table = schema_editor.quote_name(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {USER_INDEX} ON {table} (date_joined, id) WHERE NOT is_active")
+
+def drop_user_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {USER_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='cart_user_updated_idx'),
+        ),
+        migrations.RunPython(add_user_index, drop_user_index),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+
+EMAIL_INDEX = "auth_user_email_lower_idx"
+
+
+# signup and email login look users up by lower(email); like 0012's, this index on
+# auth_user is added by hand, and expression indexes share their syntax on SQLite and Postgres
+def add_email_index(apps, schema_editor):
+    table = schema_editor.quote_name(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {EMAIL_INDEX} ON {table} (LOWER(email))")
+
+def drop_email_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {EMAIL_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_gc_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(add_email_index, drop_email_index),
+    ]
@@ -1,6 +1,8 @@
 import uuid
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -10,18 +12,40 @@ class Product(models.Model):
     currency = models.CharField(max_length=8, default="NGN")
     sku = models.CharField(max_length=64, unique=True)
     stock = models.PositiveIntegerField(default=0)
+    # >0 when stock lives in StockShard rows; `stock` is then only a rollup
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # {"source": image name, "sizes": {label: {fmt: storage name}}}, filled by shop.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # keyset pagination: (sort key, id) range scans over active products
+        indexes = [
+            models.Index(fields=["is_active", "created_at", "id"], name="product_active_created_idx"),
+            models.Index(fields=["is_active", "price_cents", "id"], name="product_active_price_idx"),
+            models.Index(fields=["is_active", "name", "id"], name="product_active_name_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+class StockShard(models.Model):
+    product = models.ForeignKey(Product, related_name="shards", on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("product", "shard")
+
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
     session_key = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # guest session already merged into this (user) cart; requests carrying it skip the guest lookup
+    merged_session_key = models.CharField(max_length=64, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -30,6 +54,8 @@ class Cart(models.Model):
             models.UniqueConstraint(fields=["user"], name="uniq_user_cart", condition=~models.Q(user=None)),
             models.UniqueConstraint(fields=["session_key"], name="uniq_session_cart", condition=~models.Q(session_key=None)),
         ]
+        # gc_shop walks abandoned guest carts (user IS NULL) by (updated_at, id)
+        indexes = [models.Index(fields=["user", "updated_at", "id"], name="cart_user_updated_idx")]
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
@@ -40,16 +66,86 @@ class CartItem(models.Model):
         unique_together = ("cart", "product")
 
 class Order(models.Model):
-    STATUS_CHOICES = [("pending","pending"), ("paid","paid"), ("cancelled","cancelled")]
+    STATUS_CHOICES = [("pending","pending"), ("processing","processing"), ("paid","paid"), ("cancelled","cancelled")]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     email = models.EmailField(blank=True)
     status = models.CharField(max_length=12, choices=STATUS_CHOICES, default="pending")
     total_cents = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # async checkout queue: which worker batch holds a "processing" order, and since when
+    claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    failure = models.JSONField(null=True, blank=True)
+    # set when the order becomes "paid"; shop.reports rolls sales up by it
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="order_user_created_idx"),
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["paid_at"], name="order_paid_at_idx"),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
     unit_price_cents = models.PositiveIntegerField()
+    # snapshot of the product at checkout; order history never reads Product
+    product_name = models.CharField(max_length=160, default="")
+    product_sku = models.CharField(max_length=64, default="")
+    currency = models.CharField(max_length=8, default="NGN")
+    product_image = models.CharField(max_length=100, blank=True, default="")
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a write made with an `Idempotency-Key` header."""
+    owner = models.CharField(max_length=80)  # "user:<id>"
+    key = models.CharField(max_length=128)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["owner", "key"], name="uniq_idempotency_owner_key")]
+
+class OutboxEvent(models.Model):
+    """A side effect (email, webhook, ...) recorded in the transaction that caused it; see shop.outbox."""
+    STATUS_CHOICES = [("pending","pending"), ("processing","processing"), ("delivered","delivered"), ("dead","dead")]
+    topic = models.CharField(max_length=64)  # "user.signup", "order.paid", ...
+    key = models.CharField(max_length=64, blank=True)  # id of the user/order it is about
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default="pending")
+    created_at = models.DateTimeField(default=timezone.now)
+    # next delivery attempt; pushed back after each failure
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="outbox_status_available_idx"),
+            models.Index(fields=["status", "delivered_at"], name="outbox_status_delivered_idx"),
+        ]
+
+class DailyProductSales(models.Model):
+    """Paid units and revenue per product per day (of paid_at, in TIME_ZONE); maintained by shop.reports."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="+")
+    units = models.PositiveIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)  # paid orders that included the product
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["day", "product"], name="uniq_daily_sales_day_product")]
+        indexes = [models.Index(fields=["product", "day"], name="daily_sales_product_day_idx")]
+
+class RollupWatermark(models.Model):
+    """How far a rollup has folded in its source rows."""
+    name = models.CharField(max_length=64, primary_key=True)
+    until = models.DateTimeField()
@@ -0,0 +1,221 @@
+"""
+Transactional outbox: side effects leave the request as OutboxEvent rows.
+
+emit() writes the event in the caller's transaction, so it exists exactly when
+the user/order change it describes commits, and the request does no delivery
+work. `manage.py dispatch_outbox` claims due events in batches (same claim-token
+scheme as checkout_queue), hands each batch to every sink in OUTBOX_SINKS that
+takes its topic, and marks it delivered. A batch a sink raised on is retried
+with exponential backoff, and becomes "dead" after OUTBOX_MAX_ATTEMPTS.
+Delivery is at-least-once: when one sink fails, the sinks that succeeded see
+the event again on the retry, so receivers should dedupe on the event id.
+"""
+import json
+import logging
+import random
+import urllib.request
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage, get_connection
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_SINKS = getattr(settings, "OUTBOX_SINKS", ["shop.outbox.EmailSink"])
+OUTBOX_BATCH_SIZE = getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 8)
+# retry n waits OUTBOX_BACKOFF_SECONDS * 2**(n-1), capped at OUTBOX_BACKOFF_MAX, +-20% jitter
+OUTBOX_BACKOFF_SECONDS = getattr(settings, "OUTBOX_BACKOFF_SECONDS", 5)
+OUTBOX_BACKOFF_MAX = getattr(settings, "OUTBOX_BACKOFF_MAX", 3600)
+# a "processing" event older than this belongs to a dead worker and is re-queued
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, "OUTBOX_CLAIM_TIMEOUT", 300)
+OUTBOX_FILE = getattr(settings, "OUTBOX_FILE", None)
+OUTBOX_WEBHOOK_URL = getattr(settings, "OUTBOX_WEBHOOK_URL", None)
+OUTBOX_WEBHOOK_TIMEOUT = getattr(settings, "OUTBOX_WEBHOOK_TIMEOUT", 5)
+
+
+def emit(topic, key, payload):
+    """Record an event in the current transaction; it is delivered only if that transaction commits."""
+    return OutboxEvent.objects.create(topic=topic, key=str(key), payload=payload)
+
+def emit_many(events):
+    """emit() for several (topic, key, payload) tuples in one INSERT."""
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, key=str(key), payload=payload) for topic, key, payload in events]
+    )
+
+def order_payload(order, items, status=None):
+    return {
+        "id": str(order.pk), "user_id": order.user_id, "email": order.email, "status": status or order.status,
+        "total_cents": order.total_cents,
+        "items": [
+            {"product_id": str(it.product_id), "sku": it.product_sku, "quantity": it.quantity,
+             "unit_price_cents": it.unit_price_cents}
+            for it in items
+        ],
+    }
+
+def stock_payload(items):
+    return {"products": {str(it.product_id): -it.quantity for it in items}}
+
+
+def _as_dict(event):
+    return {"id": event.pk, "topic": event.topic, "key": event.key, "created_at": event.created_at,
+            "payload": event.payload}
+
+
+class Sink:
+    """Delivers a batch of events; raising fails (and later retries) the whole batch."""
+    topics = ()  # topic prefixes this sink takes; empty takes everything
+
+    def wants(self, topic):
+        return not self.topics or topic.startswith(self.topics)
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+
+class EmailSink(Sink):
+    """Signup verification and order emails through Django's EMAIL_BACKEND (the console backend in dev)."""
+    topics = ("user.signup", "order.paid", "order.cancelled")
+
+    def message(self, event):
+        p = event.payload
+        if event.topic == "user.signup":
+            return EmailMessage("Verify your email", f"Verification token: {p['token']}", to=[p["email"]])
+        total = f"{p['total_cents'] / 100:.2f}"
+        if event.topic == "order.paid":
+            return EmailMessage(f"Order {p['id']} confirmed", f"Thanks for your order. Total: {total}", to=[p["email"]])
+        return EmailMessage(f"Order {p['id']} cancelled", "Some items sold out before we could reserve them.",
+                            to=[p["email"]])
+
+    def deliver(self, events):
+        messages = [self.message(e) for e in events if e.payload.get("email")]
+        if messages:
+            get_connection().send_messages(messages)
+
+
+class FileSink(Sink):
+    """Appends each event as a JSON line to OUTBOX_FILE."""
+
+    def __init__(self, path=None):
+        self.path = path or OUTBOX_FILE
+        if not self.path:
+            raise ImproperlyConfigured("FileSink needs OUTBOX_FILE")
+
+    def deliver(self, events):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(_as_dict(e), cls=DjangoJSONEncoder) + "\n" for e in events)
+
+
+class WebhookSink(Sink):
+    """POSTs {"events": [...]} to OUTBOX_WEBHOOK_URL; any non-2xx answer fails the batch."""
+
+    def __init__(self, url=None):
+        self.url = url or OUTBOX_WEBHOOK_URL
+        if not self.url:
+            raise ImproperlyConfigured("WebhookSink needs OUTBOX_WEBHOOK_URL")
+
+    def deliver(self, events):
+        body = json.dumps({"events": [_as_dict(e) for e in events]}, cls=DjangoJSONEncoder).encode()
+        req = urllib.request.Request(self.url, data=body, method="POST", headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=OUTBOX_WEBHOOK_TIMEOUT):
+            pass  # urlopen raises HTTPError for 4xx/5xx
+
+
+def load_sinks(paths=None):
+    return [import_string(path)() for path in (OUTBOX_SINKS if paths is None else paths)]
+
+
+def requeue_stale(timeout=None):
+    cutoff = timezone.now() - timedelta(seconds=timeout or OUTBOX_CLAIM_TIMEOUT)
+    return OutboxEvent.objects.filter(status="processing", claimed_at__lt=cutoff).update(
+        status="pending", claimed_by=None, claimed_at=None
+    )
+
+def claim_batch(batch_size=None):
+    """Claim up to batch_size due events, oldest first. Returns (token, [events])."""
+    batch_size = batch_size or OUTBOX_BATCH_SIZE
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEvent.objects.filter(status="pending", available_at__lte=now).order_by("available_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return token, []
+        OutboxEvent.objects.filter(id__in=ids, status="pending").update(
+            status="processing", claimed_by=token, claimed_at=now
+        )
+    return token, list(OutboxEvent.objects.filter(claimed_by=token, status="processing").order_by("id"))
+
+def backoff(attempts):
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+def deliver(events, sinks):
+    """Hand events to every sink that takes them; returns {event id: error} for the ones that failed."""
+    failed = {}
+    for sink in sinks:
+        wanted = [e for e in events if sink.wants(e.topic)]
+        if not wanted:
+            continue
+        try:
+            sink.deliver(wanted)
+        except Exception as e:
+            logger.warning("outbox sink %s failed on %d events: %r", type(sink).__name__, len(wanted), e)
+            for event in wanted:
+                failed.setdefault(event.pk, f"{type(sink).__name__}: {e!r}")
+    return failed
+
+def dispatch(batch_size=None, sinks=None):
+    """
+    Deliver one claimed batch. Returns {"delivered", "retried", "dead": counts,
+    "lag": seconds from the oldest event's creation to now} or {} if nothing was due.
+    """
+    token, events = claim_batch(batch_size)
+    if not events:
+        return {}
+    failed = deliver(events, load_sinks() if sinks is None else sinks)
+    now = timezone.now()
+    ok = [e.pk for e in events if e.pk not in failed]
+    delivered = OutboxEvent.objects.filter(pk__in=ok, claimed_by=token).update(
+        status="delivered", delivered_at=now, claimed_by=None, last_error=""
+    )
+    retried = dead = 0
+    for e in events:
+        if e.pk not in failed:
+            continue
+        attempts = e.attempts + 1
+        status = "dead" if attempts >= OUTBOX_MAX_ATTEMPTS else "pending"
+        # a claim that went stale mid-delivery belongs to another worker now; leave its row alone
+        if OutboxEvent.objects.filter(pk=e.pk, claimed_by=token).update(
+            attempts=attempts, status=status, available_at=now + backoff(attempts), claimed_by=None,
+            last_error=failed[e.pk][:1000],
+        ):
+            dead += status == "dead"
+            retried += status == "pending"
+    return {
+        "delivered": delivered, "retried": retried, "dead": dead,
+        "lag": round((now - min(e.created_at for e in events)).total_seconds(), 3),
+    }
+
+def lag():
+    """Backlog report: undelivered and dead counts, and the age in seconds of the oldest undelivered event."""
+    undelivered = OutboxEvent.objects.filter(status__in=["pending", "processing"]).aggregate(
+        n=Count("id"), oldest=Min("created_at")
+    )
+    oldest = undelivered["oldest"]
+    return {
+        "undelivered": undelivered["n"],
+        "dead": OutboxEvent.objects.filter(status="dead").count(),
+        "oldest_seconds": round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0,
+    }
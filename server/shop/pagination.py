@@ -0,0 +1,169 @@
+import base64
+import json
+from collections import OrderedDict
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a (sort key, id) tuple: each page is one indexed range
+    scan `WHERE (key, id) > (last_key, last_id) LIMIT n`, so latency does not
+    grow with depth and there is no COUNT(*).
+
+    The sort key comes from a valid `?ordering=` (view.ordering_fields), else the
+    queryset's relevance ordering for searches, else view.keyset_ordering.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    default_ordering = "-created_at"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        qs = self._page_queryset(queryset, request, view)
+        try:
+            rows = list(qs)
+        except (DjangoValidationError, ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+        return self._set_page(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views: the page is fetched with `async for`."""
+        qs = self._page_queryset(queryset, request, view)
+        try:
+            rows = [row async for row in qs]
+        except (DjangoValidationError, ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+        return self._set_page(rows)
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.size = self.get_page_size(request)
+        self.values, self.reverse = self.decode_cursor(request)
+
+        order = [self._flip(f) if self.reverse else f for f in self.ordering]
+        qs = queryset.order_by(*order)
+        try:
+            if self.values is not None:
+                qs = qs.filter(self._after(order, self.values))
+        except (DjangoValidationError, ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+        return qs[: self.size + 1]
+
+    def _set_page(self, rows):
+        more = len(rows) > self.size
+        rows = rows[: self.size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        # going back always leaves a page ahead; going forward always leaves one behind
+        self.has_next = more if not self.reverse else True
+        self.has_previous = (self.values is not None) if not self.reverse else more
+        return rows
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        key = None
+        param = request.query_params.get(OrderingFilter.ordering_param)
+        allowed = getattr(view, "ordering_fields", None) or []
+        if param:
+            first = param.split(",")[0].strip()
+            if first.lstrip("-") in allowed:
+                key = first
+        if key is None and "-search_rank" in (queryset.query.order_by or ()):
+            key = "-search_rank"
+        if key is None:
+            key = getattr(view, "keyset_ordering", self.default_ordering)
+        # id breaks ties in the same direction so the tuple order is total
+        return [key, "-id" if key.startswith("-") else "id"]
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _after(order, values):
+        """Q for rows strictly after `values` in `order` (row-value comparison expanded)."""
+        cond, equal = Q(), Q()
+        for field, value in zip(order, values):
+            name = field.lstrip("-")
+            op = "lt" if field.startswith("-") else "gt"
+            cond |= equal & Q(**{f"{name}__{op}": value})
+            equal &= Q(**{name: value})
+        return cond
+
+    def _position(self, obj):
+        out = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            v = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            out.append(v.isoformat() if hasattr(v, "isoformat") else v if isinstance(v, (int, float)) else str(v))
+        return out
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode()).decode())
+            values, reverse = data["v"], bool(data.get("r"))
+            if len(values) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+        return values, reverse
+
+    def _link(self, obj, reverse):
+        token = base64.urlsafe_b64encode(
+            json.dumps({"v": self._position(obj), "r": int(reverse)}, separators=(",", ":")).encode()
+        ).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
@@ -0,0 +1,123 @@
+"""
+Sales reporting from the DailyProductSales rollup.
+
+rollup() folds in the orders paid since the "daily_product_sales" watermark.
+It works through them in slices of up to ROLLUP_SLICE_HOURS, one transaction
+per slice. Each slice runs one GROUP BY over its paid order items (paid_at is
+indexed) and adds the result onto the existing rows with one upsert. The
+watermark moves in the same transaction, so re-running never counts an order
+twice. The rollup stops ROLLUP_SETTLE_SECONDS before now, because a checkout
+still in flight can commit later with an earlier paid_at. The reports
+therefore trail by that much. rebuild() recomputes the table from scratch.
+
+`manage.py rollup_sales` runs either one. The reporting endpoints read only
+the rollup, never Order or OrderItem.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyProductSales, Order, OrderItem, RollupWatermark
+
+ROLLUP_SETTLE_SECONDS = getattr(settings, "ROLLUP_SETTLE_SECONDS", 60)
+ROLLUP_SLICE_HOURS = getattr(settings, "ROLLUP_SLICE_HOURS", 24)
+WATERMARK = "daily_product_sales"
+SALES_FIELDS = ("units", "revenue_cents", "orders")
+
+
+def _settled(settle=None):
+    return timezone.now() - timedelta(seconds=ROLLUP_SETTLE_SECONDS if settle is None else settle)
+
+def aggregate_sales(after=None, until=None):
+    """DailyProductSales rows computed straight from paid orders with after < paid_at <= until."""
+    items = OrderItem.objects.filter(order__status="paid")
+    if after is not None:
+        items = items.filter(order__paid_at__gt=after)
+    if until is not None:
+        items = items.filter(order__paid_at__lte=until)
+    return items.values("product_id", day=TruncDate("order__paid_at")).annotate(
+        units=Sum("quantity"),
+        revenue_cents=Sum(F("quantity") * F("unit_price_cents")),
+        orders=Count("order_id", distinct=True),
+    ).order_by()
+
+def _add(rows):
+    """Add aggregate rows onto DailyProductSales with one upsert; returns how many (day, product) rows changed."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    existing = {
+        (r.day, r.product_id): r for r in DailyProductSales.objects.filter(
+            day__in={r["day"] for r in rows}, product_id__in={r["product_id"] for r in rows},
+        )
+    }
+    merged = []
+    for row in rows:
+        old = existing.get((row["day"], row["product_id"]))
+        if old is not None:
+            for f in SALES_FIELDS:
+                row[f] += getattr(old, f)
+        merged.append(DailyProductSales(**row))
+    DailyProductSales.objects.bulk_create(
+        merged, batch_size=500, update_conflicts=True, unique_fields=["day", "product"], update_fields=SALES_FIELDS,
+    )
+    return len(merged)
+
+def rebuild(settle=None):
+    """Recompute DailyProductSales from every order paid up to `settle` seconds ago."""
+    return _rebuild(_settled(settle))
+
+def _rebuild(until):
+    started = time.monotonic()
+    with transaction.atomic():
+        RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()  # wait out a running rollup
+        DailyProductSales.objects.all().delete()
+        rows = DailyProductSales.objects.bulk_create(
+            [DailyProductSales(**row) for row in aggregate_sales(until=until)], batch_size=500,
+        )
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={"until": until})
+    return {"until": until, "rows": len(rows), "ms": round((time.monotonic() - started) * 1000, 1)}
+
+def rollup(settle=None):
+    """Fold orders paid since the watermark into DailyProductSales; yields one report per slice."""
+    end = _settled(settle)
+    if not RollupWatermark.objects.filter(name=WATERMARK).exists():
+        yield _rebuild(end)
+        return
+    while True:
+        started = time.monotonic()
+        with transaction.atomic():
+            mark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            if mark.until >= end:
+                return
+            # skip straight over stretches with no sales
+            first = Order.objects.filter(paid_at__gt=mark.until, paid_at__lte=end).aggregate(first=Min("paid_at"))["first"]
+            until = end if first is None else min(end, first + timedelta(hours=ROLLUP_SLICE_HOURS))
+            rows = _add(aggregate_sales(mark.until, until))
+            mark.until = until
+            mark.save(update_fields=["until"])
+        yield {"until": until, "rows": rows, "ms": round((time.monotonic() - started) * 1000, 1)}
+
+def watermark():
+    """Orders paid up to this moment are in the rollup (None before the first run)."""
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list("until", flat=True).first()
+
+
+def sales_by_day(start, end, product_id=None):
+    sales = DailyProductSales.objects.filter(day__range=(start, end))
+    if product_id is not None:
+        sales = sales.filter(product_id=product_id)
+    return list(sales.values("day").annotate(units=Sum("units"), revenue_cents=Sum("revenue_cents")).order_by("day"))
+
+def top_products(start, end, by="revenue_cents", limit=10):
+    return [
+        {"product_id": str(row["product_id"]), "name": row["product__name"], "sku": row["product__sku"],
+         "units": row["units"], "revenue_cents": row["revenue_cents"], "orders": row["orders"]}
+        for row in DailyProductSales.objects.filter(day__range=(start, end))
+        .values("product_id", "product__name", "product__sku")
+        .annotate(units=Sum("units"), revenue_cents=Sum("revenue_cents"), orders=Sum("orders"))
+        .order_by(f"-{by}", "product_id")[:limit]
+    ]
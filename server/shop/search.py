@@ -0,0 +1,131 @@
+"""
+Product search index behind `?q=`.
+
+SQLite keeps an FTS5 table (shop_product_fts), Postgres a weighted tsvector
+table with a GIN index (shop_product_search); both are created by migration
+0005 and kept in sync by the Product signals. Other vendors fall back to
+icontains over name/description/sku.
+"""
+import re
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from .models import Product
+
+FTS_TABLE = "shop_product_fts"
+PG_TABLE = "shop_product_search"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# name and sku outrank description
+SQLITE_RANK = f"-bm25({FTS_TABLE}, 0, 10.0, 1.0, 5.0)"
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'C') || "
+    "setweight(to_tsvector('simple', %s), 'A')"
+)
+
+
+def tokenize(q):
+    return [t.lower() for t in TOKEN_RE.findall(q or "")]
+
+def _fts_rowid(pk):
+    # FTS5 rowids are 64-bit ints; derive one from the UUID so upserts/deletes hit the rowid b-tree
+    return pk.int >> 65
+
+def _prep_pk(pk):
+    return Product._meta.pk.get_db_prep_value(pk, connection)
+
+
+def index_product(product):
+    """Upsert one product's document."""
+    if connection.vendor == "sqlite":
+        rowid = _fts_rowid(product.pk)
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+            cur.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, product_id, name, description, sku) VALUES (%s, %s, %s, %s, %s)",
+                [rowid, _prep_pk(product.pk), product.name, product.description, product.sku],
+            )
+    elif connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute(
+                f"INSERT INTO {PG_TABLE}(product_id, document) VALUES (%s, {PG_DOCUMENT}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                [product.pk, product.name, product.description, product.sku],
+            )
+
+def remove_product(pk):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [_fts_rowid(pk)])
+    # postgres rows go with ON DELETE CASCADE
+
+
+def rebuild_index(batch_size=2000, product_ids=None):
+    """Re-index every product (or just `product_ids`) in batches. Returns rows indexed."""
+    qs = Product.objects.order_by("pk")
+    if product_ids is not None:
+        qs = qs.filter(pk__in=product_ids)
+    rows = qs.values_list("pk", "name", "description", "sku")
+    n = 0
+    with connection.cursor() as cur:
+        if connection.vendor == "sqlite":
+            if product_ids is None:
+                cur.execute(f"DELETE FROM {FTS_TABLE}")
+            batch = []
+            for pk, name, description, sku in rows.iterator(chunk_size=batch_size):
+                batch.append([_fts_rowid(pk), _prep_pk(pk), name, description, sku])
+                if len(batch) >= batch_size:
+                    n += _sqlite_write(cur, batch, product_ids is not None); batch = []
+            n += _sqlite_write(cur, batch, product_ids is not None)
+        elif connection.vendor == "postgresql":
+            # set-based: one statement, no Python round trip per row
+            where, params = ("", []) if product_ids is None else ("WHERE id = ANY(%s)", [list(product_ids)])
+            cur.execute(
+                f"INSERT INTO {PG_TABLE}(product_id, document) "
+                f"SELECT id, {PG_DOCUMENT % ('name', 'description', 'sku')} FROM shop_product {where} "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                params,
+            )
+            n = cur.rowcount
+    return n
+
+def _sqlite_write(cur, batch, replace):
+    if not batch:
+        return 0
+    if replace:
+        cur.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[r[0]] for r in batch])
+    cur.executemany(
+        f"INSERT INTO {FTS_TABLE}(rowid, product_id, name, description, sku) VALUES (%s, %s, %s, %s, %s)", batch
+    )
+    return len(batch)
+
+
+def search(queryset, q):
+    """
+    Restrict `queryset` to products matching every token of `q` (prefix match)
+    and order by relevance (`search_rank`, higher is better).
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return queryset
+    table = queryset.model._meta.db_table
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{t}"*' for t in tokens)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.product_id = {table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+        ).annotate(search_rank=RawSQL(SQLITE_RANK, [], output_field=FloatField())).order_by("-search_rank")
+    if connection.vendor == "postgresql":
+        tsq = " & ".join(f"{t}:*" for t in tokens)
+        rank = RawSQL(f"ts_rank({PG_TABLE}.document, to_tsquery('simple', %s))", [tsq], output_field=FloatField())
+        return queryset.extra(
+            tables=[PG_TABLE],
+            where=[f"{PG_TABLE}.product_id = {table}.id", f"{PG_TABLE}.document @@ to_tsquery('simple', %s)"],
+            params=[tsq],
+        ).annotate(search_rank=rank).order_by("-search_rank")
+    cond = Q()
+    for t in tokens:
+        cond &= Q(name__icontains=t) | Q(description__icontains=t) | Q(sku__icontains=t)
+    return queryset.filter(cond)
@@ -1,7 +1,14 @@
 from rest_framework import serializers
 from .models import Product, Cart, CartItem, Order, OrderItem
+from .inventory import available_stock, stock_map
+from .images import variant_urls
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as dj_exc
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from datetime import timedelta
+
+REPORT_DEFAULT_DAYS = 30
 
 class SignupIn(serializers.Serializer):
     email = serializers.EmailField()
@@ -17,9 +24,90 @@ class SignupIn(serializers.Serializer):
 
 class ProductOut(serializers.ModelSerializer):
     image = serializers.ImageField(read_only=True)
+    variants = serializers.SerializerMethodField()
+    stock = serializers.SerializerMethodField()
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["stock_shards", "image_variants"]
+
+    def get_variants(self, obj):
+        return variant_urls(obj.image_variants, lambda name: _media_url(name, self.context.get("request")))
+
+    def get_stock(self, obj):
+        return available_stock(obj)
+
+# columns products_out needs; ProductOut's keys (and order) plus stock_shards/image_variants
+PRODUCT_VALUES = (
+    "id", "image", "image_variants", "stock", "stock_shards", "name", "description", "price_cents", "currency", "sku",
+    "is_active", "created_at", "updated_at",
+)
+_datetime = serializers.DateTimeField()
+
+def _datetime_out():
+    """_datetime.to_representation for a batch: the active timezone is looked up once, not per value."""
+    tz = _datetime.default_timezone()
+    if tz is None:
+        return _datetime.to_representation
+    def out(value):
+        s = value.astimezone(tz).isoformat()
+        return s[:-6] + "Z" if s.endswith("+00:00") else s
+    return out
+
+def stock_rows(rows, prefix=""):
+    """(pk, stock, stock_shards) of `.values(*PRODUCT_VALUES)` rows, for stock_map/astock_map."""
+    return [(r[prefix + "id"], r[prefix + "stock"], r[prefix + "stock_shards"]) for r in rows]
+
+def products_out(rows, request=None, prefix="", stock=None):
+    """
+    ProductOut's JSON for `.values(*PRODUCT_VALUES)` rows (keys optionally
+    prefixed, e.g. "product__"), without per-object field introspection.
+    Stock for the whole batch is resolved in one stock_map call, unless
+    `stock` ({pk: n}, e.g. from astock_map) is passed.
+    """
+    p = prefix
+    dt = _datetime_out()
+    if stock is None:
+        stock = stock_map(stock_rows(rows, p))
+    return [
+        {
+            "id": str(r[p + "id"]),
+            "image": _media_url(r[p + "image"], request),
+            "variants": variant_urls(r[p + "image_variants"], lambda name: _media_url(name, request)),
+            "stock": stock[r[p + "id"]],
+            "name": r[p + "name"],
+            "description": r[p + "description"],
+            "price_cents": r[p + "price_cents"],
+            "currency": r[p + "currency"],
+            "sku": r[p + "sku"],
+            "is_active": r[p + "is_active"],
+            "created_at": dt(r[p + "created_at"]),
+            "updated_at": dt(r[p + "updated_at"]),
+        }
+        for r in rows
+    ]
+
+def cart_out(rows, request=None, stock=None):
+    """
+    CartView body from CartItem rows with `id`, `quantity`, `product__<PRODUCT_VALUES>`
+    and a `total_cents` window annotation (same value on every row).
+    """
+    products = products_out(rows, request, prefix="product__", stock=stock)
+    return {
+        "items": [{"id": r["id"], "product": p, "quantity": r["quantity"]} for r, p in zip(rows, products)],
+        "total_cents": rows[0]["total_cents"] if rows else 0,
+    }
+
+def guest_cart_out(lines, rows, request=None, stock=None):
+    """
+    CartView body for a GuestCart's {product_id: qty} `lines`, given `.values(*PRODUCT_VALUES)`
+    rows for its products. Guest lines have no CartItem, so the product id is the item id.
+    """
+    products = {p["id"]: p for p in products_out(rows, request, stock=stock)}
+    items = [
+        {"id": str(pid), "product": products[str(pid)], "quantity": qty}
+        for pid, qty in lines.items() if str(pid) in products
+    ]
+    return {"items": items, "total_cents": sum(i["product"]["price_cents"] * i["quantity"] for i in items)}
 
 class ProductIn(serializers.ModelSerializer):
     image = serializers.ImageField(required=False, allow_null=True)
@@ -27,10 +115,44 @@ class ProductIn(serializers.ModelSerializer):
         model = Product
         fields = ["name","description","price_cents","currency","sku","stock","is_active","image"]
 
+    def validate_stock(self, value):
+        # shard rows own the count of a sharded product; Product.stock would be silently ignored
+        if self.instance is not None and self.instance.stock_shards:
+            raise serializers.ValidationError(
+                "Stock is sharded; run `manage.py shard_stock --merge` before setting it.", code="STOCK_SHARDED"
+            )
+        return value
+
 class CartItemIn(serializers.Serializer):
     product_id = serializers.UUIDField()
     quantity = serializers.IntegerField(min_value=1)
 
+class CartOp(serializers.Serializer):
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0, required=False, default=0)
+    op = serializers.ChoiceField(choices=["add", "set", "remove"], default="add")
+
+    def validate(self, attrs):
+        if attrs["op"] != "remove" and attrs["quantity"] < 1:
+            raise serializers.ValidationError({"quantity": "Must be at least 1 for add/set."})
+        return attrs
+
+class ProductBulkOp(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    price_cents = serializers.IntegerField(min_value=0, required=False)
+    price_delta = serializers.IntegerField(required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    stock_delta = serializers.IntegerField(required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        for absolute, delta in (("price_cents", "price_delta"), ("stock", "stock_delta")):
+            if absolute in attrs and delta in attrs:
+                raise serializers.ValidationError({delta: f"Send {absolute} or {delta}, not both."})
+        if len(attrs) == 1:
+            raise serializers.ValidationError("Nothing to update.")
+        return attrs
+
 class CartItemOut(serializers.ModelSerializer):
     product = ProductOut()
     class Meta:
@@ -46,17 +168,69 @@ class CartOut(serializers.ModelSerializer):
 class CheckoutIn(serializers.Serializer):
     email = serializers.EmailField(required=False)
 
+class SalesReportIn(serializers.Serializer):
+    """Query params of the admin sales reports; the range defaults to the last REPORT_DEFAULT_DAYS days."""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    product = serializers.UUIDField(required=False)
+    by = serializers.ChoiceField(choices=["revenue", "units"], default="revenue")
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, attrs):
+        end = attrs.setdefault("end", timezone.localdate())
+        start = attrs.setdefault("start", end - timedelta(days=REPORT_DEFAULT_DAYS - 1))
+        if start > end:
+            raise serializers.ValidationError({"start": "must not be after end"})
+        return attrs
+
 class CartItemQty(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1)
 
-class OrderItemOut(serializers.ModelSerializer):
-    product = ProductOut()
-    class Meta:
-        model = OrderItem
-        fields = ["product", "quantity", "unit_price_cents", "id", "order"]
+ORDER_DETAIL_FIELDS = (
+    "id", "quantity", "unit_price_cents", "product_id", "product_name", "product_sku", "currency", "product_image",
+    "order_id", "order__status", "order__total_cents", "order__created_at", "order__failure",
+)
 
-class OrderOut(serializers.ModelSerializer):
-    items = OrderItemOut(many=True, read_only=True)
-    class Meta:
-        model = Order
-        fields = ["id", "status", "total_cents", "created_at", "items"]
+def _media_url(name, request):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+def order_item_out(row, request=None):
+    """One OrderItem `.values(*ORDER_DETAIL_FIELDS)` row, from its checkout snapshot."""
+    return {
+        "id": row["id"],
+        "order": str(row["order_id"]),
+        "product": {
+            "id": str(row["product_id"]),
+            "name": row["product_name"],
+            "sku": row["product_sku"],
+            "currency": row["currency"],
+            "price_cents": row["unit_price_cents"],
+            "image": _media_url(row["product_image"], request),
+        },
+        "quantity": row["quantity"],
+        "unit_price_cents": row["unit_price_cents"],
+        "subtotal_cents": row["quantity"] * row["unit_price_cents"],
+    }
+
+def order_head(row):
+    """Order fields carried on an ORDER_DETAIL_FIELDS row."""
+    head = {k[len("order__"):]: v for k, v in row.items() if k.startswith("order__")}
+    head["id"] = row["order_id"]
+    return head
+
+def order_out(order, rows, request=None):
+    """
+    Order receipt without ModelSerializer introspection or a Product join.
+    `order` is a dict with id/status/total_cents/created_at/failure.
+    """
+    return {
+        "id": str(order["id"]),
+        "status": order["status"],
+        "total_cents": order["total_cents"],
+        "created_at": _datetime.to_representation(order["created_at"]),
+        "failure": order["failure"],
+        "items": [order_item_out(r, request) for r in rows],
+    }
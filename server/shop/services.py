@@ -1,23 +1,203 @@
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import F
 from django.utils import timezone
+from .cache import bump_catalog_version
 from .models import Cart, Order, OrderItem, Product, CartItem
+from .inventory import decrement_stock, available_stock, available_stock_map, stock_map
+from .guest_cart import GuestCart, GUEST_CART_MAX_LINES, merge_marker
+from .outbox import emit_many, order_payload, stock_payload
 
 class OutOfStock(Exception):
     def __init__(self, product_id, requested, available):
         self.product_id = product_id; self.requested = requested; self.available = available
 
 def get_or_create_cart(user=None, session_key=None):
+    """DB cart for a user, or for a legacy guest session key; anonymous carts are GuestCart tokens."""
     if user and getattr(user, "is_authenticated", False):
         cart, _ = Cart.objects.get_or_create(user=user)
-    else:
-        if not session_key:
-            # a tiny fallback—callers should pass X-Session-Key
-            session_key = "guest"
-        cart, _ = Cart.objects.get_or_create(session_key=session_key)
+        return cart
+    if not session_key:
+        return None
+    cart, _ = Cart.objects.get_or_create(session_key=session_key, user=None)
     return cart
 
 
+@transaction.atomic
+def merge_guest_cart(user_cart, session_key):
+    """
+    Fold a guest cart into `user_cart` with set-based writes: one upsert of every
+    line at max(user qty, guest qty) clamped to current stock. `session_key` is a
+    signed GuestCart token, or the key of an older DB guest cart (deleted after).
+    Query count does not depend on cart size. Records the key on the user cart so
+    request-time merges skip it afterwards.
+    Returns a report dict, or None when there was nothing to merge.
+    """
+    report = None
+    guest_token = GuestCart.from_token(session_key)
+    if guest_token is not None:
+        if guest_token.lines:
+            report = _merge_lines(user_cart, guest_token.lines)
+    else:
+        guest = Cart.objects.select_for_update().filter(session_key=session_key, user__isnull=True).first()
+        if guest and guest.pk != user_cart.pk:
+            report = _merge_lines(user_cart, dict(CartItem.objects.filter(cart=guest).values_list("product_id", "quantity")))
+            guest.delete()
+
+    marker = merge_marker(session_key)
+    Cart.objects.filter(pk=user_cart.pk).update(merged_session_key=marker)
+    user_cart.merged_session_key = marker
+    return report
+
+def _merge_lines(user_cart, lines):
+    existing = dict(
+        CartItem.objects.filter(cart=user_cart, product_id__in=list(lines)).values_list("product_id", "quantity")
+    )
+    stock = stock_map(Product.objects.filter(pk__in=list(lines)).values_list("id", "stock", "stock_shards"))
+
+    rows, report = [], {"merged": 0, "clamped": [], "dropped": []}
+    for pid, guest_qty in lines.items():
+        wanted = max(existing.get(pid, 0), guest_qty)
+        qty = min(wanted, stock.get(pid, 0))
+        if qty <= 0:
+            report["dropped"].append({"product_id": str(pid), "requested": wanted})
+            continue
+        if qty < wanted:
+            report["clamped"].append({"product_id": str(pid), "requested": wanted, "quantity": qty})
+        rows.append(CartItem(cart=user_cart, product_id=pid, quantity=qty))
+    CartItem.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=["cart", "product"], update_fields=["quantity"]
+    )
+    report["merged"] = len(rows)
+    return report
+
+
+def stock_error(product_id, current, requested, available):
+    if available <= 0:
+        return {"error": "OUT_OF_STOCK", "detail": "No units left", "meta": {"product_id": str(product_id), "available": 0}}
+    return {
+        "error": "INSUFFICIENT_STOCK",
+        "detail": "Requested quantity exceeds stock",
+        "meta": {
+            "product_id": str(product_id),
+            "requested_total": requested,
+            "available": available,
+            "can_add_now": max(0, available - current),
+        },
+    }
+
+def _plan_cart_ops(qty, ops):
+    """
+    Validate {product_id, quantity, op} lines against current quantities `qty`
+    ({product_id: n}, updated in place). Products and stock are loaded once.
+    Returns (ok, per-line results).
+    """
+    ids = {op["product_id"] for op in ops}
+    products = Product.objects.filter(is_active=True).in_bulk(ids)
+    stock = available_stock_map(list(products.values()))
+
+    results, ok = [], True
+    for op in ops:
+        pid, kind = op["product_id"], op["op"]
+        line = {"product_id": str(pid), "op": kind}
+        if pid not in products:
+            results.append({**line, "error": "PRODUCT_NOT_FOUND"}); ok = False; continue
+        current = qty.get(pid, 0)
+        new = 0 if kind == "remove" else op["quantity"] + (current if kind == "add" else 0)
+        if new > current and new > stock[pid]:
+            results.append({**line, **stock_error(pid, current, new, stock[pid])}); ok = False; continue
+        qty[pid] = new
+        results.append({**line, "ok": True, "quantity": new})
+    return ok, results
+
+def apply_cart_ops(cart, ops):
+    """
+    Apply a batch of {product_id, quantity, op} lines ("add" | "set" | "remove") to `cart`
+    all-or-nothing. Products, existing lines and stock are loaded once; writes are at
+    most one bulk_create, one bulk_update and one delete. Call inside a transaction
+    holding the cart lock. Returns (ok, per-line results, {product_id: CartItem}).
+    """
+    items = {it.product_id: it for it in CartItem.objects.filter(cart=cart, product_id__in={op["product_id"] for op in ops})}
+    qty = {pid: it.quantity for pid, it in items.items()}
+    ok, results = _plan_cart_ops(qty, ops)
+    if not ok:
+        return False, results, items
+
+    create, update, delete = [], [], []
+    for pid, n in qty.items():
+        it = items.get(pid)
+        if n <= 0:
+            if it:
+                delete.append(it.pk); items.pop(pid)
+        elif it is None:
+            items[pid] = CartItem(cart=cart, product_id=pid, quantity=n); create.append(items[pid])
+        elif it.quantity != n:
+            it.quantity = n; update.append(it)
+    if delete:
+        CartItem.objects.filter(pk__in=delete).delete()
+    CartItem.objects.bulk_create(create)
+    CartItem.objects.bulk_update(update, ["quantity"])
+    return True, results, items
+
+def apply_guest_cart_ops(guest, ops):
+    """apply_cart_ops for a GuestCart: same validation, no writes. Returns (ok, per-line results)."""
+    qty = dict(guest.lines)
+    ok, results = _plan_cart_ops(qty, ops)
+    if ok and sum(1 for n in qty.values() if n > 0) > GUEST_CART_MAX_LINES:
+        for i, op in enumerate(ops):
+            if qty[op["product_id"]] and op["product_id"] not in guest.lines:
+                results[i] = {"product_id": str(op["product_id"]), "op": op["op"], "error": "CART_FULL",
+                              "meta": {"max_lines": GUEST_CART_MAX_LINES}}
+        ok = False
+    if ok:
+        for pid, n in qty.items():
+            if guest.lines.get(pid, 0) != n:
+                guest.set(pid, n)
+    return ok, results
+
+# field -> the op key that adjusts it relatively
+PRODUCT_DELTAS = {"price_cents": "price_delta", "stock": "stock_delta"}
+
+def apply_product_updates(ops):
+    """
+    Apply SKU-keyed {price_cents | price_delta, stock | stock_delta, is_active} lines
+    all-or-nothing. The rows are locked and read in one query, deltas are resolved
+    against them, and the writes are one bulk_update; the catalog version is bumped
+    once on commit. Call inside a transaction. Returns (ok, per-line results).
+    """
+    products = Product.objects.select_for_update().only(
+        "id", "sku", "price_cents", "stock", "stock_shards", "is_active",
+    ).in_bulk([op["sku"] for op in ops], field_name="sku")
+
+    results, ok, fields = [], True, set()
+    for op in ops:
+        sku = op["sku"]
+        p = products.get(sku)
+        if p is None:
+            results.append({"sku": sku, "error": "PRODUCT_NOT_FOUND"}); ok = False; continue
+        new = {f: op[f] if f in op else getattr(p, f) + op[d] for f, d in PRODUCT_DELTAS.items() if f in op or d in op}
+        if "stock" in new and p.stock_shards:
+            # shard rows own the count; go through shard_stock
+            results.append({"sku": sku, "error": "STOCK_SHARDED"}); ok = False; continue
+        negative = sorted(f for f, v in new.items() if v < 0)
+        if negative:
+            results.append({"sku": sku, "error": "NEGATIVE_VALUE", "meta": {"fields": negative}}); ok = False; continue
+        if "is_active" in op:
+            new["is_active"] = op["is_active"]
+        for f, v in new.items():
+            setattr(p, f, v)
+        fields |= new.keys()
+        results.append({"sku": sku, "ok": True, **new})
+    if not ok:
+        return False, results
+
+    now = timezone.now()
+    for p in products.values():
+        p.updated_at = now
+    Product.objects.bulk_update(list(products.values()), [*sorted(fields), "updated_at"])
+    transaction.on_commit(bump_catalog_version)
+    return True, results
+
+
 class CheckoutError(Exception):
     """Raised for business-rule failures (empty cart, stock issues)."""
     def __init__(self, code, payload=None):
@@ -25,63 +205,93 @@ class CheckoutError(Exception):
         self.code = code
         self.payload = payload or {}
 
-@transaction.atomic
-def checkout_cart(cart, email, user):
-    """
-    Convert a cart into a paid/pending Order.
-    Returns the created Order instance.
-    Raises CheckoutError for expected business failures.
-    """
+def _conflict(it, available):
+    p = it.product
+    return {"product_id": str(p.id), "name": p.name, "requested": it.quantity, "available": available}
+
+def _claim_cart_items(cart, user):
     if not user or not user.is_authenticated:
         raise CheckoutError("AUTH_REQUIRED")
 
-    cart_items = list(
-        CartItem.objects.select_for_update() 
-        .select_related("product")
-        .filter(cart=cart)
-    )
+    # row locks on the lines only (not on Product): a concurrent edit of one of them waits for this checkout
+    lines = CartItem.objects.select_related("product").filter(cart=cart)
+    if connection.features.has_select_for_update_of:
+        lines = lines.select_for_update(of=("self",))
+    cart_items = list(lines)
     if not cart_items:
         raise CheckoutError("EMPTY_CART")
 
-    conflicts = []
-    for it in cart_items:
-        p = it.product
-        if it.quantity <= 0:
-            conflicts.append({"product_id": str(p.id), "name": p.name, "requested": it.quantity, "available": p.stock})
-        elif it.quantity > p.stock:
-            conflicts.append({"product_id": str(p.id), "name": p.name, "requested": it.quantity, "available": p.stock})
-    if conflicts:
-        raise CheckoutError("INSUFFICIENT_STOCK_AT_CHECKOUT", {"items": conflicts})
+    bad_qty = [_conflict(it, it.product.stock) for it in cart_items if it.quantity <= 0]
+    if bad_qty:
+        raise CheckoutError("INSUFFICIENT_STOCK_AT_CHECKOUT", {"items": bad_qty})
+
+    # Claim the cart lines first: a concurrent checkout of the same cart deletes nothing.
+    deleted, _ = CartItem.objects.filter(id__in=[ci.id for ci in cart_items]).delete()
+    if deleted != len(cart_items):
+        raise CheckoutError("EMPTY_CART")
+    return cart_items
 
+def _create_order(user, email, cart_items, status):
     total_cents = 0
     for it in cart_items:
         total_cents += it.quantity * it.product.price_cents
 
+    now = timezone.now()
     order = Order.objects.create(
         user=user,
         email=(email or user.email or ""),
-        status="paid",
+        status=status,
         total_cents=total_cents,
-        created_at=timezone.now(), 
+        created_at=now,
+        paid_at=now if status == "paid" else None,
     )
 
-    item_rows = []
-    for it in cart_items:
-        p = it.product
-        subtotal = it.quantity * p.price_cents
-        item_rows.append(
-            OrderItem(
-                order=order,
-                product=p,
-                quantity=it.quantity,
-                unit_price_cents=p.price_cents,
-            )
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=it.product, quantity=it.quantity, unit_price_cents=it.product.price_cents,
+            product_name=it.product.name, product_sku=it.product.sku, currency=it.product.currency,
+            product_image=it.product.image.name if it.product.image else "",
         )
-        p.stock = p.stock - it.quantity
-        p.save(update_fields=["stock"])
+        for it in cart_items
+    ])
+    events = [(f"order.{'created' if status == 'pending' else status}", order.pk, order_payload(order, items))]
+    if status == "paid":
+        events.append(("stock.changed", order.pk, stock_payload(items)))
+    emit_many(events)
+    return order
 
-    OrderItem.objects.bulk_create(item_rows)
+@transaction.atomic
+def checkout_cart(cart, email, user):
+    """
+    Convert a cart into a paid/pending Order.
+    Returns the created Order instance.
+    Raises CheckoutError for expected business failures.
 
-    CartItem.objects.filter(id__in=[ci.id for ci in cart_items]).delete()
+    Stock is taken with a single guarded UPDATE (see inventory.decrement_stock)
+    instead of locking rows, so concurrent checkouts of the same SKU only
+    contend for the duration of that statement.
+    """
+    cart_items = _claim_cart_items(cart, user)
 
-    return order
+    lost = decrement_stock(
+        {it.product_id: it.quantity for it in cart_items},
+        sharded={it.product_id for it in cart_items if it.product.stock_shards},
+    )
+    if lost:
+        fresh = Product.objects.in_bulk(lost)
+        raise CheckoutError(
+            "INSUFFICIENT_STOCK_AT_CHECKOUT",
+            {"items": [_conflict(it, available_stock(fresh[it.product_id])) for it in cart_items if it.product_id in lost]},
+        )
+
+    return _create_order(user, email, cart_items, "paid")
+
+@transaction.atomic
+def enqueue_checkout(cart, email, user):
+    """
+    Async checkout (settings.CHECKOUT_ASYNC): move the cart into a "pending" Order
+    and return it. Stock is taken later by the checkout_worker command
+    (see checkout_queue.process_order), which marks it paid or cancelled.
+    """
+    cart_items = _claim_cart_items(cart, user)
+    return _create_order(user, email, cart_items, "pending")
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import images, search
+from .authentication import invalidate_principal
+from .cache import bump_catalog_version
+from .models import Product
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, **kwargs):
+    # bump after commit so readers never cache pre-commit rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+@receiver(post_save, sender=Product)
+def product_saved_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_product(instance)
+
+@receiver(post_delete, sender=Product)
+def product_deleted_index(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+@receiver(post_save, sender=Product)
+def product_saved_images(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if images.variants_stale(instance.image.name, instance.image_variants):
+        if images.PRODUCT_IMAGE_VARIANTS_ON_SAVE:
+            pk = instance.pk
+            transaction.on_commit(lambda: images.build_variants_on_commit(pk))
+    elif not instance.image and instance.image_variants:
+        instance.image_variants = {}
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    # is_active/is_staff/password changes and deletions must not outlive the principal cache
+    invalidate_principal(instance.pk)
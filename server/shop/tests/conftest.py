@@ -0,0 +1,28 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop.authentication import principals
+
+
+def make_auth_client(user):
+    token = RefreshToken.for_user(user).access_token
+    return Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    principals.local.clear()
+
+@pytest.fixture(autouse=True)
+def _enforce_query_budgets(settings):
+    settings.QUERY_BUDGET_ACTION = "raise"
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username="buyer@example.com", email="buyer@example.com", password="StrongPassw0rd!")
+
+@pytest.fixture
+def auth_client(user):
+    return make_auth_client(user)
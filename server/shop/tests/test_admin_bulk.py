@@ -0,0 +1,58 @@
+import pytest
+from shop.cache import catalog_version
+from shop.inventory import shard_product
+from shop.models import Product
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def admin(django_user_model):
+    return make_auth_client(django_user_model.objects.create_user(username="admin", password="x", is_staff=True))
+
+@pytest.fixture
+def products(db):
+    return {sku: Product.objects.create(name=sku, price_cents=1000, sku=sku, stock=10) for sku in ("A", "B", "C")}
+
+def test_absolute_and_relative_updates_in_one_go(admin, products, django_capture_on_commit_callbacks):
+    before = catalog_version()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        res = admin.post("/api/admin/products/bulk", [
+            {"sku": "A", "price_cents": 1200, "stock_delta": 5},
+            {"sku": "B", "price_delta": -250, "stock": 0, "is_active": False},
+            {"sku": "C", "stock_delta": -10},
+        ], content_type="application/json")
+    assert res.status_code == 200
+    assert res.json()["results"] == [
+        {"sku": "A", "ok": True, "price_cents": 1200, "stock": 15},
+        {"sku": "B", "ok": True, "price_cents": 750, "stock": 0, "is_active": False},
+        {"sku": "C", "ok": True, "stock": 0},
+    ]
+    rows = dict(Product.objects.values_list("sku", "price_cents"))
+    assert rows == {"A": 1200, "B": 750, "C": 1000}
+    assert not Product.objects.get(sku="B").is_active
+    # one catalog bump for the whole batch
+    assert len(callbacks) == 1 and catalog_version() != before
+
+def test_rejects_the_whole_batch(admin, products):
+    shard_product(products["C"], 2)
+    res = admin.post("/api/admin/products/bulk", [
+        {"sku": "A", "price_cents": 1},
+        {"sku": "B", "stock_delta": -11},
+        {"sku": "C", "stock": 3},
+        {"sku": "NOPE", "is_active": False},
+    ], content_type="application/json")
+    assert res.status_code == 409
+    assert res.json()["results"] == [
+        {"sku": "A", "ok": True, "price_cents": 1},
+        {"sku": "B", "error": "NEGATIVE_VALUE", "meta": {"fields": ["stock"]}},
+        {"sku": "C", "error": "STOCK_SHARDED"},
+        {"sku": "NOPE", "error": "PRODUCT_NOT_FOUND"},
+    ]
+    assert Product.objects.get(sku="A").price_cents == 1000
+
+def test_validation_and_permissions(admin, products, auth_client):
+    post = lambda client, body: client.post("/api/admin/products/bulk", body, content_type="application/json")
+    assert post(auth_client, [{"sku": "A", "stock": 1}]).status_code == 403
+    assert post(admin, [{"sku": "A", "stock": 1, "stock_delta": 1}]).status_code == 400
+    assert post(admin, [{"sku": "A"}]).status_code == 400
+    assert post(admin, [{"sku": "A", "stock": 1}, {"sku": "A", "stock": 2}]).json() == {"error": "DUPLICATE_SKU"}
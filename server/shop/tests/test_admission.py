@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+from shop import admission, views
+from shop.admission import ConcurrencyLimiter, Overloaded
+from shop.metrics import registry
+from shop.models import Product, Cart, CartItem
+from .conftest import make_auth_client
+
+
+def test_limiter_caps_per_key_and_queues_until_deadline():
+    limiter = ConcurrencyLimiter("t", limit=2, per_key=1, timeout=0.05, max_waiting=1)
+    limiter.acquire({"hot"})
+    with pytest.raises(Overloaded):
+        limiter.acquire({"hot", "cold"})  # waits out the deadline on the SKU cap
+    limiter.acquire({"cold"})
+    with pytest.raises(Overloaded):
+        limiter.acquire()  # process cap
+    assert registry.values['shop_admission_in_flight{gate="t"}'] == 2
+
+    limiter.timeout = 5
+    got = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire({"hot"}), got.set()))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while not limiter.waiting:
+        assert waiter.is_alive() and time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.001)
+    with pytest.raises(Overloaded):
+        limiter.acquire()  # the one queue place is taken
+    limiter.release({"hot"})
+    waiter.join()
+    assert got.is_set() and limiter.keys == {"hot": 1, "cold": 1}
+    assert registry.values['shop_admission_total{gate="t",outcome="queue_full"}'] == 1
+
+def test_saturated_checkout_is_503_with_retry_after(auth_client, user, monkeypatch):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=5)
+    CartItem.objects.create(cart=Cart.objects.create(user=user), product=p, quantity=1)
+    busy = ConcurrencyLimiter("checkout", limit=4, per_key=1, timeout=0.01, max_waiting=4)
+    monkeypatch.setattr(views, "checkout_limiter", busy)
+    busy.acquire({p.id})  # another buyer of the same SKU mid-checkout
+
+    res = auth_client.post("/api/orders/checkout")
+    assert (res.status_code, res["Retry-After"]) == (503, "1")
+    assert CartItem.objects.filter(cart__user=user).exists()
+    busy.release({p.id})
+    assert auth_client.post("/api/orders/checkout").status_code == 201
+
+def test_guest_lines_about_to_merge_count_per_sku(auth_client, client, monkeypatch):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=5)
+    token = client.post("/api/cart/items", {"product_id": str(p.id), "quantity": 1},
+                        content_type="application/json")["X-Session-Key"]
+    busy = ConcurrencyLimiter("checkout", limit=4, per_key=1, timeout=0.01, max_waiting=4)
+    monkeypatch.setattr(views, "checkout_limiter", busy)
+    busy.acquire({p.id})
+
+    assert auth_client.post("/api/orders/checkout", headers={"X-Session-Key": token}).status_code == 503
+    busy.release({p.id})
+    assert auth_client.post("/api/orders/checkout", headers={"X-Session-Key": token}).status_code == 201
+
+def test_rate_over_the_burst_is_429(user, monkeypatch, django_user_model):
+    monkeypatch.setattr(admission, "CHECKOUT_RATE", 1)
+    monkeypatch.setattr(admission, "CHECKOUT_BURST", 2)
+    other = make_auth_client(django_user_model.objects.create_user(username="o", password="x"))
+    assert [c.post("/api/orders/checkout").status_code for c in (make_auth_client(user), other)] == [400, 400]
+    res = make_auth_client(user).post("/api/orders/checkout")
+    assert res.status_code == 429 and 1 <= int(res["Retry-After"]) <= 2
+
+    admin = make_auth_client(django_user_model.objects.create_user(username="admin", password="x", is_staff=True))
+    text = admin.get("/api/metrics").content.decode()
+    assert "# TYPE shop_admission_in_flight gauge" in text
+    assert 'shop_admission_total{gate="checkout",outcome="throttled"}' in text
+
+def test_rejection_survives_an_evicted_window(monkeypatch):
+    monkeypatch.setattr(admission, "CHECKOUT_RATE", 1)
+    monkeypatch.setattr(admission, "CHECKOUT_BURST", 1)
+    def evicted(key):
+        raise ValueError(f"Key '{key}' not found")
+    monkeypatch.setattr(admission.cache, "decr", evicted)
+    throttle = admission.CheckoutThrottle()
+    assert throttle.allow_request(None, None)
+    assert not throttle.allow_request(None, None) and throttle.wait() >= 1
@@ -0,0 +1,76 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop.inventory import shard_product
+from shop.models import Product, Cart, CartItem
+from .conftest import make_auth_client
+
+pytestmark = pytest.mark.django_db
+
+
+def aget(path, user=None, **headers):
+    if user is not None:
+        headers["Authorization"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+    return async_to_sync(AsyncClient().get)(path, headers=headers)
+
+@pytest.fixture
+def async_urls(settings):
+    settings.ROOT_URLCONF = "shop.tests.urls_async"
+
+@pytest.fixture
+def shop(user):
+    products = [Product.objects.create(name=f"Tee {i}", price_cents=100 * (i + 1), sku=f"T{i}", stock=5) for i in range(5)]
+    shard_product(products[0], 2)
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=products[0], quantity=2)
+    CartItem.objects.create(cart=cart, product=products[3], quantity=1)
+    order_id = make_auth_client(user).post("/api/orders/checkout").json()["id"]
+    CartItem.objects.create(cart=cart, product=products[1], quantity=1)
+    return products, order_id
+
+def test_same_json_as_the_sync_views(shop, user, client, settings):
+    products, order_id = shop
+    auth = make_auth_client(user)
+    guest_token = client.post("/api/cart/items", {"product_id": str(products[2].id), "quantity": 2},
+                              content_type="application/json")["X-Session-Key"]
+    cursor = client.get("/api/products?page_size=2&ordering=price_cents").json()["next"].split("?")[1]
+    cases = [
+        (client, "/api/products", None, {}),
+        (client, "/api/products?q=tee&page_size=2", None, {}),
+        (client, f"/api/products?{cursor}", None, {}),
+        (client, "/api/products?max_price=300&ordering=-name", None, {}),
+        (client, f"/api/products/{products[0].id}", None, {}),
+        (client, "/api/cart", None, {"X-Session-Key": guest_token}),
+        (auth, "/api/cart", user, {}),
+        (auth, "/api/orders/me", user, {}),
+        (auth, f"/api/orders/{order_id}", user, {}),
+    ]
+    for sync_client, path, as_user, headers in cases:
+        expected = sync_client.get(path, headers=headers)
+        cache.clear()
+        settings.ROOT_URLCONF = "shop.tests.urls_async"
+        got = aget(path, as_user, **headers)
+        settings.ROOT_URLCONF = "microcommerce.urls"
+        cache.clear()
+        assert (got.status_code, got.json()) == (expected.status_code, expected.json()), path
+        assert got["Content-Type"] == "application/json"
+
+def test_errors_and_auth(shop, user, async_urls):
+    products, order_id = shop
+    res = aget("/api/orders/me")
+    assert res.status_code == 401 and res["WWW-Authenticate"].startswith("Bearer")
+    assert aget("/api/orders/me", Authorization="Bearer nope").json()["code"] == "token_not_valid"
+    assert aget(f"/api/products/{Product().id}").json() == {"detail": "No Product matches the given query."}
+    assert aget("/api/products?cursor=junk").status_code == 404
+    assert aget(f"/api/orders/{Product().id}", user).status_code == 404
+    res = async_to_sync(AsyncClient().post)("/api/cart")
+    assert res.status_code == 405
+
+def test_catalog_cache_and_metrics(shop, async_urls):
+    products, _ = shop
+    first = aget(f"/api/products/{products[1].id}")
+    assert 'desc="1 queries"' in first["Server-Timing"]
+    again = aget(f"/api/products/{products[1].id}", **{"If-None-Match": first["ETag"]})
+    assert again.status_code == 304 and 'desc="0 queries"' in again["Server-Timing"]
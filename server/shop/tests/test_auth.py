@@ -0,0 +1,54 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.authentication import JWTAuthentication, principals, users_by_email
+from .conftest import make_auth_client
+
+
+def test_principal_is_cached_until_the_user_changes(user):
+    client = make_auth_client(user)
+    assert client.get("/api/auth/me").json()["is_staff"] is False
+    with CaptureQueriesContext(connection) as ctx:
+        assert client.get("/api/auth/me").status_code == 200
+    assert not ctx.captured_queries
+
+    user.is_staff = True
+    user.save()
+    assert client.get("/api/auth/me").json()["is_staff"] is True
+    user.is_active = False
+    user.save(update_fields=["is_active"])
+    assert client.get("/api/auth/me").json()["code"] == "user_inactive"
+    user.delete()
+    assert client.get("/api/auth/me").json()["code"] == "user_not_found"
+
+def test_row_read_before_an_invalidation_is_not_served(user):
+    generation = principals.generation(user.pk)
+    stale = JWTAuthentication()._fetch(user.pk).first()  # a reader's SELECT, racing the write below
+    user.is_active = False
+    user.save()
+    principals.set(user.pk, generation, stale)  # lands after the invalidation
+    principals.local.clear()  # as seen from another worker
+    assert principals.get(user.pk) is None
+    assert make_auth_client(user).get("/api/auth/me").json()["code"] == "user_inactive"
+
+def test_signup_and_login_match_email_case_insensitively(client, user):
+    sql = str(users_by_email("X@Example.com").query).upper()
+    assert 'LOWER("AUTH_USER"."EMAIL") = X@EXAMPLE.COM' in sql
+    res = client.post("/api/auth/signup", {"email": "Buyer@Example.COM", "password": "StrongPassw0rd!"},
+                      content_type="application/json")
+    assert res.json() == {"error": "EMAIL_TAKEN"}
+
+    res = client.post("/api/auth/login", {"username": "BUYER@example.com", "password": "StrongPassw0rd!"},
+                      content_type="application/json")
+    assert res.status_code == 200 and res.json()["user"]["id"] == user.id
+    res = client.post("/api/auth/login", {"username": "BUYER@example.com", "password": "wrong"},
+                      content_type="application/json")
+    assert res.status_code == 401
+
+def test_email_lookup_uses_the_lower_index(db):
+    if connection.vendor != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN is SQLite's")
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + str(users_by_email("a@b.c").query).replace("= a@b.c", "= 'a@b.c'"))
+        plan = " ".join(str(row) for row in cursor.fetchall())
+    assert "auth_user_email_lower_idx" in plan
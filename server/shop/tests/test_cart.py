@@ -0,0 +1,39 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product, Cart, CartItem
+
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(name="Tee", price_cents=800, sku="TEE", stock=10)
+
+def test_guest_cart_merged_once_then_skipped(auth_client, user, product):
+    guest = Cart.objects.create(session_key="sk-1")
+    CartItem.objects.create(cart=guest, product=product, quantity=2)
+
+    res = auth_client.get("/api/cart", HTTP_X_SESSION_KEY="sk-1")
+    assert [i["quantity"] for i in res.json()["items"]] == [2]
+    assert not Cart.objects.filter(session_key="sk-1").exists()
+    assert Cart.objects.get(user=user).merged_session_key == "sk-1"
+
+    with CaptureQueriesContext(connection) as ctx:
+        auth_client.get("/api/cart", HTTP_X_SESSION_KEY="sk-1")
+    sql = " ".join(q["sql"] for q in ctx.captured_queries)
+    assert '"session_key" =' not in sql
+    assert "SAVEPOINT" not in sql and "FOR UPDATE" not in sql
+    assert len(ctx.captured_queries) == 2  # cart, items (the user is a cached principal)
+
+def test_new_session_key_merges_again(auth_client, user, product):
+    Cart.objects.create(user=user, merged_session_key="old")
+    CartItem.objects.create(cart=Cart.objects.create(session_key="new"), product=product, quantity=1)
+    assert len(auth_client.get("/api/cart", HTTP_X_SESSION_KEY="new").json()["items"]) == 1
+    assert Cart.objects.get(user=user).merged_session_key == "new"
+
+def test_mutations_still_work(auth_client, product):
+    res = auth_client.post("/api/cart/items", {"product_id": str(product.id), "quantity": 3}, content_type="application/json")
+    assert res.status_code == 201
+    item = res.json()["id"]
+    assert auth_client.patch(f"/api/cart/items/{item}", {"quantity": 4}, content_type="application/json").status_code == 200
+    assert auth_client.get("/api/cart").json()["total_cents"] == 3200
+    assert auth_client.delete(f"/api/cart/items/{item}").status_code == 204
@@ -0,0 +1,48 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product, Cart, CartItem
+
+
+def batch(client, ops):
+    return client.post("/api/cart/items/batch", ops, content_type="application/json")
+
+@pytest.fixture
+def products(db):
+    return Product.objects.bulk_create([Product(name=f"P{i}", price_cents=100, sku=f"P{i}", stock=5) for i in range(20)])
+
+def test_applies_add_set_remove(auth_client, user, products):
+    a, b, c = products[:3]
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=a, quantity=1)
+    CartItem.objects.create(cart=cart, product=c, quantity=1)
+    res = batch(auth_client, [
+        {"product_id": str(a.id), "quantity": 2},
+        {"product_id": str(b.id), "quantity": 4, "op": "set"},
+        {"product_id": str(c.id), "op": "remove"},
+    ])
+    assert res.status_code == 200
+    assert [r["quantity"] for r in res.json()["results"]] == [3, 4, 0]
+    assert dict(cart.items.values_list("product__sku", "quantity")) == {"P0": 3, "P1": 4}
+
+def test_rejects_whole_batch_with_per_line_errors(auth_client, user, products):
+    a, b = products[:2]
+    res = batch(auth_client, [
+        {"product_id": str(a.id), "quantity": 1},
+        {"product_id": str(b.id), "quantity": 6},
+    ])
+    assert res.status_code == 409
+    ok, bad = res.json()["results"]
+    assert ok["ok"] is True
+    assert bad["error"] == "INSUFFICIENT_STOCK"
+    assert bad["meta"] == {"product_id": str(b.id), "requested_total": 6, "available": 5, "can_add_now": 5}
+    assert not CartItem.objects.exists()
+
+def test_query_count_flat_for_twenty_lines(auth_client, user, products):
+    Cart.objects.create(user=user)
+    auth_client.get("/api/auth/me")  # cache the principal
+    def run(ps):
+        with CaptureQueriesContext(connection) as ctx:
+            assert batch(auth_client, [{"product_id": str(p.id), "quantity": 1} for p in ps]).status_code == 200
+        return len(ctx.captured_queries)
+    assert run(products[:2]) == run(products[2:20])
@@ -0,0 +1,45 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product
+
+
+@pytest.fixture(params=["locmem", "file"])
+def cache_backend(request, settings, tmp_path):
+    if request.param == "locmem":
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "catalog-test"}}
+    else:
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)}}
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(name="Cap", price_cents=3000, sku="CAP", stock=4)
+
+def test_list_hit_and_304_skip_orm(cache_backend, product, client):
+    first = client.get("/api/products?ordering=price_cents")
+    assert first.status_code == 200
+    etag = first["ETag"]
+    with CaptureQueriesContext(connection) as ctx:
+        again = client.get("/api/products?ordering=price_cents")
+        not_modified = client.get("/api/products?ordering=price_cents", HTTP_IF_NONE_MATCH=etag)
+    assert len(ctx.captured_queries) == 0
+    assert again.content == first.content
+    assert not_modified.status_code == 304
+
+def test_product_write_bumps_version(cache_backend, product, client, django_capture_on_commit_callbacks):
+    etag = client.get(f"/api/products/{product.id}")["ETag"]
+    with django_capture_on_commit_callbacks(execute=True):
+        product.name = "Bucket Hat"; product.save()
+    res = client.get(f"/api/products/{product.id}", HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 200
+    assert res.json()["name"] == "Bucket Hat"
+
+def test_stock_overlay_refreshes_cached_page(cache_backend, product, client, settings, monkeypatch):
+    from shop import cache as catalog_cache
+    etag = client.get("/api/products")["ETag"]
+    Product.objects.filter(pk=product.pk).update(stock=1)  # no signal, like checkout
+    assert client.get("/api/products").json()["results"][0]["stock"] == 4
+    monkeypatch.setattr(catalog_cache, "CATALOG_STOCK_TTL", -1)
+    res = client.get("/api/products", HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 200
+    assert res.json()["results"][0]["stock"] == 1
@@ -0,0 +1,78 @@
+import io
+import json
+import pytest
+from django.core.management import call_command
+from PIL import Image
+from shop.catalog_io import Importer, read_rows
+from shop.inventory import shard_product
+from shop.models import Product, StockShard
+
+
+def _import(text, fmt="csv", **options):
+    errors = []
+    importer = Importer(on_error=lambda line, sku, message: errors.append((line, sku, message)), **options)
+    importer.run(read_rows(io.StringIO(text), fmt))
+    return importer, errors
+
+@pytest.fixture
+def tee(db):
+    return Product.objects.create(name="Tee", description="Cotton", price_cents=800, sku="TEE", stock=10)
+
+def test_upsert_by_sku_reports_bad_rows_and_carries_on(tee, client):
+    importer, errors = _import(
+        "sku,name,price_cents,stock\n"
+        "TEE,,,3\n"           # partial update of an existing SKU
+        "CAP,Cap,1500,4\n"
+        "HAT,,100,1\n"        # new SKU without a name
+        "MUG,Mug,-1,2\n"
+        "SOCK,Sock,300,x\n"
+        "BAG,Bag,900,1\n",
+        chunk_size=2,
+    )
+    assert (importer.created, importer.updated, importer.failed) == (2, 1, 3)
+    assert [(line, sku) for line, sku, _ in errors] == [(4, "HAT"), (5, "MUG"), (6, "SOCK")]
+    tee.refresh_from_db()
+    assert (tee.name, tee.description, tee.price_cents, tee.stock) == ("Tee", "Cotton", 800, 3)
+    assert Product.objects.get(sku="CAP").price_cents == 1500
+    # bulk upserts still reach the search index
+    assert [p["sku"] for p in client.get("/api/products?q=bag").json()["results"]] == ["BAG"]
+
+def test_sharded_stock_is_not_overwritten(tee):
+    shard_product(tee, 2)
+    importer, errors = _import('{"sku": "TEE", "stock": 99}\nnot json\n{"sku": "TEE", "name": "Tee 2"}\n', "jsonl")
+    # the later row for a SKU wins within a chunk
+    assert importer.updated == 1 and [e[0] for e in errors] == [2]
+    tee.refresh_from_db()
+    assert tee.name == "Tee 2"
+
+def test_images_are_copied_once_under_a_content_hash(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / "media"
+    (tmp_path / "in").mkdir()
+    Image.new("RGB", (40, 30), "red").save(tmp_path / "in" / "cap.png")
+    rows = '{"sku": "CAP", "name": "Cap", "price_cents": 100, "image": "cap.png"}\n' \
+           '{"sku": "BAD", "name": "Bad", "price_cents": 100, "image": "../in/missing.png"}\n'
+    importer, errors = _import(rows, "jsonl", images_dir=tmp_path / "in")
+    assert importer.created == 1 and errors[0][1] == "BAD"
+    cap = Product.objects.get(sku="CAP")
+    assert cap.image.name.startswith("products/cap.") and cap.image_variants["source"] == cap.image.name
+
+    _import(rows, "jsonl", images_dir=tmp_path / "in")
+    assert [p.name for p in (tmp_path / "media" / "products").iterdir()] == [cap.image.name.split("/")[1]]
+
+def test_export_round_trips(tee, tmp_path):
+    shard_product(tee, 2)
+    Product.objects.create(name="Cap, red", price_cents=1500, sku="CAP", stock=4, is_active=False)
+    call_command("export_products", str(tmp_path / "out.csv"), chunk_size=1, stderr=io.StringIO())
+    call_command("export_products", str(tmp_path / "out.jsonl"), stderr=io.StringIO())
+    rows = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert [(r["sku"], r["stock"], r["is_active"]) for r in rows] == [("CAP", 4, False), ("TEE", None, True)]
+
+    Product.objects.filter(sku="CAP").delete()
+    Product.objects.filter(sku="TEE").update(price_cents=1)
+    out, err = io.StringIO(), io.StringIO()
+    call_command("import_products", str(tmp_path / "out.csv"), stdout=out, stderr=err)
+    assert "1 created, 1 updated, 0 rejected" in out.getvalue() and err.getvalue() == ""
+    tee.refresh_from_db()
+    assert tee.price_cents != 1 and sum(StockShard.objects.filter(product=tee).values_list("stock", flat=True)) == 10
+    cap = Product.objects.get(sku="CAP")
+    assert (cap.name, cap.is_active) == ("Cap, red", False)
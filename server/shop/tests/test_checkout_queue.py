@@ -0,0 +1,83 @@
+import io
+from datetime import timedelta
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from shop.checkout_queue import claim_batch, drain, process_order, requeue_stale
+from shop.models import Product, Cart, CartItem, Order, OrderItem, OutboxEvent
+
+
+@pytest.fixture
+def async_checkout(settings):
+    settings.CHECKOUT_ASYNC = True
+
+def fill_cart(user, product, qty):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.create(cart=cart, product=product, quantity=qty)
+
+def test_enqueue_returns_202_pending(async_checkout, auth_client, user):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=5)
+    fill_cart(user, p, 2)
+    res = auth_client.post("/api/orders/checkout")
+    assert res.status_code == 202
+    assert res.json()["status"] == "pending"
+    p.refresh_from_db()
+    assert p.stock == 5
+    assert not CartItem.objects.exists()
+
+def test_worker_settles_batch(async_checkout, auth_client, user, django_user_model):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=3)
+    other = django_user_model.objects.create_user(username="o", password="x")
+    fill_cart(user, p, 2)
+    first = auth_client.post("/api/orders/checkout").json()["id"]
+    fill_cart(other, p, 2)
+    from .conftest import make_auth_client
+    second = make_auth_client(other).post("/api/orders/checkout").json()["id"]
+
+    call_command("checkout_worker", once=True, batch_size=10)
+
+    assert Order.objects.get(pk=first).status == "paid"
+    loser = Order.objects.get(pk=second)
+    assert loser.status == "cancelled"
+    assert loser.failure["items"][0]["available"] == 1
+    p.refresh_from_db()
+    assert p.stock == 1
+    assert auth_client.get(f"/api/orders/{first}").json()["status"] == "paid"
+
+def test_claims_do_not_overlap(user):
+    for _ in range(5):
+        Order.objects.create(user=user, status="pending")
+    _, a = claim_batch(3)
+    _, b = claim_batch(3)
+    assert len(a) == 3 and len(b) == 2
+    assert not set(a) & set(b)
+    assert drain(10) == {}
+
+@pytest.mark.parametrize("stock, left", [(4, 2), (3, 1)])
+def test_stale_claim_settles_nothing(user, stock, left):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=stock)
+    order = Order.objects.create(user=user, status="pending")
+    OrderItem.objects.create(order=order, product=p, quantity=2, unit_price_cents=100)
+    slow, _ = claim_batch(1)
+    Order.objects.filter(pk=order.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+    assert requeue_stale(60) == 1
+    fast, _ = claim_batch(1)
+
+    assert process_order(order.pk, fast) == "paid"
+    # the slow worker finds stock (4) or not (3); either way its late result is dropped
+    assert process_order(order.pk, slow) is None
+    p.refresh_from_db()
+    assert p.stock == left
+    assert Order.objects.get(pk=order.pk).status == "paid"
+    assert list(OutboxEvent.objects.order_by("id").values_list("topic", flat=True)) == ["order.paid", "stock.changed"]
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_processes_report_their_batches(user):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=10)
+    for _ in range(4):
+        order = Order.objects.create(user=user, status="pending")
+        OrderItem.objects.create(order=order, product=p, quantity=1, unit_price_cents=100)
+    out = io.StringIO()
+    call_command("checkout_worker", once=True, batch_size=1, processes=2, stdout=out)
+    assert out.getvalue().count("paid=1") == 4
+    assert not Order.objects.exclude(status="paid").exists()
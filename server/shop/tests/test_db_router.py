@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.utils import load_backend
+from shop import db_router
+from shop.models import Product
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def replica(transactional_db, tmp_path, monkeypatch):
+    """A second SQLite file registered as replica1; calling the fixture value replicates the primary into it."""
+    path = tmp_path / "replica.sqlite3"
+
+    def sync():
+        connection.ensure_connection()
+        with sqlite3.connect(path) as dest:
+            connection.connection.backup(dest)
+
+    sync()
+    settings_dict = connections.configure_settings(
+        {"default": {}, "replica1": {"ENGINE": "django.db.backends.sqlite3", "NAME": str(path)}}
+    )["replica1"]
+    # a connection made at runtime, not in DATABASES: the test runner leaves it alone
+    connections["replica1"] = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, "replica1")
+    monkeypatch.setattr(db_router, "REPLICAS", ["replica1"])
+    yield sync
+    connections["replica1"].close()
+    del connections["replica1"]
+
+@pytest.fixture
+def tee(transactional_db):
+    return Product.objects.create(name="Tee", price_cents=800, sku="TEE", stock=10)
+
+def test_reads_stick_to_the_primary_after_a_write(tee, user, client, replica):
+    replica()
+    Product.objects.filter(pk=tee.pk).update(name="Tee v2")  # not replicated yet
+    assert client.get(f"/api/products/{tee.id}").json()["name"] == "Tee"
+
+    auth = make_auth_client(user)
+    auth.post("/api/cart/items", {"product_id": str(tee.id), "quantity": 1}, content_type="application/json")
+    assert auth.post("/api/orders/checkout").status_code == 201
+    # the buyer reads their own order and the new stock; a guest still reads the replica
+    assert len(auth.get("/api/orders/me").json()["results"]) == 1
+    assert auth.get(f"/api/products/{tee.id}?v=1").json()["stock"] == 9
+    assert client.get(f"/api/products/{tee.id}?v=2").json()["stock"] == 10
+
+    cache.delete(db_router.PIN_KEY.format(user.pk))
+    assert auth.get("/api/orders/me?v=1").json()["results"] == []
+    replica()
+    assert len(auth.get("/api/orders/me?v=2").json()["results"]) == 1
+
+def test_catalog_changes_pin_every_reader(tee, client, replica, django_user_model):
+    admin = make_auth_client(django_user_model.objects.create_user(username="admin", password="x", is_staff=True))
+    assert admin.patch(f"/api/admin/products/{tee.id}", {"name": "Tee v2"}, content_type="application/json").status_code == 200
+    assert client.get("/api/products").json()["results"][0]["name"] == "Tee v2"
+
+    cache.delete(db_router.PIN_KEY.format(db_router.CATALOG))
+    assert client.get(f"/api/products/{tee.id}").json()["name"] == "Tee"
+
+def test_without_replicas_everything_reads_the_primary(tee, client):
+    assert db_router.REPLICAS == []
+    assert db_router.ReplicaRouter().db_for_read(Product) is None
+    assert client.get(f"/api/products/{tee.id}").json()["name"] == "Tee"
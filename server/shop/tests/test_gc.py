@@ -0,0 +1,53 @@
+import io
+from datetime import timedelta
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from shop.gc import collect_carts, collect_users
+from shop.models import Product, Cart, CartItem, Order, IdempotencyKey
+
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(name="Tee", price_cents=800, sku="TEE", stock=10)
+
+def _age(qs, field, days):
+    qs.update(**{field: timezone.now() - timedelta(days=days)})
+
+def test_stale_guest_carts_go_in_batches(product, user):
+    for i in range(7):
+        CartItem.objects.create(cart=Cart.objects.create(session_key=f"old-{i}"), product=product, quantity=1)
+    fresh = Cart.objects.create(session_key="fresh")
+    owned = Cart.objects.create(user=user)
+    _age(Cart.objects.exclude(pk=fresh.pk), "updated_at", 45)
+
+    batches = list(collect_carts(days=30, batch_size=3))
+    assert [b["deleted"].get("shop.Cart") for b in batches] == [3, 3, 1]
+    assert set(Cart.objects.values_list("pk", flat=True)) == {fresh.pk, owned.pk}
+    assert not CartItem.objects.exists()
+
+def test_only_expired_unverified_users_without_orders(db):
+    old = User.objects.create_user("old", password="x", is_active=False)
+    recent = User.objects.create_user("recent", password="x", is_active=False)
+    buyer = User.objects.create_user("buyer", password="x", is_active=False)
+    Order.objects.create(user=buyer, total_cents=1)
+    active = User.objects.create_user("active", password="x")
+    _age(User.objects.exclude(pk=recent.pk), "date_joined", 10)
+
+    assert sum(b["rows"] for b in collect_users(days=7, dry_run=True)) == 1
+    assert User.objects.filter(pk=old.pk).exists()
+    list(collect_users(days=7))
+    assert set(User.objects.values_list("username", flat=True)) == {"recent", "buyer", "active"}
+
+def test_command_reports_per_batch(db, user):
+    Cart.objects.bulk_create([Cart(session_key=f"k{i}") for i in range(5)])
+    _age(Cart.objects.all(), "updated_at", 60)
+    IdempotencyKey.objects.create(owner=f"user:{user.pk}", key="k", fingerprint="f", response_status=201,
+                                  expires_at=timezone.now() - timedelta(seconds=1))
+    out = io.StringIO()
+    call_command("gc_shop", batch_size=2, stdout=out)
+    text = out.getvalue()
+    assert "carts batch 3: 1 rows (shop.Cart=1)" in text
+    assert "carts: 5 rows removed" in text and "idempotency: 1 rows removed" in text
+    assert not Cart.objects.exists() and not IdempotencyKey.objects.exists()
@@ -0,0 +1,96 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.guest_cart import GuestCart, merge_marker
+from shop.models import Product, Cart, CartItem
+from shop.services import get_or_create_cart
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def products(db):
+    return Product.objects.bulk_create([Product(name=f"P{i}", price_cents=100 * (i + 1), sku=f"P{i}", stock=5) for i in range(3)])
+
+def add(client, product, qty, token=None):
+    extra = {"HTTP_X_SESSION_KEY": token} if token else {}
+    return client.post("/api/cart/items", {"product_id": str(product.id), "quantity": qty}, content_type="application/json", **extra)
+
+def writes(ctx):
+    return [q["sql"] for q in ctx.captured_queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+
+def test_anonymous_cart_never_writes(client, products):
+    a, b, _ = products
+    with CaptureQueriesContext(connection) as ctx:
+        assert client.get("/api/cart").json() == {"items": [], "total_cents": 0}
+    assert not ctx.captured_queries
+
+    with CaptureQueriesContext(connection) as ctx:
+        first = add(client, a, 2)
+        token = first["X-Session-Key"]
+        token = add(client, b, 1, token)["X-Session-Key"]
+        token = add(client, a, 1, token)["X-Session-Key"]
+        cart = client.get("/api/cart", HTTP_X_SESSION_KEY=token).json()
+    assert first.status_code == 201 and first.json() == {"id": str(a.id), "quantity": 2}
+    assert [(i["id"], i["quantity"]) for i in cart["items"]] == [(str(a.id), 3), (str(b.id), 1)]
+    assert cart["total_cents"] == 3 * 100 + 200
+    assert writes(ctx) == [] and not Cart.objects.exists()
+
+def test_guest_edit_remove_and_stock_checks(client, products):
+    a, b, _ = products
+    token = add(client, a, 2)["X-Session-Key"]
+    assert add(client, a, 4, token).json()["error"] == "INSUFFICIENT_STOCK"
+
+    res = client.patch(f"/api/cart/items/{a.id}", {"quantity": 5}, content_type="application/json", HTTP_X_SESSION_KEY=token)
+    token = res["X-Session-Key"]
+    assert client.patch(f"/api/cart/items/{a.id}", {"quantity": 6}, content_type="application/json",
+                        HTTP_X_SESSION_KEY=token).status_code == 409
+    assert client.patch(f"/api/cart/items/{b.id}", {"quantity": 1}, content_type="application/json",
+                        HTTP_X_SESSION_KEY=token).status_code == 404
+    assert GuestCart.from_token(token).lines == {a.id: 5}
+
+    token = client.delete(f"/api/cart/items/{a.id}", HTTP_X_SESSION_KEY=token)["X-Session-Key"]
+    assert client.get("/api/cart", HTTP_X_SESSION_KEY=token).json()["items"] == []
+
+def test_guest_batch(client, products):
+    a, b, c = products
+    res = client.post("/api/cart/items/batch", [
+        {"product_id": str(a.id), "quantity": 2},
+        {"product_id": str(b.id), "quantity": 3, "op": "set"},
+    ], content_type="application/json")
+    assert res.status_code == 200
+    assert GuestCart.from_token(res["X-Session-Key"]).lines == {a.id: 2, b.id: 3}
+    bad = client.post("/api/cart/items/batch", [{"product_id": str(c.id), "quantity": 9}],
+                      content_type="application/json", HTTP_X_SESSION_KEY=res["X-Session-Key"])
+    assert bad.status_code == 409 and "X-Session-Key" not in bad
+
+def test_tampered_or_foreign_token_is_an_empty_cart(client, products):
+    token = add(client, products[0], 1)["X-Session-Key"]
+    forged = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    assert client.get("/api/cart", HTTP_X_SESSION_KEY=forged).json()["items"] == []
+    assert GuestCart.from_token("plain-session-key") is None
+
+def test_login_merges_token_once(client, user, products):
+    a, b, _ = products
+    token = add(client, b, 2, add(client, a, 1)["X-Session-Key"])["X-Session-Key"]
+    res = client.post("/api/auth/login", {"username": user.username, "password": "StrongPassw0rd!"},
+                      content_type="application/json", HTTP_X_SESSION_KEY=token)
+    assert res.json()["cart_merge"]["merged"] == 2
+    cart = Cart.objects.get(user=user)
+    assert dict(cart.items.values_list("product__sku", "quantity")) == {"P0": 1, "P1": 2}
+    assert cart.merged_session_key == merge_marker(token)
+
+    auth = make_auth_client(user)
+    with CaptureQueriesContext(connection) as ctx:
+        auth.get("/api/cart", HTTP_X_SESSION_KEY=token)
+    assert writes(ctx) == []
+
+def test_checkout_materializes_guest_cart(user, products):
+    a = products[0]
+    token = GuestCart({a.id: 2}).token()
+    res = make_auth_client(user).post("/api/orders/checkout", HTTP_X_SESSION_KEY=token)
+    assert res.status_code == 201 and res.json()["total_cents"] == 200
+    assert Product.objects.get(pk=a.pk).stock == 3 and not CartItem.objects.exists()
+
+def test_no_shared_guest_cart(db):
+    assert get_or_create_cart() is None
+    assert not Cart.objects.exists()
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.db import connection
+from shop.models import Product, Cart, CartItem, Order, IdempotencyKey
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def cart(user):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=10)
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=p, quantity=2)
+    return cart
+
+def test_checkout_replay_returns_stored_response(auth_client, cart):
+    first = auth_client.post("/api/orders/checkout", HTTP_IDEMPOTENCY_KEY="k1")
+    again = auth_client.post("/api/orders/checkout", HTTP_IDEMPOTENCY_KEY="k1")
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json()
+    assert again["Idempotent-Replayed"] == "true"
+    assert Order.objects.count() == 1
+
+def test_key_reused_with_different_body(auth_client, cart):
+    auth_client.post("/api/orders/checkout", {}, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k1")
+    res = auth_client.post("/api/orders/checkout", {"email": "x@example.com"}, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k1")
+    assert res.status_code == 422
+
+def test_cart_add_replay_does_not_double_add(auth_client, cart):
+    pid = str(cart.items.get().product_id)
+    for _ in range(3):
+        res = auth_client.post("/api/cart/items", {"product_id": pid, "quantity": 1},
+                               content_type="application/json", HTTP_IDEMPOTENCY_KEY="add-1")
+        assert res.json()["quantity"] == 3
+    assert cart.items.get().quantity == 3
+
+def test_expired_key_runs_again(auth_client, cart):
+    pid = str(cart.items.get().product_id)
+    body = {"product_id": pid, "quantity": 1}
+    auth_client.post("/api/cart/items", body, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k")
+    IdempotencyKey.objects.update(expires_at="2000-01-01T00:00:00Z")
+    res = auth_client.post("/api/cart/items", body, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k")
+    assert res.json()["quantity"] == 4
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_wait_for_first(django_user_model):
+    user = django_user_model.objects.create_user(username="u", password="x")
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=10)
+    CartItem.objects.create(cart=Cart.objects.create(user=user), product=p, quantity=1)
+
+    def post(_):
+        try:
+            res = make_auth_client(user).post("/api/orders/checkout", HTTP_IDEMPOTENCY_KEY="same")
+            return res.status_code, res.json().get("id")
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        outcomes = list(pool.map(post, range(6)))
+    assert {o for o in outcomes} == {(201, str(Order.objects.get().id))}
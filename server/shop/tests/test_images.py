@@ -0,0 +1,61 @@
+import io
+import pytest
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from PIL import Image
+from shop.images import PRODUCT_IMAGE_SIZES
+from shop.models import Product
+
+
+def _png(size=(2000, 1000), mode="RGBA"):
+    buf = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(buf, "PNG")
+    return ContentFile(buf.getvalue())
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+def test_upload_renders_variants_and_serves_them_immutable(db, media, client, django_capture_on_commit_callbacks):
+    p = Product.objects.create(name="Poster", price_cents=500, sku="POSTER", stock=3)
+    with django_capture_on_commit_callbacks(execute=True):
+        p.image.save("poster.png", _png())
+    p.refresh_from_db()
+    assert p.image_variants["source"] == p.image.name
+    sizes = p.image_variants["sizes"]
+    assert set(sizes) == set(PRODUCT_IMAGE_SIZES) and all(set(v) == {"webp", "jpg"} for v in sizes.values())
+    with Image.open(media / sizes["thumb"]["jpg"]) as thumb:
+        assert thumb.size == (160, 80) and thumb.mode == "RGB"
+
+    variants = client.get(f"/api/products/{p.id}").json()["variants"]
+    assert variants["card"]["webp"].startswith("http://testserver/media/variants/poster.")
+    res = client.get(variants["card"]["webp"].replace("http://testserver", ""))
+    assert res.status_code == 200 and res["Content-Type"] == "image/webp"
+    assert "immutable" in res["Cache-Control"]
+
+def test_replacing_or_clearing_image_updates_variants(db, media, django_capture_on_commit_callbacks):
+    p = Product.objects.create(name="Poster", price_cents=500, sku="POSTER", stock=3)
+    with django_capture_on_commit_callbacks(execute=True):
+        p.image.save("a.png", _png())
+    first = Product.objects.get(pk=p.pk).image_variants
+    with django_capture_on_commit_callbacks(execute=True):
+        p.image.save("b.png", _png(mode="RGB"))
+    second = Product.objects.get(pk=p.pk).image_variants
+    assert second["source"] != first["source"] and second["sizes"]["detail"] != first["sizes"]["detail"]
+    p.refresh_from_db(); p.image = None; p.save()
+    assert Product.objects.get(pk=p.pk).image_variants == {}
+
+def test_backfill_command_uses_process_pool(db, media):
+    for i in range(4):
+        Product.objects.create(name=f"P{i}", price_cents=100, sku=f"P{i}", stock=1, image=f"products/p{i}.png")
+        (media / "products").mkdir(exist_ok=True)
+        (media / f"products/p{i}.png").write_bytes(_png((300, 300)).read())
+    Product.objects.create(name="Broken", price_cents=100, sku="BROKEN", stock=1, image="products/broken.png")
+    (media / "products/broken.png").write_bytes(b"not an image")
+
+    out, err = io.StringIO(), io.StringIO()
+    call_command("build_image_variants", processes=2, stdout=out, stderr=err)
+    assert "4 of 5 products updated, 1 failed" in out.getvalue()
+    assert "broken.png" in err.getvalue()
+    assert all(p.image_variants["sizes"] for p in Product.objects.exclude(sku="BROKEN"))
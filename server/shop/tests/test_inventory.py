@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from shop.inventory import decrement_stock
+from shop.models import Product, Cart, CartItem, Order
+from .conftest import make_auth_client
+
+
+@pytest.mark.django_db
+def test_decrement_stock_reports_only_losing_lines():
+    a = Product.objects.create(name="A", price_cents=100, sku="A", stock=5)
+    b = Product.objects.create(name="B", price_cents=100, sku="B", stock=1)
+    lost = decrement_stock({a.id: 2, b.id: 3})
+    assert lost == {b.id}
+    a.refresh_from_db(); b.refresh_from_db()
+    assert (a.stock, b.stock) == (3, 1)
+
+@pytest.mark.django_db
+def test_checkout_conflict_payload_and_rollback(auth_client, user):
+    a = Product.objects.create(name="A", price_cents=100, sku="A", stock=5)
+    b = Product.objects.create(name="B", price_cents=100, sku="B", stock=1)
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, product=a, quantity=2)
+    CartItem.objects.create(cart=cart, product=b, quantity=2)
+    res = auth_client.post("/api/orders/checkout")
+    assert res.status_code == 409
+    assert res.json()["items"] == [{"product_id": str(b.id), "name": "B", "requested": 2, "available": 1}]
+    a.refresh_from_db()
+    assert a.stock == 5
+    assert cart.items.count() == 2
+    assert not Order.objects.exists()
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_checkouts_never_oversell():
+    stock, buyers = 10, 30
+    p = Product.objects.create(name="Hot", price_cents=500, sku="HOT", stock=stock)
+    clients = []
+    for i in range(buyers):
+        u = User.objects.create_user(username=f"b{i}", email=f"b{i}@example.com", password="x")
+        CartItem.objects.create(cart=Cart.objects.create(user=u), product=p, quantity=1)
+        clients.append(make_auth_client(u))
+
+    def buy(c):
+        try:
+            return c.post("/api/orders/checkout").status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        codes = list(pool.map(buy, clients))
+
+    assert codes.count(201) == stock
+    assert codes.count(409) == buyers - stock
+    p.refresh_from_db()
+    assert p.stock == 0
+    assert Order.objects.count() == stock
@@ -0,0 +1,61 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product, Cart, CartItem
+from shop.services import merge_guest_cart
+
+
+def make_carts(user, n, sk="guest-sk"):
+    products = Product.objects.bulk_create(
+        [Product(name=f"P{i}", price_cents=100, sku=f"{sk}-{i}", stock=5) for i in range(n)]
+    )
+    guest = Cart.objects.create(session_key=sk)
+    CartItem.objects.bulk_create([CartItem(cart=guest, product=p, quantity=2) for p in products])
+    user_cart = Cart.objects.create(user=user)
+    # half the lines already in the user cart
+    CartItem.objects.bulk_create([CartItem(cart=user_cart, product=p, quantity=1) for p in products[::2]])
+    return user_cart
+
+def merge_queries(user_cart, sk):
+    with CaptureQueriesContext(connection) as ctx:
+        merge_guest_cart(user_cart, sk)
+    return len(ctx.captured_queries)
+
+@pytest.mark.django_db
+def test_query_count_independent_of_cart_size(django_user_model):
+    small = merge_queries(make_carts(django_user_model.objects.create(username="a"), 3, "s"), "s")
+    large = merge_queries(make_carts(django_user_model.objects.create(username="b"), 60, "l"), "l")
+    assert small == large
+
+@pytest.mark.django_db
+def test_max_quantity_and_stock_clamp(user):
+    a = Product.objects.create(name="A", price_cents=100, sku="A", stock=10)
+    b = Product.objects.create(name="B", price_cents=100, sku="B", stock=2)
+    c = Product.objects.create(name="C", price_cents=100, sku="C", stock=0)
+    guest = Cart.objects.create(session_key="g")
+    user_cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=user_cart, product=a, quantity=4)
+    for p, q in ((a, 3), (b, 5), (c, 1)):
+        CartItem.objects.create(cart=guest, product=p, quantity=q)
+
+    report = merge_guest_cart(user_cart, "g")
+
+    assert dict(user_cart.items.values_list("product__sku", "quantity")) == {"A": 4, "B": 2}
+    assert report == {
+        "merged": 2,
+        "clamped": [{"product_id": str(b.id), "requested": 5, "quantity": 2}],
+        "dropped": [{"product_id": str(c.id), "requested": 1}],
+    }
+    assert not Cart.objects.filter(pk=guest.pk).exists()
+
+@pytest.mark.django_db
+def test_login_merges_and_reports(client, user):
+    p = Product.objects.create(name="A", price_cents=100, sku="A", stock=10)
+    CartItem.objects.create(cart=Cart.objects.create(session_key="g"), product=p, quantity=3)
+    res = client.post(
+        "/api/auth/login", {"username": user.username, "password": "StrongPassw0rd!"},
+        content_type="application/json", HTTP_X_SESSION_KEY="g",
+    )
+    assert res.status_code == 200
+    assert res.json()["cart_merge"] == {"merged": 1, "clamped": [], "dropped": []}
+    assert Cart.objects.get(user=user).items.get().quantity == 3
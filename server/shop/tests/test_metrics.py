@@ -0,0 +1,43 @@
+import pytest
+from shop.metrics import QueryBudgetExceeded, Registry, render_prometheus, registry
+from shop.models import Product
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(name="Cap", price_cents=3000, sku="CAP", stock=4)
+
+def test_server_timing_and_exposition(product, client, django_user_model):
+    res = client.get(f"/api/products/{product.id}")
+    assert 'db;dur=' in res["Server-Timing"] and 'desc="' in res["Server-Timing"]
+
+    admin = django_user_model.objects.create_user(username="admin", password="x", is_staff=True)
+    assert client.get("/api/metrics").status_code == 401
+    body = make_auth_client(admin).get("/api/metrics")
+    assert body["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = body.content.decode()
+    assert '# TYPE shop_request_queries histogram' in text
+    assert 'shop_request_queries_bucket{route="api/products/<uuid:pk>",method="GET",status="2xx",le="+Inf"}' in text
+
+def test_budget_raises_in_tests_and_logs_otherwise(product, client, settings, caplog):
+    settings.QUERY_BUDGETS = {"api/products/<uuid:pk>": 0}
+    with pytest.raises(QueryBudgetExceeded):
+        client.get(f"/api/products/{product.id}")
+    settings.QUERY_BUDGET_ACTION = "log"
+    before = registry.collect().get("api/products/<uuid:pk>|GET|2xx", {}).get("over_budget", 0)
+    client.get(f"/api/products/{product.id}?fresh=1")
+    assert "budget 0" in caplog.text
+    assert registry.collect()["api/products/<uuid:pk>|GET|2xx"]["over_budget"] == before + 1
+
+def test_file_snapshots_are_summed_across_processes(tmp_path):
+    a, b = Registry(str(tmp_path)), Registry(str(tmp_path))
+    b.path = str(tmp_path / "other-worker.json")
+    a.observe("r|GET|2xx", 0.02, 0.004, 3)
+    b.observe("r|GET|2xx", 0.2, 0.1, 30, over_budget=True)
+    b.flush()
+    text = render_prometheus(a.collect())
+    assert 'shop_request_queries_count{route="r",method="GET",status="2xx"} 2' in text
+    assert 'shop_request_queries_sum{route="r",method="GET",status="2xx"} 33.0' in text
+    assert 'shop_request_seconds_bucket{route="r",method="GET",status="2xx",le="0.025"} 1' in text
+    assert 'shop_query_budget_exceeded_total{route="r",method="GET",status="2xx"} 1' in text
@@ -0,0 +1,35 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product, Cart, CartItem, Order
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def order_id(auth_client, user):
+    cart = Cart.objects.create(user=user)
+    for i in range(3):
+        p = Product.objects.create(name=f"P{i}", price_cents=100 * (i + 1), sku=f"S{i}", stock=5, image=f"products/p{i}.png")
+        CartItem.objects.create(cart=cart, product=p, quantity=2)
+    return auth_client.post("/api/orders/checkout").json()["id"]
+
+def test_detail_reads_snapshot_in_one_query(auth_client, order_id):
+    Product.objects.filter(sku="S0").update(name="Renamed", price_cents=9999)
+    # the JWT user is a cached principal by now
+    with CaptureQueriesContext(connection) as ctx:
+        body = auth_client.get(f"/api/orders/{order_id}").json()
+    assert len(ctx.captured_queries) == 1
+    assert "shop_product" not in ctx.captured_queries[0]["sql"]
+    first = body["items"][0]
+    assert first["product"]["name"] == "P0"
+    assert first["product"]["image"] == "http://testserver/media/products/p0.png"
+    assert (first["unit_price_cents"], first["subtotal_cents"]) == (100, 200)
+    assert body["total_cents"] == 1200 and body["status"] == "paid"
+
+def test_detail_is_owner_only(order_id, django_user_model):
+    stranger = make_auth_client(django_user_model.objects.create_user(username="s", password="x"))
+    assert stranger.get(f"/api/orders/{order_id}").status_code == 404
+
+def test_order_without_items(auth_client, user):
+    o = Order.objects.create(user=user, status="cancelled")
+    assert auth_client.get(f"/api/orders/{o.id}").json()["items"] == []
@@ -0,0 +1,85 @@
+import io
+import json
+from datetime import timedelta
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from shop import outbox
+from shop.models import Product, Cart, CartItem, OutboxEvent
+
+
+class Flaky(outbox.Sink):
+    topics = ("order.",)
+
+    def __init__(self):
+        self.calls = []
+
+    def deliver(self, events):
+        self.calls.append([e.topic for e in events])
+        raise ConnectionError("down")
+
+
+def test_signup_and_checkout_write_events_not_mail(client, auth_client, user):
+    res = client.post("/api/auth/signup", {"email": "new@example.com", "password": "StrongPassw0rd!"},
+                      content_type="application/json")
+    assert res.status_code == 201
+    p = Product.objects.create(name="A", price_cents=250, sku="A", stock=5)
+    CartItem.objects.create(cart=Cart.objects.create(user=user), product=p, quantity=2)
+    order_id = auth_client.post("/api/orders/checkout").json()["id"]
+    assert auth_client.post("/api/orders/checkout").status_code == 400  # nothing emitted for a failed checkout
+    assert mail.outbox == []
+
+    events = {e.topic: e for e in OutboxEvent.objects.all()}
+    assert sorted(events) == ["order.paid", "stock.changed", "user.signup"]
+    assert events["order.paid"].payload["total_cents"] == 500
+    assert events["stock.changed"].payload == {"products": {str(p.id): -2}}
+
+    assert outbox.dispatch(sinks=outbox.load_sinks(["shop.outbox.EmailSink"]))["delivered"] == 3
+    assert sorted(m.subject for m in mail.outbox) == [f"Order {order_id} confirmed", "Verify your email"]
+    assert not OutboxEvent.objects.exclude(status="delivered").exists()
+    assert outbox.dispatch() == {}
+
+def test_failures_back_off_then_die(db, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    outbox.emit_many([("order.paid", 1, {}), ("user.signup", 2, {})])
+    flaky = Flaky()
+
+    assert outbox.dispatch(sinks=[flaky]) == {"delivered": 1, "retried": 1, "dead": 0, "lag": pytest.approx(0, abs=1)}
+    failed = OutboxEvent.objects.get(topic="order.paid")
+    assert failed.attempts == 1 and "ConnectionError" in failed.last_error
+    assert failed.available_at - timezone.now() > timedelta(seconds=outbox.OUTBOX_BACKOFF_SECONDS * 0.7)
+    assert outbox.dispatch(sinks=[flaky]) == {}  # not due yet
+
+    OutboxEvent.objects.update(available_at=timezone.now())
+    assert outbox.dispatch(sinks=[flaky])["dead"] == 1
+    assert flaky.calls == [["order.paid"], ["order.paid"]]
+    assert outbox.lag() == {"undelivered": 0, "dead": 1, "oldest_seconds": 0}
+
+def test_command_delivers_to_a_file(db, tmp_path, monkeypatch):
+    outbox.emit("user.signup", 7, {"email": "a@example.com", "token": "t"})
+    path = tmp_path / "events.jsonl"
+    out = io.StringIO()
+    call_command("dispatch_outbox", "--once", "--lag", stdout=out)
+    assert out.getvalue().startswith("undelivered=1 dead=0")
+
+    monkeypatch.setattr(outbox, "OUTBOX_FILE", str(path))
+    call_command("dispatch_outbox", "--once", "--sink", "shop.outbox.FileSink", stdout=out)
+    line = json.loads(path.read_text())
+    assert (line["topic"], line["key"], line["payload"]["token"]) == ("user.signup", "7", "t")
+    assert "delivered=1" in out.getvalue()
+
+def test_stale_claim_leaves_the_new_owners_result(db):
+    outbox.emit("order.paid", 1, {})
+
+    class Slow(Flaky):
+        def deliver(self, events):
+            # outlasts OUTBOX_CLAIM_TIMEOUT: another worker requeues, claims and delivers the event meanwhile
+            OutboxEvent.objects.update(claimed_at=timezone.now() - timedelta(seconds=outbox.OUTBOX_CLAIM_TIMEOUT + 1))
+            assert outbox.requeue_stale() == 1
+            assert outbox.dispatch(sinks=[])["delivered"] == 1
+            super().deliver(events)
+
+    assert outbox.dispatch(sinks=[Slow()])["retried"] == 0
+    event = OutboxEvent.objects.get()
+    assert (event.status, event.attempts, event.last_error) == ("delivered", 0, "")
@@ -0,0 +1,58 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Product, Order
+
+
+def walk(client, url):
+    seen, pages = [], 0
+    while url:
+        body = client.get(url).json()
+        seen += body["results"]; url = body["next"]; pages += 1
+    return seen, pages
+
+@pytest.fixture
+def catalog(db):
+    # only 3 distinct prices so the id tiebreaker matters
+    return [Product.objects.create(name=f"P{i:02d}", price_cents=100 * (i % 3), sku=f"S{i}", stock=1) for i in range(25)]
+
+def test_walks_every_row_once_in_order(client, catalog):
+    seen, pages = walk(client, "/api/products?ordering=-price_cents&page_size=4")
+    assert pages == 7
+    assert len({p["id"] for p in seen}) == 25
+    keys = [(p["price_cents"], p["id"]) for p in seen]
+    assert keys == sorted(keys, reverse=True)
+
+def test_default_order_and_previous(client, catalog):
+    first = client.get("/api/products?page_size=10").json()
+    assert [p["name"] for p in first["results"]] == [f"P{i:02d}" for i in range(24, 14, -1)]
+    assert first["previous"] is None
+    second = client.get(first["next"]).json()
+    back = client.get(second["previous"]).json()
+    assert back["results"] == first["results"]
+
+def test_cursor_page_is_single_query_without_count(client, catalog):
+    cursor_url = client.get("/api/products?ordering=name&page_size=20").json()["next"]
+    cache.clear()
+    with CaptureQueriesContext(connection) as ctx:
+        client.get(cursor_url)
+    assert len(ctx.captured_queries) == 1
+    assert "COUNT" not in ctx.captured_queries[0]["sql"].upper()
+
+def test_search_pages_by_rank(client, db):
+    for i in range(5):
+        Product.objects.create(name="Boot " * (i + 1), price_cents=100, sku=f"B{i}", stock=1)
+    seen, pages = walk(client, "/api/products?q=boot&page_size=2")
+    assert pages == 3
+    assert [p["sku"] for p in seen] == ["B4", "B3", "B2", "B1", "B0"]
+
+def test_bad_cursor_404(client, catalog):
+    assert client.get("/api/products?cursor=garbage").status_code == 404
+
+def test_my_orders_paginated(auth_client, user):
+    for i in range(7):
+        Order.objects.create(user=user, total_cents=i)
+    seen, pages = walk(auth_client, "/api/orders/me?page_size=3")
+    assert pages == 3
+    assert [o["total_cents"] for o in seen] == list(range(6, -1, -1))
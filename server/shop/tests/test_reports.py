@@ -0,0 +1,83 @@
+import io
+import random
+from datetime import timedelta
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from shop import reports
+from shop.models import Product, Cart, CartItem, Order, DailyProductSales
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def products(db):
+    return [Product.objects.create(name=f"P{i}", price_cents=100 * (i + 1), sku=f"P{i}", stock=1000) for i in range(4)]
+
+def buy(user, lines, days_ago=None):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for product, qty in lines:
+        CartItem.objects.create(cart=cart, product=product, quantity=qty)
+    order_id = make_auth_client(user).post("/api/orders/checkout").json()["id"]
+    if days_ago is not None:
+        Order.objects.filter(pk=order_id).update(paid_at=timezone.now() - timedelta(days=days_ago, minutes=5))
+    return order_id
+
+def snapshot():
+    return sorted(DailyProductSales.objects.values_list("day", "product_id", "units", "revenue_cents", "orders"))
+
+def test_incremental_rollup_matches_a_full_recompute(products, user, django_user_model):
+    rnd = random.Random(7)
+    buyers = [user] + [django_user_model.objects.create_user(username=f"b{i}", password="x") for i in range(3)]
+
+    def some_orders(n, max_days_ago=None):
+        for _ in range(n):
+            buy(rnd.choice(buyers), [(p, rnd.randint(1, 3)) for p in rnd.sample(products, rnd.randint(1, 3))],
+                days_ago=None if max_days_ago is None else rnd.randint(0, max_days_ago))
+
+    some_orders(10, 40)
+    assert sum(b["rows"] for b in reports.rollup(settle=0)) > 0  # first run builds from scratch
+    for _ in range(3):
+        some_orders(5)  # new sales land after the watermark
+        list(reports.rollup(settle=0))
+    Order.objects.create(user=user, status="pending", total_cents=999)  # unpaid: never counted
+
+    incremental = snapshot()
+    assert sum(row[2] for row in incremental) == sum(
+        it.quantity for o in Order.objects.filter(status="paid").prefetch_related("items") for it in o.items.all()
+    )
+    assert sum(b["rows"] for b in reports.rollup(settle=0)) == 0  # nothing new: nothing counted twice
+    assert snapshot() == incremental
+    reports.rebuild(settle=0)
+    assert snapshot() == incremental
+    assert sorted(
+        (r["day"], r["product_id"], r["units"], r["revenue_cents"], r["orders"]) for r in reports.aggregate_sales()
+    ) == incremental
+
+def test_settle_window_defers_recent_orders(products, user):
+    buy(user, [(products[0], 2)], days_ago=3)
+    list(reports.rollup(settle=0))
+    buy(user, [(products[0], 1)])
+    list(reports.rollup(settle=60))
+    assert sum(DailyProductSales.objects.values_list("units", flat=True)) == 2
+    out = io.StringIO()
+    call_command("rollup_sales", "--settle", "0", stdout=out)
+    assert sum(DailyProductSales.objects.values_list("units", flat=True)) == 3
+    assert "1 rows written" in out.getvalue()
+
+def test_report_endpoints_read_the_rollup(products, user, auth_client, django_user_model):
+    buy(user, [(products[0], 2), (products[1], 1)], days_ago=1)
+    buy(user, [(products[1], 5)])
+    list(reports.rollup(settle=0))
+    admin = make_auth_client(django_user_model.objects.create_user(username="admin", password="x", is_staff=True))
+    today = timezone.localdate()
+
+    assert auth_client.get("/api/admin/reports/sales").status_code == 403
+    sales = admin.get("/api/admin/reports/sales").json()
+    assert [(d["units"], d["revenue_cents"]) for d in sales["days"]] == [(3, 400), (5, 1000)]
+    assert sales["end"] == str(today) and sales["as_of"] is not None
+    one = admin.get(f"/api/admin/reports/sales?product={products[0].id}&start={today}").json()
+    assert one["days"] == []
+
+    top = admin.get("/api/admin/reports/top-products?by=units&limit=1").json()["results"]
+    assert [(t["sku"], t["units"], t["revenue_cents"], t["orders"]) for t in top] == [("P1", 6, 1200, 2)]
+    assert admin.get(f"/api/admin/reports/sales?start={today}&end={today - timedelta(days=1)}").status_code == 400
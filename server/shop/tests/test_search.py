@@ -0,0 +1,39 @@
+import pytest
+from django.core.management import call_command
+from shop.models import Product
+
+
+@pytest.fixture
+def catalog(db):
+    return [
+        Product.objects.create(name="Leather Boot", description="Brown, waterproof", price_cents=9000, sku="BOOT-01", stock=3),
+        Product.objects.create(name="Canvas Sneaker", description="Leather trim", price_cents=5000, sku="SNK-01", stock=3),
+        Product.objects.create(name="Cap", description="Adjustable", price_cents=1000, sku="CAP-07", stock=3),
+    ]
+
+def names(res):
+    return [p["name"] for p in res.json()["results"]]
+
+def test_prefix_and_rank(client, catalog):
+    # name hits outrank description hits
+    assert names(client.get("/api/products?q=leath")) == ["Leather Boot", "Canvas Sneaker"]
+    assert names(client.get("/api/products?q=water")) == ["Leather Boot"]
+    assert names(client.get("/api/products?q=cap-07")) == ["Cap"]
+    assert names(client.get("/api/products?q=leather sneak")) == ["Canvas Sneaker"]
+
+def test_explicit_ordering_overrides_rank(client, catalog):
+    assert names(client.get("/api/products?q=leather&ordering=price_cents")) == ["Canvas Sneaker", "Leather Boot"]
+
+def test_index_follows_saves_and_deletes(client, catalog):
+    boot, sneaker, _ = catalog
+    boot.name = "Rain Boot"; boot.save()
+    sneaker.delete()
+    assert names(client.get("/api/products?q=rain")) == ["Rain Boot"]
+    assert names(client.get("/api/products?q=sneaker")) == []
+
+def test_rebuild_command(client, catalog, django_capture_on_commit_callbacks):
+    Product.objects.filter(sku="CAP-07").update(name="Beanie")  # bypasses signals
+    assert names(client.get("/api/products?q=beanie")) == []
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("rebuild_search_index")
+    assert names(client.get("/api/products?q=beanie")) == ["Beanie"]
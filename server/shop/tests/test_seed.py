@@ -0,0 +1,32 @@
+import io
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from shop.models import Product, StockShard
+
+
+def _seed(**options):
+    call_command("seed_shop", stdout=io.StringIO(), **options)
+
+@pytest.mark.django_db
+def test_seed_scales_and_reruns_fill_in(client):
+    _seed(products=30, users=3, batch_size=7)
+    assert Product.objects.count() == 35
+    assert User.objects.filter(username__startswith="bench").count() == 3
+    assert client.login(username="bench2@example.com", password="BenchPassw0rd!")
+
+    _seed(products=40, users=3)
+    assert Product.objects.count() == 45
+    assert Product.objects.filter(sku="GEN0000039").exists()
+    # bulk-inserted rows are searchable
+    assert client.get("/api/products?q=GEN0000039").json()["results"][0]["sku"] == "GEN0000039"
+
+@pytest.mark.django_db
+def test_hot_sku_stock_is_reset():
+    _seed(hot_stock=5, hot_shards=4)
+    hot = Product.objects.get(sku="HOT001")
+    assert hot.stock_shards == 4 and sum(StockShard.objects.filter(product=hot).values_list("stock", flat=True)) == 5
+
+    _seed(hot_stock=9)
+    hot.refresh_from_db()
+    assert (hot.stock, hot.stock_shards) == (9, 0)
@@ -0,0 +1,52 @@
+import json
+import pytest
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from shop.inventory import shard_product
+from shop.models import Product, Cart, CartItem
+from shop.renderers import FastJSONRenderer
+from shop.serializers import ProductOut, CartItemOut
+
+
+@pytest.fixture
+def products(db, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    plain = Product.objects.create(name="Mug\u2028", description="ceramic", price_cents=1200, sku="MUG", stock=7)
+    plain.image.save("mug.jpg", ContentFile(b"jpg"))
+    sharded = Product.objects.create(name="Pen", price_cents=150, sku="PEN", stock=40)
+    shard_product(sharded, 4)
+    return [plain, Product.objects.get(pk=sharded.pk)]
+
+def _legacy(serializer, instance, many=False):
+    request = RequestFactory().get("/")
+    request.META["HTTP_HOST"] = "testserver"
+    return JSONRenderer().render(serializer(instance, many=many, context={"request": request}).data)
+
+def test_product_list_matches_model_serializer(products, client):
+    body = client.get("/api/products?ordering=price_cents").content
+    assert json.loads(body)["results"] == json.loads(_legacy(ProductOut, sorted(products, key=lambda p: p.price_cents), many=True))
+    assert b"\\u2028" in body
+
+def test_product_detail_matches_model_serializer(products, client):
+    for p in products:
+        assert client.get(f"/api/products/{p.id}").content == _legacy(ProductOut, p)
+    assert client.get("/api/products/not-a-uuid").status_code == 404
+
+def test_cart_single_query_and_schema(products, auth_client, user):
+    cart = Cart.objects.create(user=user)
+    items = [CartItem.objects.create(cart=cart, product=p, quantity=q) for p, q in zip(products, (2, 3))]
+    auth_client.get("/api/cart")  # warm the shard stock cache
+    with CaptureQueriesContext(connection) as ctx:
+        res = auth_client.get("/api/cart")
+    assert len(ctx.captured_queries) == 2  # cart, items + total
+    assert res.json() == {"items": json.loads(_legacy(CartItemOut, items, many=True)), "total_cents": 2 * 1200 + 3 * 150}
+
+def test_empty_cart(auth_client):
+    assert auth_client.get("/api/cart").json() == {"items": [], "total_cents": 0}
+
+def test_fast_renderer_matches_json_renderer(products):
+    data = ProductOut(products, many=True).data
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
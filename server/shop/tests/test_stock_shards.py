@@ -0,0 +1,53 @@
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from shop.inventory import available_stock, decrement_stock
+from shop.models import Product, Cart, CartItem, StockShard
+from .conftest import make_auth_client
+
+
+@pytest.fixture
+def hot(db):
+    p = Product.objects.create(name="Hot", price_cents=500, sku="HOT", stock=10)
+    call_command("shard_stock", "HOT", shards=4)
+    p.refresh_from_db()
+    return p
+
+def test_shard_split_and_merge(hot):
+    assert hot.stock_shards == 4
+    assert sorted(StockShard.objects.filter(product=hot).values_list("stock", flat=True)) == [2, 2, 3, 3]
+    call_command("shard_stock", "HOT", merge=True)
+    hot.refresh_from_db()
+    assert (hot.stock, hot.stock_shards) == (10, 0)
+    assert not StockShard.objects.exists()
+
+def test_decrement_falls_back_across_shards(hot):
+    # 7 > any single shard (max 3), so siblings are drained
+    assert decrement_stock({hot.id: 7}, sharded={hot.id}) == set()
+    assert decrement_stock({hot.id: 4}, sharded={hot.id}) == {hot.id}
+    cache.clear()
+    assert available_stock(hot) == 3
+
+def test_rebalance_evens_out_shards(hot):
+    StockShard.objects.filter(product=hot, shard=0).update(stock=0)
+    call_command("shard_stock", "HOT", rebalance=True)
+    hot.refresh_from_db()
+    assert hot.stock == 7
+    assert sorted(StockShard.objects.filter(product=hot).values_list("stock", flat=True)) == [1, 2, 2, 2]
+
+def test_checkout_and_reads_use_shards(hot, auth_client, user):
+    CartItem.objects.create(cart=Cart.objects.create(user=user), product=hot, quantity=3)
+    assert auth_client.post("/api/orders/checkout").status_code == 201
+    cache.clear()
+    assert auth_client.get(f"/api/products/{hot.id}").json()["stock"] == 7
+    res = auth_client.post("/api/cart/items", {"product_id": str(hot.id), "quantity": 8}, content_type="application/json")
+    assert res.status_code == 409
+    assert res.json()["meta"]["available"] == 7
+
+def test_admin_cannot_write_sharded_stock(hot, django_user_model):
+    admin = make_auth_client(django_user_model.objects.create_user(username="admin", password="x", is_staff=True))
+    res = admin.patch(f"/api/admin/products/{hot.id}", {"stock": 50}, content_type="application/json")
+    assert res.status_code == 400 and "shard_stock --merge" in res.json()["stock"][0]
+    assert admin.patch(f"/api/admin/products/{hot.id}", {"name": "Hot v2"}, content_type="application/json").status_code == 200
+    call_command("shard_stock", "HOT", merge=True)
+    assert admin.patch(f"/api/admin/products/{hot.id}", {"stock": 50}, content_type="application/json").json()["stock"] == 50
@@ -0,0 +1,6 @@
+from django.urls import include, path
+from shop.urls import build
+
+urlpatterns = [
+    path("api/", include(build(async_reads=True))),
+]
@@ -1,20 +1,47 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from .auth_views import SignupView, VerifyEmailView, TokenObtainMergeView, MeView
 
-urlpatterns = [
-    path("auth/signup", SignupView.as_view()),
-    path("auth/verify", VerifyEmailView.as_view()),
-    path("auth/login", TokenObtainMergeView.as_view()),
-    path("auth/me", MeView.as_view()),
-    path("products", views.ProductList.as_view()),
-    path("products/<uuid:pk>", views.ProductDetail.as_view()),
-    path("admin/products", views.AdminProductCreate.as_view()),
-    path("admin/products/<uuid:pk>", views.AdminProductUpdate.as_view()),
-    path("cart", views.CartView.as_view()),
-    path("cart/items", views.CartItemCreate.as_view()),
-    path("cart/items/<int:pk>", views.CartItemUpdate.as_view()),
-    path("orders/checkout", views.CheckoutView.as_view()),
-    path("orders/me", views.MyOrdersView.as_view()),
-    path("orders/<uuid:pk>", views.OrderDetailView.as_view()),
-]
+
+def build(async_reads=False):
+    """The API routes; `async_reads` swaps the hot read endpoints for shop.async_views."""
+    reads = {
+        "products": views.ProductList.as_view(),
+        "products/<uuid:pk>": views.ProductDetail.as_view(),
+        "cart": views.CartView.as_view(),
+        "orders/me": views.MyOrdersView.as_view(),
+        "orders/<uuid:pk>": views.OrderDetailView.as_view(),
+    }
+    if async_reads:
+        reads.update({
+            "products": async_views.product_list,
+            "products/<uuid:pk>": async_views.product_detail,
+            "cart": async_views.cart,
+            "orders/me": async_views.my_orders,
+            "orders/<uuid:pk>": async_views.order_detail,
+        })
+    return [
+        path("auth/signup", SignupView.as_view()),
+        path("auth/verify", VerifyEmailView.as_view()),
+        path("auth/login", TokenObtainMergeView.as_view(), name="token_obtain_pair"),
+        path("auth/me", MeView.as_view()),
+        path("products", reads["products"]),
+        path("products/<uuid:pk>", reads["products/<uuid:pk>"]),
+        path("admin/products", views.AdminProductCreate.as_view()),
+        path("admin/products/bulk", views.AdminProductBulk.as_view()),
+        path("admin/products/<uuid:pk>", views.AdminProductUpdate.as_view()),
+        path("admin/reports/sales", views.SalesReportView.as_view()),
+        path("admin/reports/top-products", views.TopProductsView.as_view()),
+        path("cart", reads["cart"]),
+        path("cart/items", views.CartItemCreate.as_view()),
+        path("cart/items/batch", views.CartItemBatch.as_view()),
+        path("cart/items/<int:pk>", views.CartItemUpdate.as_view()),
+        path("cart/items/<uuid:pk>", views.CartItemUpdate.as_view()),
+        path("orders/checkout", views.CheckoutView.as_view()),
+        path("orders/me", reads["orders/me"]),
+        path("orders/<uuid:pk>", reads["orders/<uuid:pk>"]),
+        path("metrics", views.MetricsView.as_view()),
+    ]
+
+urlpatterns = build(settings.ASYNC_READ_VIEWS)
@@ -1,59 +1,88 @@
+import uuid
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import permissions
-from .models import Product, CartItem, Order, Cart
-from .serializers import ProductOut, ProductIn, CartItemIn, CartOut, CheckoutIn, CartItemQty, CartItemOut, OrderOut, OrderItemOut
+from .models import Product, CartItem, Order, OrderItem, Cart
+from .serializers import ProductOut, ProductIn, ProductBulkOp, CartItemIn, CartOp, CartOut, CheckoutIn, CartItemQty, SalesReportIn, ORDER_DETAIL_FIELDS, order_head, order_out, PRODUCT_VALUES, products_out, cart_out, guest_cart_out
 from .filters import ProductFilter
 from .permissions import IsAdmin
-from .services import get_or_create_cart, checkout_cart, OutOfStock, CheckoutError
+from .services import get_or_create_cart, checkout_cart, enqueue_checkout, merge_guest_cart, apply_cart_ops, apply_guest_cart_ops, apply_product_updates, stock_error, OutOfStock, CheckoutError
+from .guest_cart import GuestCart, GUEST_CART_MAX_LINES, session_key, merge_marker
+from .inventory import available_stock
+from .cache import CatalogCacheMixin
+from .db_router import ReplicaReadMixin
+from .pagination import KeysetPagination
+from .idempotency import idempotent
+from .admission import CheckoutThrottle, checkout_limiter
+from . import reports
+from .metrics import registry, render_prometheus
+from django.conf import settings
+from django.http import HttpResponse
 from django.db import transaction
-
-SESSION_HEADER = "X-Session-Key"
+from django.db.models import F, Sum, Window
 
 # Helpers
-def _get_session_key(request):
-    return request.headers.get(SESSION_HEADER) or request.COOKIES.get("sk")
-
-def _merge_guest_into_user(user_cart: Cart, guest_cart: Cart):
-    if not guest_cart or guest_cart.id == user_cart.id:
-        return
-    for it in guest_cart.items.select_related("product"):
-        existing = user_cart.items.filter(product=it.product).first()
-        if existing:
-            existing.quantity = max(existing.quantity, it.quantity)
-            existing.save(update_fields=["quantity"])
-        else:
-            user_cart.items.create(product=it.product, quantity=it.quantity)
-    guest_cart.delete()
-
-def _cart_from_request(request):
-    if request.user and request.user.is_authenticated:
-        with transaction.atomic():
-            user_cart, _ = Cart.objects.select_for_update().get_or_create(user=request.user)
-            sk = _get_session_key(request)
-            if sk:
-                guest = Cart.objects.select_for_update().filter(session_key=sk, user__isnull=True).first()
-                if guest and guest.items.exists():
-                    _merge_guest_into_user(user_cart, guest)
-            return user_cart
-
-    sk = _get_session_key(request)
-    cart, _ = Cart.objects.get_or_create(session_key=sk, user=None)
+def _is_guest(request):
+    return not (request.user and request.user.is_authenticated)
+
+def _cart_from_request(request, lock=False):
+    """
+    Resolve the caller's cart: a GuestCart (no DB access) for anonymous callers,
+    else the user's cart, folding in any guest cart the request still carries.
+    Reads take no locks; mutating endpoints pass lock=True from inside their
+    transaction to serialize writers on this cart row.
+    """
+    if _is_guest(request):
+        return GuestCart.from_request(request)
+    sk = session_key(request)
+    cart, _ = Cart.objects.get_or_create(user=request.user)
+    if sk and cart.merged_session_key != merge_marker(sk):
+        merge_guest_cart(cart, sk)
+    if lock:
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
     return cart
 
+def _cart_rows(cart):
+    # one query: item + product columns, cart total as a window sum over the same rows
+    return CartItem.objects.filter(cart=cart).order_by("id").values(
+        "id", "quantity", *(f"product__{f}" for f in PRODUCT_VALUES),
+        total_cents=Window(Sum(F("quantity") * F("product__price_cents"))),
+    )
+
+def _order_summary(o):
+    return {"id": str(o.id), "status": o.status, "total_cents": o.total_cents, "created_at": o.created_at}
+
+def _item_lookup(pk):
+    # cart lines are addressed by CartItem id, or by product id (the only id a guest line has)
+    return {"product_id": pk} if isinstance(pk, uuid.UUID) else {"pk": pk}
+
 # Products (public)
-class ProductList(generics.ListAPIView):
+class ProductList(ReplicaReadMixin, CatalogCacheMixin, generics.ListAPIView):
     queryset = Product.objects.filter(is_active=True).order_by("-created_at")
     serializer_class = ProductOut
     filterset_class = ProductFilter
     ordering_fields = ["created_at","price_cents","name"]
 
-class ProductDetail(generics.RetrieveAPIView):
+    def list(self, request, *args, **kwargs):
+        # values() rows + products_out: same body as ProductOut, no model instances
+        qs = self.filter_queryset(self.get_queryset())
+        extra = ("search_rank",) if "search_rank" in qs.query.annotations else ()
+        rows = qs.values(*PRODUCT_VALUES, *extra)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(products_out(list(rows), request))
+        return self.get_paginated_response(products_out(page, request))
+
+class ProductDetail(ReplicaReadMixin, CatalogCacheMixin, generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductOut
     lookup_field = "pk"
 
+    def retrieve(self, request, *args, **kwargs):
+        row = generics.get_object_or_404(self.get_queryset().values(*PRODUCT_VALUES), pk=kwargs[self.lookup_field])
+        return Response(products_out([row], request)[0])
+
 # Admin products
 class AdminProductCreate(generics.CreateAPIView):
     queryset = Product.objects.all()
@@ -66,97 +95,182 @@ class AdminProductUpdate(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdmin]
     lookup_field = "pk"
 
+class AdminProductBulk(APIView):
+    permission_classes = [IsAdmin]
+    max_ops = 1000
+
+    @transaction.atomic
+    def post(self, request):
+        data = ProductBulkOp(data=request.data, many=True, allow_empty=False, max_length=self.max_ops)
+        data.is_valid(raise_exception=True)
+        ops = data.validated_data
+        if len({op["sku"] for op in ops}) != len(ops):
+            return Response({"error": "DUPLICATE_SKU"}, status=status.HTTP_400_BAD_REQUEST)
+        ok, results = apply_product_updates(ops)
+        if not ok:
+            return Response({"error": "BATCH_REJECTED", "results": results}, status=status.HTTP_409_CONFLICT)
+        return Response({"results": results})
+
 # Cart endpoints
 class CartView(APIView):
     def get(self, request):
         cart = _cart_from_request(request)
-        items = CartItem.objects.filter(cart=cart).select_related("product")
-        data = CartItemOut(items, many=True, context={"request": request}).data 
-        total = sum(i.product.price_cents * i.quantity for i in items)
-        return Response({"items": data, "total_cents": total})
+        if isinstance(cart, GuestCart):
+            rows = Product.objects.filter(pk__in=list(cart.lines)).values(*PRODUCT_VALUES)
+            return Response(guest_cart_out(cart.lines, list(rows), request))
+        return Response(cart_out(list(_cart_rows(cart)), request))
 
 class CartItemCreate(APIView):
     def post(self, request):
-        cart = _cart_from_request(request)
+        if _is_guest(request):
+            # no transaction or Idempotency-Key row: a retry resends the same token and gets the same cart
+            return self.add(request, GuestCart.from_request(request))
+        return self.post_user(request)
+
+    @idempotent
+    @transaction.atomic
+    def post_user(self, request):
+        return self.add(request, _cart_from_request(request, lock=True))
+
+    def add(self, request, cart):
         data = CartItemIn(data=request.data); data.is_valid(raise_exception=True)
         try:
             product = Product.objects.get(pk=data.validated_data["product_id"], is_active=True)
         except Product.DoesNotExist:
             return Response({"error": "PRODUCT_NOT_FOUND"}, status=status.HTTP_404_NOT_FOUND)
 
-        existing = CartItem.objects.filter(cart=cart, product=product).first()
-        already = existing.quantity if existing else 0
+        guest = isinstance(cart, GuestCart)
+        if guest:
+            already = cart.lines.get(product.id, 0)
+        else:
+            already = CartItem.objects.filter(cart=cart, product=product).values_list("quantity", flat=True).first() or 0
         incoming = data.validated_data["quantity"]
+        stock = available_stock(product)
+        if already + incoming > stock:
+            return Response(stock_error(product.id, already, already + incoming, stock), status=status.HTTP_409_CONFLICT)
 
-        if product.stock <= 0:
-            return Response(
-                {"error": "OUT_OF_STOCK", "detail": "No units left", "meta": {"product_id": str(product.id), "available": 0}},
-                status=status.HTTP_409_CONFLICT
-            )
-        if already + incoming > product.stock:
-            return Response(
-                {
-                    "error": "INSUFFICIENT_STOCK",
-                    "detail": "Requested quantity exceeds stock",
-                    "meta": {
-                        "product_id": str(product.id),
-                        "requested_total": already + incoming,
-                        "available": product.stock,
-                        "can_add_now": max(0, product.stock - already)
-                    },
-                },
-                status=status.HTTP_409_CONFLICT
-            )
+        if guest:
+            if not already and len(cart.lines) >= GUEST_CART_MAX_LINES:
+                return Response({"error": "CART_FULL", "meta": {"max_lines": GUEST_CART_MAX_LINES}}, status=status.HTTP_409_CONFLICT)
+            cart.set(product.id, already + incoming)
+            return cart.attach(Response({"id": str(product.id), "quantity": already + incoming}, status=status.HTTP_201_CREATED))
         item, _ = CartItem.objects.get_or_create(cart=cart, product=product, defaults={"quantity": 0})
         item.quantity = already + incoming
         item.save()
         return Response({"id": item.id, "quantity": item.quantity}, status=status.HTTP_201_CREATED)
 
+class CartItemBatch(APIView):
+    max_ops = 100
+
+    def post(self, request):
+        data = CartOp(data=request.data, many=True, allow_empty=False, max_length=self.max_ops)
+        data.is_valid(raise_exception=True)
+        if not _is_guest(request):
+            return self.post_user(request, data.validated_data)
+        cart = GuestCart.from_request(request)
+        ok, results = apply_guest_cart_ops(cart, data.validated_data)
+        if not ok:
+            return Response({"error": "BATCH_REJECTED", "results": results}, status=status.HTTP_409_CONFLICT)
+        return cart.attach(Response({
+            "results": results,
+            "items": [{"id": str(pid), "product_id": str(pid), "quantity": n} for pid, n in cart.lines.items()],
+        }))
+
+    @transaction.atomic
+    def post_user(self, request, ops):
+        cart = _cart_from_request(request, lock=True)
+        ok, results, items = apply_cart_ops(cart, ops)
+        if not ok:
+            return Response({"error": "BATCH_REJECTED", "results": results}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            "results": results,
+            "items": [{"id": it.id, "product_id": str(pid), "quantity": it.quantity} for pid, it in items.items()],
+        })
+
 class CartItemUpdate(APIView):
     def patch(self, request, pk):
-        cart = _cart_from_request(request)
         data = CartItemQty(data=request.data); data.is_valid(raise_exception=True)
+        qty = data.validated_data["quantity"]
+        if not _is_guest(request):
+            return self.patch_user(request, pk, qty)
+        cart = GuestCart.from_request(request)
+        product = Product.objects.filter(pk=pk).only("id", "stock", "stock_shards").first() if pk in cart.lines else None
+        if product is None:
+            return Response(status=404)
+        error = self._check(product, qty)
+        if error:
+            return error
+        cart.set(pk, qty)
+        return cart.attach(Response({"ok": True}))
+
+    @transaction.atomic
+    def patch_user(self, request, pk, qty):
+        cart = _cart_from_request(request, lock=True)
         try:
-            item = CartItem.objects.get(pk=pk, cart=cart)
+            item = CartItem.objects.select_related("product").get(cart=cart, **_item_lookup(pk))
         except CartItem.DoesNotExist:
             return Response(status=404)
-        item.quantity = data.validated_data["quantity"]
-        p = item.product
-        if data.validated_data["quantity"] > p.stock:
+        error = self._check(item.product, qty)
+        if error:
+            return error
+        item.quantity = qty
+        item.save()
+        return Response({"ok": True})
+
+    @staticmethod
+    def _check(p, qty):
+        stock = available_stock(p)
+        if qty > stock:
             return Response(
                 {"error":"OUT_OF_STOCK","detail":"Insufficient stock",
-                "meta":{"product_id": str(p.id), "requested": data.validated_data["quantity"], "available": p.stock}},
+                "meta":{"product_id": str(p.id), "requested": qty, "available": stock}},
                 status=409
             )
-        item.save()
-        return Response({"ok": True})
 
     def delete(self, request, pk):
-        cart = _cart_from_request(request)
-        CartItem.objects.filter(pk=pk, cart=cart).delete()
+        if not _is_guest(request):
+            return self.delete_user(request, pk)
+        cart = GuestCart.from_request(request)
+        if pk in cart.lines:
+            cart.set(pk, 0)
+        return cart.attach(Response(status=204))
+
+    @transaction.atomic
+    def delete_user(self, request, pk):
+        cart = _cart_from_request(request, lock=True)
+        CartItem.objects.filter(cart=cart, **_item_lookup(pk)).delete()
         return Response(status=204)
 
 class CheckoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [CheckoutThrottle]
 
     def post(self, request):
+        # admission happens before the transaction: a queued request holds no locks
+        with checkout_limiter.slot(self.product_ids(request)):
+            return self.checkout(request)
+
+    @staticmethod
+    def product_ids(request):
+        """Products this checkout will take: the user's cart plus any guest cart it is about to fold in."""
+        ids = set(CartItem.objects.filter(cart__user=request.user).values_list("product_id", flat=True))
+        sk = session_key(request)
+        if sk and Cart.objects.filter(user=request.user).values_list("merged_session_key", flat=True).first() != merge_marker(sk):
+            guest = GuestCart.from_token(sk)
+            ids.update(guest.lines if guest is not None else CartItem.objects.filter(
+                cart__session_key=sk, cart__user=None).values_list("product_id", flat=True))
+        return ids
+
+    @idempotent
+    @transaction.atomic
+    def checkout(self, request):
+        # no cart row lock: checkout locks and claims the item rows it reads (services._claim_cart_items)
         cart = _cart_from_request(request)
         data = CheckoutIn(data=request.data or {})
         data.is_valid(raise_exception=True)
 
-        conflicts = []
-        for it in cart.items.select_related("product"):
-            if it.quantity > it.product.stock:
-                conflicts.append({
-                    "product_id": str(it.product.id),
-                    "name": it.product.name,
-                    "requested": it.quantity,
-                    "available": it.product.stock,
-                })
-        if conflicts:
-            return Response({"error": "INSUFFICIENT_STOCK_AT_CHECKOUT", "items": conflicts}, status=status.HTTP_409_CONFLICT)
         try:
-            order = checkout_cart(
+            order = (enqueue_checkout if settings.CHECKOUT_ASYNC else checkout_cart)(
                 cart,
                 data.validated_data.get("email") or request.user.email,
                 request.user
@@ -165,36 +279,66 @@ class CheckoutView(APIView):
             code = str(e)
             if code == "EMPTY_CART":
                 return Response({"error": "EMPTY_CART"}, status=status.HTTP_400_BAD_REQUEST)
-            if code == "INSUFFICIENT_STOCK":
-                return Response({"error": "INSUFFICIENT_STOCK_AT_CHECKOUT"}, status=status.HTTP_409_CONFLICT)
+            if code == "INSUFFICIENT_STOCK_AT_CHECKOUT":
+                return Response({"error": code, **e.payload}, status=status.HTTP_409_CONFLICT)
             return Response({"error": "CHECKOUT_FAILED"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(
             {"id": str(order.id), "status": order.status, "total_cents": order.total_cents},
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_202_ACCEPTED if order.status == "pending" else status.HTTP_201_CREATED
         )
-        
-        return Response({"id": str(order.id), "status": order.status, "total_cents": order.total_cents}, status=status.HTTP_201_CREATED)
-    
-class MyOrdersView(APIView):
+
+class MyOrdersView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = "-created_at"
+
     def get(self, request):
-        orders = Order.objects.filter(user=request.user).order_by("-created_at")
-        return Response([
-            {
-                "id": str(o.id),
-                "status": o.status,
-                "total_cents": o.total_cents,
-                "created_at": o.created_at,
-            } for o in orders
-        ])
-
-class OrderDetailView(APIView):
+        paginator = KeysetPagination()
+        orders = paginator.paginate_queryset(Order.objects.filter(user=request.user), request, view=self)
+        return paginator.get_paginated_response([_order_summary(o) for o in orders])
+
+class OrderDetailView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        try:
-            o = Order.objects.prefetch_related("items__product").get(pk=pk, user=request.user)
-        except Order.DoesNotExist:
-            return Response(status=404)
-        return Response(OrderOut(o, context={"request": request}).data)
+        # one indexed query on order_id; items carry product snapshots, so no Product join
+        rows = list(OrderItem.objects.filter(order_id=pk, order__user=request.user).order_by("id").values(*ORDER_DETAIL_FIELDS))
+        if rows:
+            order = order_head(rows[0])
+        else:
+            order = Order.objects.filter(pk=pk, user=request.user).values("id", "status", "total_cents", "created_at", "failure").first()
+            if order is None:
+                return Response(status=404)
+        return Response(order_out(order, rows, request))
+
+class SalesReportView(APIView):
+    """Units and revenue per day from the DailyProductSales rollup, optionally for one product."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        params = SalesReportIn(data=request.query_params); params.is_valid(raise_exception=True)
+        p = params.validated_data
+        return Response({
+            "start": p["start"], "end": p["end"], "as_of": reports.watermark(),
+            "days": reports.sales_by_day(p["start"], p["end"], p.get("product")),
+        })
+
+class TopProductsView(APIView):
+    """Best sellers over a date range by revenue or units, from the rollup."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        params = SalesReportIn(data=request.query_params); params.is_valid(raise_exception=True)
+        p = params.validated_data
+        by = "units" if p["by"] == "units" else "revenue_cents"
+        return Response({
+            "start": p["start"], "end": p["end"], "as_of": reports.watermark(),
+            "results": reports.top_products(p["start"], p["end"], by, p["limit"]),
+        })
+
+class MetricsView(APIView):
+    """Request/SQL histograms for every worker, Prometheus text format."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(registry.collect(), registry.collect_values()), content_type="text/plain; version=0.0.4; charset=utf-8")